@@ -0,0 +1,216 @@
+import argparse
+import json
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import calculate_branch_age
+import plot_number_of_contributors
+import plot_open_issues
+
+# Define color codes
+RESET = "\033[0m"
+COLORS = {
+    'DEBUG': "\033[94m",  # Blue
+    'INFO': "\033[92m",  # Green
+    'WARNING': "\033[93m",  # Yellow
+    'ERROR': "\033[91m",  # Red
+    'CRITICAL': "\033[95m",  # Magenta
+}
+
+
+class ColoredFormatter(logging.Formatter):
+    def format(self, record):
+        log_fmt = f"{COLORS.get(record.levelname, RESET)}%(asctime)s - %(levelname)s - %(message)s{RESET}"
+        formatter = logging.Formatter(log_fmt)
+        return formatter.format(record)
+
+
+ANALYSES = ['contributors', 'branch_ages', 'open_issues']
+
+
+def load_manifest(manifest_file):
+    """
+    Loads a manifest of repositories: a JSON list of objects with the keys
+
+        path: Path to the repository (required).
+        name: Name used for the output directory. Default is the last component of the path.
+        branch: Branch to analyze for contributors. Default is `main`.
+        main_branch: Main branch to compare other branches against. Default is `branch`.
+        github: GitHub repository in the format "owner/repo". Open issues are only analyzed if it's set.
+        contributors_args, branch_age_args, open_issues_args: Extra command line arguments for each script.
+    """
+    with open(manifest_file, 'r') as file:
+        return json.load(file)
+
+
+def init_worker():
+    """
+    Selects the Agg backend in a worker process: charts are only saved to files, possibly from several processes at
+    once. matplotlib itself is only imported when a chart is rendered, not for analyses that write data.
+    """
+    os.environ['MPLBACKEND'] = 'Agg'
+
+
+def count_active_contributors(activity_periods):
+    """
+    Counts the contributors whose activity period, as extended by the granularity, covers the date of the latest
+    commit among the activity periods.
+    """
+    latest_commit_date = max((start_date + timedelta(days=length - 1) for periods in activity_periods.values()
+                              for start_date, _, length in periods), default=None)
+    return sum(any(start_date <= latest_commit_date < end_date for start_date, end_date, _ in periods)
+               for periods in activity_periods.values())
+
+
+def analyze_repository(repository, output_dir, analyses, no_fetch=False):
+    """
+    Runs the requested analyses for one repository and writes their outputs to `output_dir/<name>`. Repositories are
+    already analyzed in parallel worker processes, so the charts are rendered in these workers too.
+
+    Returns:
+        dict: The summary of the repository. If an analysis fails, the error is recorded in the summary and the
+        remaining analyses still run.
+    """
+    path = repository['path']
+    name = repository.get('name') or os.path.basename(os.path.normpath(path))
+    branch = repository.get('branch', 'main')
+    repo_output_dir = os.path.join(output_dir, name)
+    os.makedirs(repo_output_dir, exist_ok=True)
+    summary = {'name': name, 'path': path, 'errors': {}}
+
+    if 'contributors' in analyses:
+        try:
+            results = plot_number_of_contributors.main([
+                '--repo_path', path, '--branch', branch,
+                '--activity_plot_file', os.path.join(repo_output_dir, 'activity_plot.png'),
+                '--contributor_count_plot_file', os.path.join(repo_output_dir, 'contributor_count_plot.png'),
+                '--render_jobs', '0',
+            ] + repository.get('contributors_args', []))
+            # A sweep of several window or granularity days returns the results by (window days, granularity days)
+            if not isinstance(results, dict):
+                results = {None: results}
+            active_contributors = {combination: count_active_contributors(activity_periods)
+                                   for combination, (activity_periods, _) in results.items()}
+            summary['contributors'] = sorted({contributor for activity_periods, _ in results.values()
+                                              for contributor in activity_periods})
+            # The active contributors of the first combination, and of each one for a sweep
+            summary['active_contributors'] = next(iter(active_contributors.values()))
+            if len(results) > 1:
+                summary['active_contributors_by_sweep'] = {
+                    f'w{window_days}_g{granularity_days}': count
+                    for (window_days, granularity_days), count in active_contributors.items()
+                }
+        except Exception as e:
+            logging.exception(f"Contributor analysis of {name} failed")
+            summary['errors']['contributors'] = repr(e)
+
+    if 'branch_ages' in analyses:
+        try:
+            branch_ages = calculate_branch_age.main([
+                '--repo_path', path, '--main_branch', repository.get('main_branch', branch),
+                '--output_file', os.path.join(repo_output_dir, 'branch_ages.png'),
+                '--render_jobs', '0',
+            ] + (['--no_fetch'] if no_fetch else []) + repository.get('branch_age_args', []))
+            summary['branches'] = len(branch_ages or [])
+        except Exception as e:
+            logging.exception(f"Branch age analysis of {name} failed")
+            summary['errors']['branch_ages'] = repr(e)
+
+    if 'open_issues' in analyses and repository.get('github'):
+        try:
+            df_open_issues = plot_open_issues.main([
+                '--repo', repository['github'],
+                '--issues_file', os.path.join(repo_output_dir, 'issues.jsonl'),
+                '--releases_file', os.path.join(repo_output_dir, 'releases.json'),
+                '--output_plot', os.path.join(repo_output_dir, 'open_issues_plot.png'),
+                '--render_jobs', '0',
+            ] + repository.get('open_issues_args', []))
+            # The open issues of the first label filter, if several are given
+            summary['open_issues'] = int(df_open_issues.iloc[-1, 1])
+        except Exception as e:
+            logging.exception(f"Open issue analysis of {name} failed")
+            summary['errors']['open_issues'] = repr(e)
+
+    return summary
+
+
+def aggregate_summaries(summaries):
+    """ Combines the summaries of all repositories into a cross-repository summary. """
+    repositories_by_contributor = defaultdict(list)
+    for summary in summaries:
+        for contributor in summary.get('contributors', []):
+            repositories_by_contributor[contributor].append(summary['name'])
+
+    repositories = []
+    for summary in summaries:
+        repository = dict(summary)
+        if 'contributors' in repository:
+            repository['contributors'] = len(repository['contributors'])
+        repositories.append(repository)
+
+    return {
+        'repositories': repositories,
+        'contributors': len(repositories_by_contributor),
+        'contributors_in_multiple_repositories': {
+            contributor: repositories for contributor, repositories in sorted(repositories_by_contributor.items())
+            if len(repositories) > 1
+        },
+        'active_contributors': sum(summary.get('active_contributors', 0) for summary in summaries),
+        'open_issues': sum(summary.get('open_issues', 0) for summary in summaries),
+        'failed_repositories': [summary['name'] for summary in summaries if summary['errors']],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze a fleet of repositories in parallel.')
+    parser.add_argument('--manifest', type=str, default=None, help='JSON manifest of the repositories to analyze')
+    parser.add_argument('--repo_paths', nargs='*', default=[], help='Paths of repositories to analyze')
+    parser.add_argument('--output_dir', type=str, default='out/fleet', help='Directory for the outputs')
+    parser.add_argument('--analyses', nargs='*', choices=ANALYSES, default=ANALYSES, help='Analyses to run')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of repositories analyzed at once')
+    parser.add_argument('--no_fetch', action='store_true', help='Skip fetching branches before the branch analysis')
+    args = parser.parse_args(argv)
+
+    # Set up logging with colors
+    handler = logging.StreamHandler()
+    handler.setFormatter(ColoredFormatter())
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
+    repositories = (load_manifest(args.manifest) if args.manifest else []) + [
+        {'path': path} for path in args.repo_paths
+    ]
+    if not repositories:
+        logging.error("No repositories to analyze. Use --manifest or --repo_paths.")
+        return
+    logging.info(f"Analyzing {len(repositories)} repositories with {args.workers} workers")
+
+    # Each worker process imports the scripts once and analyzes many repositories
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+        futures = [executor.submit(analyze_repository, repository, args.output_dir, args.analyses, args.no_fetch)
+                   for repository in repositories]
+        summaries = []
+        for repository, future in zip(repositories, futures):
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                # E.g. a worker process crashed
+                logging.error(f"Analysis of {repository['path']} failed with error: {e!r}")
+                summaries.append({'name': repository.get('name') or repository['path'], 'path': repository['path'],
+                                  'errors': {'worker': repr(e)}})
+
+    summary = aggregate_summaries(summaries)
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_file = os.path.join(args.output_dir, 'summary.json')
+    with open(summary_file, 'w') as file:
+        json.dump(summary, file, indent=2)
+    logging.info(f"Summary saved to: {os.path.abspath(summary_file)}")
+    if summary['failed_repositories']:
+        logging.warning(f"Failed repositories: {', '.join(summary['failed_repositories'])}")
+    return summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import calculate_branch_age
+import plot_number_of_contributors
+import plot_open_issues
+from commit_index import CommitIndex
+
+# Define color codes
+RESET = "\033[0m"
+COLORS = {
+    'DEBUG': "\033[94m",  # Blue
+    'INFO': "\033[92m",  # Green
+    'WARNING': "\033[93m",  # Yellow
+    'ERROR': "\033[91m",  # Red
+    'CRITICAL': "\033[95m",  # Magenta
+}
+
+
+class ColoredFormatter(logging.Formatter):
+    def format(self, record):
+        log_fmt = f"{COLORS.get(record.levelname, RESET)}%(asctime)s - %(levelname)s - %(message)s{RESET}"
+        formatter = logging.Formatter(log_fmt)
+        return formatter.format(record)
+
+
+# Synthetic histories start at this date and span `years` years
+HISTORY_START = datetime(2015, 1, 1, tzinfo=timezone.utc)
+GITHUB_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def git_timestamp(timestamp):
+    return f'{timestamp} +0000'
+
+
+def fast_import_commit(ref, mark, parent_mark, author, timestamp, path):
+    """ Returns a `git fast-import` command creating a commit that changes one file. """
+    name, email = author
+    content = f'{mark}\n'
+    message = f'Commit {mark}\n'
+    lines = [
+        f'commit {ref}',
+        f'mark :{mark}',
+        f'author {name} <{email}> {git_timestamp(timestamp)}',
+        f'committer {name} <{email}> {git_timestamp(timestamp)}',
+        f'data {len(message)}',
+        message,
+    ]
+    if parent_mark:
+        lines.append(f'from :{parent_mark}')
+    lines += [f'M 100644 inline {path}', f'data {len(content)}', content]
+    return '\n'.join(lines)
+
+
+def create_repository(repo_path, commits, authors, branches, branch_commits, years=8, seed=0):
+    """
+    Creates a deterministic synthetic repository with `git fast-import`.
+
+    The `main` branch (also available as `origin/main`) has `commits` commits by `authors` authors, a few of whom
+    also commit with a second email mapped by the .mailmap file. Each of the `branches` remote branches
+    `origin/release/N` forks from a random commit of `main` and adds `branch_commits` commits. The same parameters
+    always create the same commits.
+    """
+    rng = random.Random(seed)
+    os.makedirs(repo_path)
+    subprocess.run(['git', 'init', '-q'], cwd=repo_path, check=True)
+    subprocess.run(['git', 'symbolic-ref', 'HEAD', 'refs/heads/main'], cwd=repo_path, check=True)
+
+    # Commit counts of the authors follow a long tail, as in most projects
+    identities = [(f'Author {i}', f'author{i}@example.com') for i in range(authors)]
+    aliases = {i: (f'author {i}', f'author{i}@users.noreply.example.com') for i in range(0, authors, 10)}
+    weights = [1 / (i + 1) for i in range(authors)]
+    start = int(HISTORY_START.timestamp())
+    end = start + int(timedelta(days=365 * years).total_seconds())
+    timestamps = sorted(rng.randint(start, end) for _ in range(commits))
+
+    stream = []
+    for mark, timestamp in enumerate(timestamps, start=1):
+        author = rng.choices(range(authors), weights)[0]
+        identity = aliases[author] if author in aliases and rng.random() < 0.3 else identities[author]
+        stream.append(fast_import_commit('refs/heads/main', mark, mark - 1, identity, timestamp,
+                                         f'src/file{mark % 100}.txt'))
+
+    mark = commits
+    for branch in range(branches):
+        fork_mark = rng.randint(1, commits)
+        timestamp = timestamps[fork_mark - 1]
+        parent_mark = fork_mark
+        for _ in range(branch_commits):
+            mark += 1
+            timestamp += rng.randint(3600, 7 * 86400)
+            author = rng.choices(range(authors), weights)[0]
+            stream.append(fast_import_commit(f'refs/remotes/origin/release/{branch}', mark, parent_mark,
+                                             identities[author], timestamp, f'release/file{mark % 10}.txt'))
+            parent_mark = mark
+    stream.append(f'reset refs/remotes/origin/main\nfrom :{commits}\n')
+
+    subprocess.run(['git', 'fast-import', '--quiet'], cwd=repo_path, input='\n'.join(stream).encode('utf-8'),
+                   check=True)
+    with open(os.path.join(repo_path, '.mailmap'), 'w') as file:
+        for author, (_, alias_email) in aliases.items():
+            name, email = identities[author]
+            file.write(f'{name} <{email}> <{alias_email}>\n')
+
+
+def create_github_payloads(issues_file, releases_file, issues, releases, years=8, seed=0):
+    """
+    Writes deterministic synthetic GitHub API payloads: a JSON list of `issues` issues and pull requests as returned
+    by the issues endpoint, and a JSON list of `releases` releases.
+    """
+    rng = random.Random(seed)
+    span = int(timedelta(days=365 * years).total_seconds())
+    labels = ['type: bug', 'type: feature', 'priority: high', 'priority: low']
+    payload = []
+    for number in range(1, issues + 1):
+        created_at = HISTORY_START + timedelta(seconds=rng.randint(0, span))
+        closed_at = created_at + timedelta(seconds=rng.randint(0, 200 * 86400)) if rng.random() < 0.7 else None
+        issue = {
+            'id': number,
+            'number': number,
+            'title': f'Issue {number}',
+            'user': {'login': f'user{rng.randint(0, 100)}'},
+            'labels': [{'name': label} for label in labels if rng.random() < 0.3],
+            'state': 'closed' if closed_at else 'open',
+            'created_at': created_at.strftime(GITHUB_DATE_FORMAT),
+            'updated_at': (closed_at or created_at).strftime(GITHUB_DATE_FORMAT),
+            'closed_at': closed_at.strftime(GITHUB_DATE_FORMAT) if closed_at else None,
+            'body': 'Lorem ipsum dolor sit amet. ' * rng.randint(1, 20),
+        }
+        if rng.random() < 0.3:
+            issue['pull_request'] = {'url': f'https://api.github.com/pulls/{number}'}
+        payload.append(issue)
+    with open(issues_file, 'w') as file:
+        json.dump(payload, file)
+
+    with open(releases_file, 'w') as file:
+        json.dump([{
+            'id': i,
+            'tag_name': f'v{i // 9}.{i // 3 % 3}.{i % 3}',
+            'published_at': (HISTORY_START + timedelta(seconds=span * i // max(releases, 1))).strftime(
+                GITHUB_DATE_FORMAT),
+        } for i in range(releases)], file)
+
+
+def prepare_scenario(work_dir, parameters):
+    """
+    Creates the synthetic repository and GitHub payloads of a scenario, unless they exist from a previous run, and
+    computes the inputs of the stages that depend on other stages.
+    """
+    key = '-'.join(f'{name}{value}' for name, value in sorted(parameters.items()))
+    scenario_dir = os.path.join(work_dir, key)
+    repo_path = os.path.join(scenario_dir, 'repo')
+    if not os.path.exists(os.path.join(scenario_dir, 'done')):
+        shutil.rmtree(scenario_dir, ignore_errors=True)
+        create_repository(repo_path, parameters['commits'], parameters['authors'], parameters['branches'],
+                          parameters['branch_commits'], seed=parameters['seed'])
+        create_github_payloads(os.path.join(scenario_dir, 'issues.json'), os.path.join(scenario_dir, 'releases.json'),
+                               parameters['issues'], parameters['releases'], seed=parameters['seed'])
+        open(os.path.join(scenario_dir, 'done'), 'w').close()
+
+    scenario = SimpleNamespace(dir=scenario_dir, repo_path=repo_path,
+                               issues_json_file=os.path.join(scenario_dir, 'issues.json'),
+                               issues_file=os.path.join(scenario_dir, 'issues.jsonl'),
+                               releases_file=os.path.join(scenario_dir, 'releases.json'))
+    scenario.args = SimpleNamespace(
+        activity_plot_file=os.path.join(scenario_dir, 'activity_plot.png'),
+        contributor_count_plot_file=os.path.join(scenario_dir, 'contributor_count_plot.png'),
+        output_plot=os.path.join(scenario_dir, 'open_issues_plot.png'),
+        color_releases=True, show_release_timestamps=True,
+    )
+    scenario.mailmap = plot_number_of_contributors.parse_mailmap(repo_path)
+    scenario.ref_shas = calculate_branch_age.get_remote_refs(repo_path)
+    scenario.branches = sorted(ref for ref in scenario.ref_shas if ref != 'origin/main')
+    index = CommitIndex(repo_path)
+    try:
+        index.update()
+    finally:
+        index.close()
+    scenario.activity_periods = count_contributors(scenario)
+    scenario.aggregated_data = plot_number_of_contributors.aggregate_contributors_by_time(scenario.activity_periods)
+    plot_open_issues.convert_issues_file(scenario.issues_json_file, scenario.issues_file)
+    scenario.df_open_issues = count_open_issues(scenario)
+    with open(scenario.releases_file, 'r') as file:
+        scenario.releases = json.load(file)
+    return scenario
+
+
+def count_contributors(scenario, backend='git', jobs=1):
+    return plot_number_of_contributors.count_contributors(
+        scenario.repo_path, 'main', scenario.mailmap, ['dependabot', 'snyk'], delta=timedelta(days=365 * 30),
+        window=timedelta(days=90), granularity=15, backend=backend, jobs=jobs
+    )
+
+
+def count_open_issues(scenario):
+    df_issues = plot_open_issues.issues_to_frame(plot_open_issues.read_issues(scenario.issues_file))
+    first_date = df_issues['created_at'].min().date()
+    last_date = df_issues['created_at'].max().date()
+    return plot_open_issues.count_open_issues(df_issues, first_date, last_date)
+
+
+def update_commit_index(scenario):
+    index_file = os.path.join(scenario.dir, 'benchmark.sqlite')
+    if os.path.exists(index_file):
+        os.remove(index_file)
+    index = CommitIndex(scenario.repo_path, index_file)
+    index.update()
+    index.close()
+
+
+def find_fork_points_with_git(scenario):
+    return [calculate_branch_age.find_fork_point(branch, 'main', scenario.repo_path) for branch in scenario.branches]
+
+
+def find_fork_points_in_graph(scenario):
+    graph = calculate_branch_age.CommitGraph.load(scenario.repo_path, scenario.ref_shas)
+    return [graph.find_fork_point(branch, 'origin/main') for branch in scenario.branches]
+
+
+def plot_contributors(scenario):
+    # The chart lists every activity period on the standard output
+    with open(os.devnull, 'w') as devnull:
+        with redirect_stdout(devnull):
+            plot_number_of_contributors.plot_contributors(scenario.activity_periods, scenario.args)
+
+
+# Number of processes of the sharded history scan. It's fixed rather than one per CPU, so that the stage measures the
+# sharded scan on any machine and its results stay comparable between machines.
+SHARDED_JOBS = 4
+
+# Stages of the scripts, measured separately. Each stage takes a prepared scenario.
+STAGES = {
+    'commit_index_update': update_commit_index,
+    'count_contributors[git]': count_contributors,
+    'count_contributors[index]': lambda scenario: count_contributors(scenario, backend='index'),
+    'count_contributors[sharded]': lambda scenario: count_contributors(scenario, jobs=SHARDED_JOBS),
+    'aggregate_contributors_by_time': lambda scenario: plot_number_of_contributors.aggregate_contributors_by_time(
+        scenario.activity_periods),
+    'plot_contributors': plot_contributors,
+    'plot_contributor_count_over_time': lambda scenario: plot_number_of_contributors.plot_contributor_count_over_time(
+        scenario.aggregated_data, scenario.args),
+    'find_fork_point[git]': find_fork_points_with_git,
+    'find_fork_point[graph]': find_fork_points_in_graph,
+    'convert_issues_file': lambda scenario: plot_open_issues.convert_issues_file(
+        scenario.issues_json_file, os.path.join(scenario.dir, 'converted.jsonl')),
+    'count_open_issues': count_open_issues,
+    'plot_open_issues_over_time': lambda scenario: plot_open_issues.plot_open_issues_over_time(
+        scenario.df_open_issues, scenario.releases, scenario.df_open_issues['date'].iloc[-1], scenario.args),
+}
+
+
+@contextmanager
+def quiet_logging():
+    """ Silences the info messages of the scripts, e.g. one per git command, whose output would be measured too. """
+    logging.disable(logging.INFO)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def measure(function, repeat):
+    """
+    Runs a function `repeat` times to measure its duration, and once more with tracemalloc to measure the peak memory
+    allocated by Python. Memory used by git processes isn't included.
+
+    Returns:
+        tuple: (list of durations in seconds, peak memory in bytes)
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return durations, peak_memory
+
+
+def get_version():
+    """ Returns the git description of the benchmarked code, e.g. `a854722-dirty`, or None outside a repository. """
+    result = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return result.stdout.decode('utf-8').strip() or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the stages of the git-insights scripts on synthetic data.')
+    parser.add_argument('--scales', nargs='*', type=int, default=[1, 4, 16],
+                        help='Scales to run at; all sizes below are multiplied by each scale')
+    parser.add_argument('--commits', type=int, default=1000, help='Number of commits on the main branch')
+    parser.add_argument('--authors', type=int, default=20, help='Number of commit authors')
+    parser.add_argument('--branches', type=int, default=5, help='Number of release branches')
+    parser.add_argument('--branch_commits', type=int, default=20, help='Number of commits on each release branch')
+    parser.add_argument('--issues', type=int, default=1000, help='Number of issues and pull requests')
+    parser.add_argument('--releases', type=int, default=10, help='Number of releases')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data')
+    parser.add_argument('--stages', nargs='*', choices=list(STAGES), default=list(STAGES), help='Stages to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each stage')
+    parser.add_argument('--work_dir', type=str, default='out/benchmark',
+                        help='Directory for the synthetic repositories and payloads, reused between runs')
+    parser.add_argument('--output_file', type=str, default='out/benchmark.jsonl',
+                        help='File the results are appended to, one JSON object per line')
+    args = parser.parse_args(argv)
+
+    # Set up logging with colors
+    handler = logging.StreamHandler()
+    handler.setFormatter(ColoredFormatter())
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
+    # Plots are only saved to files
+    import matplotlib
+    matplotlib.use('Agg')
+
+    run = {
+        'version': get_version(),
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'sharded_jobs': SHARDED_JOBS,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_file)), exist_ok=True)
+    results = []
+    for scale in args.scales:
+        parameters = {
+            'commits': args.commits * scale,
+            'authors': args.authors * scale,
+            'branches': args.branches * scale,
+            'branch_commits': args.branch_commits,
+            'issues': args.issues * scale,
+            'releases': args.releases * scale,
+            'seed': args.seed,
+        }
+        logging.info(f"Preparing scale {scale}: {parameters}")
+        with quiet_logging():
+            scenario = prepare_scenario(args.work_dir, parameters)
+        for stage in args.stages:
+            with quiet_logging():
+                durations, peak_memory = measure(lambda: STAGES[stage](scenario), args.repeat)
+            result = dict(run, stage=stage, scale=scale, parameters=parameters, durations=durations,
+                          min_duration=min(durations), median_duration=statistics.median(durations),
+                          peak_memory=peak_memory)
+            results.append(result)
+            with open(args.output_file, 'a') as file:
+                file.write(json.dumps(result) + '\n')
+            logging.info(f"Scale {scale}, {stage}: {result['median_duration']:.3f} s, "
+                         f"{peak_memory / 2 ** 20:.1f} MiB")
+
+    logging.info(f"Results appended to: {os.path.abspath(args.output_file)}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,18 @@
 import argparse
 import datetime
+import heapq
+import json
 import logging
 import os
 import subprocess
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 
-import matplotlib.pyplot as plt
+from commit_index import CommitIndex
+from data_output import FORMATS, data_file, write_records
+from pipeline import Pipeline, default_render_jobs
+from profiling import command_line, profiler
 
 
 def run_git_command(command, repo_path):
@@ -12,77 +20,366 @@ def run_git_command(command, repo_path):
     return subprocess.check_output(command, cwd=repo_path, shell=True).decode('utf-8').strip()
 
 
-def main():
-    # Define color codes
-    RESET = "\033[0m"
-    COLORS = {
-        'DEBUG': "\033[94m",  # Blue
-        'INFO': "\033[92m",  # Green
-        'WARNING': "\033[93m",  # Yellow
-        'ERROR': "\033[91m",  # Red
-        'CRITICAL': "\033[95m"  # Magenta
-    }
+def find_fork_point(branch, main_branch, repo_path):
+    """
+    Finds the fork commit of a branch by running git commands for this branch only.
 
-    class ColoredFormatter(logging.Formatter):
-        def format(self, record):
-            log_fmt = f"{COLORS.get(record.levelname, RESET)}%(asctime)s - %(levelname)s - %(message)s{RESET}"
-            formatter = logging.Formatter(log_fmt)
-            return formatter.format(record)
+    Returns:
+        tuple: (fork_commit, fork_commit_date, latest_commit_date) with dates in `%ci` format, or None if the
+        fork commit can't be determined.
+    """
+    # Find the oldest commit in the main branch that's not in the release branch
+    logging.info(f"Finding oldest commit in main branch not in {branch}")
+    oldest_commit = run_git_command(f'git log --pretty=format:"%h" {branch}..origin/{main_branch} | tail -1', repo_path)
 
-    # Set up logging with colors
-    handler = logging.StreamHandler()
-    handler.setFormatter(ColoredFormatter())
-    logging.basicConfig(level=logging.INFO, handlers=[handler])
-    logging.info("Starting branch age calculation")
+    # Find the fork commit
+    if oldest_commit:
+        logging.info(f"Finding fork commit for branch {branch}")
+        try:
+            fork_commit = run_git_command(f'git merge-base {oldest_commit} {branch}', repo_path)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Failed to find merge base for branch {branch} with error: {e}. Skipping this branch.")
+            return None
+    else:
+        logging.warning(f"No oldest commit found for branch {branch}. Skipping fork commit calculation.")
+        return None
 
-    parser = argparse.ArgumentParser(description='Calculate the age of release branches.')
-    parser.add_argument('--repo_path', type=str, required=True, help='Path to the repository')
-    parser.add_argument('--output_file', type=str, default='out/branch_ages.png',
-                        help='File name for the branch age plot')
-    parser.add_argument('--main_branch', type=str, default='main', help='Name of the main branch to compare against')
-    parser.add_argument('--branch_regex', type=str, default='.+', help='Regex pattern to filter branches')
-    parser.add_argument('--min_age', type=int, default=0, help='Minimum age of branches to include in days')
-    args = parser.parse_args()
+    # Get the dates for the fork commit and the latest commit
+    logging.info(f"Getting dates for fork commit {fork_commit} and latest commit in {branch}")
+    fork_commit_date = run_git_command(f'git show -s --format=%ci {fork_commit}', repo_path)
+    latest_commit_date = run_git_command(f'git log -1 --format=%ci {branch}', repo_path)
+    return fork_commit, fork_commit_date, latest_commit_date
 
-    # Fetch all branches
-    logging.info("Fetching all branches")
-    run_git_command('git fetch --all', args.repo_path)
 
-    # Get all release branches
-    logging.info("Getting all release branches")
-    branches = run_git_command('git branch -r', args.repo_path).split('\n')
-    if not branches:
-        logging.error("No branches found. Exiting.")
-        return
+class CommitGraph:
+    """
+    In-memory index of the commit DAG reachable from a set of refs.
 
-    import re
-    branch_pattern = re.compile(args.branch_regex)
-    release_branches = [branch.strip() for branch in branches if branch_pattern.match(branch.strip())]
+    The graph is loaded with a single `git log` call, commits are stored as integer ids and every fork point is
+    computed in memory. The results are the same as the ones produced by `find_fork_point` as long as commit times
+    don't go backwards. With skewed commit times, git's `branch..main` walk gives up early and may also list commits
+    reachable from the branch, which can move its fork point, whereas `main_only_commits` is always exact.
+    """
 
-    info = {}
-    for branch in release_branches:
-        branch = branch.strip()
-
-        # Find the oldest commit in the main branch that's not in the release branch
-        logging.info(f"Finding oldest commit in main branch not in {branch}")
-        oldest_commit = run_git_command(f'git log --pretty=format:"%h" {branch}..origin/{args.main_branch} | tail -1', args.repo_path)
-
-        # Find the fork commit
-        if oldest_commit:
-            logging.info(f"Finding fork commit for branch {branch}")
-            try:
-                fork_commit = run_git_command(f'git merge-base {oldest_commit} {branch}', args.repo_path)
-            except subprocess.CalledProcessError as e:
-                logging.error(f"Failed to find merge base for branch {branch} with error: {e}. Skipping this branch.")
-                continue
-        else:
+    # Flags used while walking the graph
+    MAIN = 1
+    BRANCH = 2
+    STALE = 4
+
+    def __init__(self, refs, shas, parents, timestamps, dates, generations=None):
+        self.refs = refs  # ref name -> commit id
+        self.shas = shas  # commit id -> sha
+        self.parents = parents  # commit id -> tuple of parent ids
+        self.timestamps = timestamps  # commit id -> committer timestamp
+        self.dates = dates  # commit id -> committer date in `%ci` format
+        self.generations = generations or self._compute_generations()
+        self._walk_ranks = {}
+
+    @classmethod
+    def load(cls, repo_path, ref_shas):
+        """ Loads the commits reachable from the given refs (a dict of ref name -> sha). """
+        # Children are listed before their parents, so the parents are resolved once all commits are read
+        logging.info(f"Executing command: git log --topo-order --stdin in {repo_path}")
+        process = subprocess.Popen(['git', 'log', '--topo-order', '--stdin', '--format=%H%x09%P%x09%ct%x09%ci'],
+                                   cwd=repo_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        process.stdin.write('\n'.join(ref_shas.values()) + '\n')
+        process.stdin.close()
+
+        index = {}
+        shas = []
+        parent_shas = []
+        timestamps = array('q')
+        dates = []
+        for line in process.stdout:
+            sha, parents, timestamp, date = line.rstrip('\n').split('\t')
+            index[sha] = len(shas)
+            shas.append(sha)
+            parent_shas.append(parents.split())
+            timestamps.append(int(timestamp))
+            dates.append(date)
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, 'git log --topo-order --stdin')
+
+        # Parents missing from the index (e.g. in shallow clones) are ignored
+        parents = [tuple(index[p] for p in ps if p in index) for ps in parent_shas]
+        logging.info(f"Loaded {len(shas)} commits")
+        return cls({ref: index[sha] for ref, sha in ref_shas.items() if sha in index}, shas, parents, timestamps,
+                   dates)
+
+    @classmethod
+    def load_from_index(cls, repo_path, ref_shas):
+        """ Loads the commit graph from the shared commit index, after indexing the new commits. """
+        index = CommitIndex(repo_path)
+        try:
+            index.update()
+            shas, parents, timestamps, dates, generations = index.load_graph()
+        finally:
+            index.close()
+
+        ids = {sha: commit_id for commit_id, sha in enumerate(shas)}
+        logging.info(f"Loaded {len(shas)} commits")
+        return cls({ref: ids[sha] for ref, sha in ref_shas.items() if sha in ids}, shas, parents, timestamps, dates,
+                   generations)
+
+    def _compute_generations(self):
+        # Commits are stored in topological order, so the parents of a commit always have greater ids
+        generations = array('l', [0]) * len(self.shas)
+        for i in range(len(self.shas) - 1, -1, -1):
+            generations[i] = 1 + max((generations[p] for p in self.parents[i]), default=0)
+        return generations
+
+    def walk_ranks(self, tip):
+        """
+        Returns the position of every commit reachable from `tip` in the default `git log` order, i.e. the order
+        in which git pops commits from its committer date ordered queue.
+        """
+        if tip not in self._walk_ranks:
+            ranks = {}
+            sequence = 0
+            queue = [(-self.timestamps[tip], sequence, tip)]
+            seen = {tip}
+            while queue:
+                _, _, commit = heapq.heappop(queue)
+                ranks[commit] = len(ranks)
+                for parent in self.parents[commit]:
+                    if parent not in seen:
+                        seen.add(parent)
+                        sequence += 1
+                        heapq.heappush(queue, (-self.timestamps[parent], sequence, parent))
+            self._walk_ranks[tip] = ranks
+        return self._walk_ranks[tip]
+
+    def _paint_down(self, commits, on_pop, done_flags):
+        """
+        Walks the graph from the given (commit, flags) pairs in generation order, propagating flags to parents.
+
+        A commit is popped only after all of its descendants reached by the walk, so its flags are final when
+        `on_pop(commit, flags)` is called. The callback returns the flags to propagate. The walk stops as soon as
+        every queued commit carries one of the `done_flags`.
+        """
+        flags = {}
+        queue = []
+        active = set()
+
+        def push(commit, commit_flags):
+            old_flags = flags.get(commit)
+            if old_flags is None:
+                heapq.heappush(queue, (-self.generations[commit], commit))
+                old_flags = 0
+            elif old_flags | commit_flags == old_flags:
+                return
+            flags[commit] = old_flags | commit_flags
+            if flags[commit] & done_flags:
+                active.discard(commit)
+            elif not old_flags:
+                active.add(commit)
+
+        for commit, commit_flags in commits:
+            push(commit, commit_flags)
+        while active:
+            _, commit = heapq.heappop(queue)
+            active.discard(commit)
+            flags[commit] = on_pop(commit, flags[commit])
+            for parent in self.parents[commit]:
+                push(parent, flags[commit])
+
+    def main_only_commits(self, branch, main):
+        """ Returns the commits reachable from `main` but not from `branch` (`git log branch..main`). """
+        commits = []
+
+        def on_pop(commit, flags):
+            if flags == self.MAIN:
+                commits.append(commit)
+            return flags
+
+        self._paint_down([(main, self.MAIN), (branch, self.BRANCH)], on_pop, done_flags=self.BRANCH)
+        return commits
+
+    def merge_bases(self, first, second):
+        """ Returns the best common ancestors of two commits, newest first (`git merge-base --all`). """
+        bases = []
+
+        def on_pop(commit, flags):
+            if flags == self.MAIN | self.BRANCH:
+                bases.append(commit)
+                flags |= self.STALE
+            return flags
+
+        self._paint_down([(first, self.MAIN), (second, self.BRANCH)], on_pop, done_flags=self.STALE)
+        return sorted(bases, key=lambda commit: -self.timestamps[commit])
+
+    def find_fork_point(self, branch, main_ref):
+        """
+        Finds the fork commit of a branch in the loaded graph.
+
+        Returns:
+            tuple: (fork_commit, fork_commit_date, latest_commit_date) with dates in `%ci` format, or None if the
+            fork commit can't be determined.
+        """
+        main = self.refs[main_ref]
+        tip = self.refs.get(branch)
+        commits = self.main_only_commits(tip, main) if tip is not None else []
+        if not commits:
             logging.warning(f"No oldest commit found for branch {branch}. Skipping fork commit calculation.")
-            continue
+            return None
+
+        # The last commit printed by `git log branch..main` is the one git pops last from its queue
+        ranks = self.walk_ranks(main)
+        oldest_commit = max(commits, key=ranks.__getitem__)
+        bases = self.merge_bases(oldest_commit, tip)
+        if not bases:
+            logging.error(f"Failed to find merge base for branch {branch}. Skipping this branch.")
+            return None
+
+        fork_commit = bases[0]
+        return self.shas[fork_commit], self.dates[fork_commit], self.dates[tip]
+
+
+def get_remote_refs(repo_path):
+    """ Returns a dict of remote branch name -> tip sha. """
+    ref_shas = {}
+    output = run_git_command("git for-each-ref --format='%(refname:short) %(objectname)' refs/remotes", repo_path)
+    for line in output.splitlines():
+        name, sha = line.rsplit(' ', 1)
+        ref_shas[name] = sha
+    return ref_shas
+
+
+def load_fork_point_cache(cache_file):
+    """
+    Loads the fork points computed by previous runs.
+
+    Returns:
+        dict: branch -> (branch tip sha, main tip sha, engine, fork point). An entry is only valid while both tips are
+        unchanged and for the engine that computed it, since the engines may disagree with skewed commit times.
+    """
+    try:
+        with open(cache_file, 'r') as file:
+            # Entries written by older versions, without the engine, are recomputed
+            return {branch: tuple(entry) for branch, entry in json.load(file).items() if len(entry) == 4}
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logging.warning(f"Fork point cache {cache_file} is corrupted, ignoring it")
+        return {}
+
+
+def fork_point_cache_entries(fork_points, ref_shas, main_branch, engine):
+    """ Returns the cache entries of the fork points, as loaded by `load_fork_point_cache`. """
+    main_sha = ref_shas.get(f'origin/{main_branch}')
+    return {branch: (ref_shas.get(branch), main_sha, engine, fork_point) for branch, fork_point in fork_points.items()}
+
+
+def save_fork_point_cache(cache_file, cache):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    # Write to a temporary file first, so that an interrupted run can't leave a truncated cache behind
+    with open(cache_file + '.tmp', 'w') as file:
+        json.dump(cache, file)
+    os.replace(cache_file + '.tmp', cache_file)
+
+
+def analyze_branches(branches, analyze_branch, create_executor, jobs):
+    """
+    Analyzes the branches, in parallel if more than one job is requested.
+
+    A failing git command only skips the affected branch.
+
+    Returns:
+        dict: branch -> fork point (None if the branch has no fork point) for every successfully analyzed branch.
+    """
+    if jobs > 1:
+        logging.info(f"Analyzing {len(branches)} branches with {jobs} workers")
+        executor = create_executor()
+        results = [executor.submit(analyze_branch, branch) for branch in branches]
+    else:
+        executor = None
+        results = branches
+
+    fork_points = {}
+    for branch, result in zip(branches, results):
+        try:
+            fork_points[branch] = result.result() if executor else analyze_branch(branch)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Failed to analyze branch {branch} with error: {e}. Skipping this branch.")
+    if executor:
+        executor.shutdown()
+    return fork_points
+
+
+# The commit graph used by `find_fork_point_in_graph`, set once per worker process
+_graph = None
 
-        # Get the dates for the fork commit and the latest commit
-        logging.info(f"Getting dates for fork commit {fork_commit} and latest commit in {branch}")
-        fork_commit_date = run_git_command(f'git show -s --format=%ci {fork_commit}', args.repo_path)
-        latest_commit_date = run_git_command(f'git log -1 --format=%ci {branch}', args.repo_path)
+
+def init_graph_worker(graph):
+    global _graph
+    _graph = graph
+
+
+def find_fork_point_in_graph(branch, main_ref):
+    return _graph.find_fork_point(branch, main_ref)
+
+
+def find_fork_points(repo_path, branches, main_branch, ref_shas, cache, engine='graph', jobs=1, commit_index=False):
+    """
+    Finds the fork points of the branches, reusing the fork points in `cache` (as loaded by `load_fork_point_cache`)
+    of the branches whose tip and main tip didn't move since they were computed by the same engine. The commit
+    index only changes how the commit graph is loaded, not the fork points.
+
+    Returns:
+        dict: branch -> fork point (None if the branch has no fork point) for every successfully analyzed branch, or
+        None if the main branch is not found.
+    """
+    main_ref = f'origin/{main_branch}'
+    main_sha = ref_shas.get(main_ref)
+    fork_points = {}
+    for branch in branches:
+        branch_sha, cached_main_sha, cached_engine, fork_point = cache.get(branch, (None, None, None, None))
+        if main_sha and (cached_main_sha, cached_engine) == (main_sha, engine) and branch_sha == ref_shas.get(branch):
+            fork_points[branch] = fork_point
+    logging.info(f"Found {len(fork_points)} of {len(branches)} branches in cache")
+
+    outdated_branches = [branch for branch in branches if branch not in fork_points]
+    profiler.stage('find_fork_points')
+    if outdated_branches and engine == 'graph':
+        if main_sha is None:
+            logging.error(f"Main branch {main_ref} not found. Exiting.")
+            return None
+        logging.info("Loading commit graph")
+        load_graph = CommitGraph.load_from_index if commit_index else CommitGraph.load
+        graph = load_graph(repo_path, {ref: ref_shas[ref] for ref in outdated_branches + [main_ref]
+                                       if ref in ref_shas})
+        # Rank the main branch history up front so that the workers share it
+        graph.walk_ranks(graph.refs[main_ref])
+        init_graph_worker(graph)
+        # The in-memory walk is CPU bound, so it's spread over processes rather than threads
+        fork_points.update(analyze_branches(
+            outdated_branches, partial(find_fork_point_in_graph, main_ref=main_ref),
+            partial(ProcessPoolExecutor, max_workers=jobs, initializer=init_graph_worker, initargs=(graph,)),
+            jobs
+        ))
+    elif outdated_branches:
+        fork_points.update(analyze_branches(
+            outdated_branches, partial(find_fork_point, main_branch=main_branch, repo_path=repo_path),
+            partial(ThreadPoolExecutor, max_workers=jobs),
+            jobs
+        ))
+    return fork_points
+
+
+def calculate_ages(branches, fork_points, min_age, print_info=False):
+    """
+    Calculates the ages of the branches with a fork point and at least `min_age` days old.
+
+    Returns:
+        tuple: (branch names, fork dates, latest commit dates, fork commits), sorted by latest commit date, newest
+        first.
+    """
+    info = {}
+    for branch in branches:
+        fork_point = fork_points.get(branch)
+        if not fork_point:
+            continue
+        fork_commit, fork_commit_date, latest_commit_date = fork_point
 
         # Convert dates to datetime objects
         fork_commit_date = datetime.datetime.strptime(fork_commit_date, '%Y-%m-%d %H:%M:%S %z')
@@ -97,7 +394,7 @@ def main():
             f"\tFork commit: {fork_commit}\n" \
             f"\tAge: {age_days} days"
 
-        if age_days >= args.min_age:
+        if age_days >= min_age:
             info[latest_commit_date] = s
 
     logging.info("Calculating branch ages")
@@ -106,8 +403,10 @@ def main():
     branch_names = []
     start_dates = []
     end_dates = []
+    fork_commits = []
     for d in sorted(info.keys(), reverse=True):
-        print(info[d])
+        if print_info:
+            print(info[d])
         branch_info = info[d].split('\n')
         branch_name = branch_info[0].split(': ')[1]
         latest_commit_date = datetime.datetime.strptime(branch_info[1].split(': ')[1], '%Y-%m-%d %H:%M:%S%z')
@@ -116,12 +415,14 @@ def main():
         branch_names.append(branch_name)
         start_dates.append(fork_date)
         end_dates.append(latest_commit_date)
+        fork_commits.append(branch_info[3].split(': ')[1])
+    return branch_names, start_dates, end_dates, fork_commits
 
-    if not start_dates:
-        logging.error("No valid branch data found. Exiting.")
-        return
 
-    # Plotting
+# Function to plot the ages of the branches as horizontal bars from their fork date to their latest commit
+def plot_branch_ages(branch_names, start_dates, end_dates, output_file):
+    # matplotlib is only imported when a chart is requested
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(12, max(5, len(branch_names))))
     bar_widths = [(end - start).days for start, end in zip(start_dates, end_dates)]
     plt.barh(branch_names, bar_widths, left=start_dates, color='skyblue', edgecolor='black')
@@ -152,8 +453,151 @@ def main():
         current_month = current_month.replace(year=next_year, month=next_month)
 
     plt.subplots_adjust(left=0.3)  # Further adjust the left margin to fit y-axis labels
-    plt.savefig(args.output_file)
-    logging.info(f"Branch age plot saved to: {os.path.abspath(args.output_file)}")
+    profiler.stage('savefig')
+    plt.savefig(output_file)
+    plt.close()
+    logging.info(f"Branch age plot saved to: {os.path.abspath(output_file)}")
+
+
+def calculate_branch_ages(args, pipeline=None):
+    """
+    Calculates the ages of the branches and plots them or writes them as data, as configured by the command line
+    arguments. The chart is rendered by the `pipeline` if given, whose render worker can import matplotlib while the
+    fork points are searched.
+
+    Returns:
+        list: (branch, fork date, latest commit date) tuples, or None if no branches were found.
+    """
+    profiler.stage('fetch')
+    if args.no_fetch:
+        logging.info("Skipping fetch")
+    else:
+        # Fetch all branches
+        logging.info("Fetching all branches")
+        run_git_command('git fetch --all', args.repo_path)
+
+    # Get all release branches
+    profiler.stage('list_branches')
+    logging.info("Getting all release branches")
+    branches = run_git_command('git branch -r', args.repo_path).split('\n')
+    if not branches:
+        logging.error("No branches found. Exiting.")
+        return
+
+    import re
+    branch_pattern = re.compile(args.branch_regex)
+    release_branches = [branch.strip() for branch in branches if branch_pattern.match(branch.strip())]
+
+    main_ref = f'origin/{args.main_branch}'
+    ref_shas = get_remote_refs(args.repo_path)
+    main_sha = ref_shas.get(main_ref)
+
+    # Reuse the fork points of branches whose tip and main tip didn't move since the last run
+    cache = {}
+    if not args.no_cache:
+        profiler.stage('load_cache')
+        git_dir = os.path.join(args.repo_path, run_git_command('git rev-parse --git-dir', args.repo_path))
+        cache_dir = args.cache_dir or os.path.join(git_dir, 'git-insights')
+        cache_file = os.path.join(cache_dir, 'fork_points.json')
+        cache = load_fork_point_cache(cache_file)
+        logging.info(f"Loaded fork point cache {cache_file}")
+
+    fork_points = find_fork_points(args.repo_path, release_branches, args.main_branch, ref_shas, cache, args.engine,
+                                   args.jobs, args.commit_index)
+    if fork_points is None:
+        return
+
+    updated_entries = fork_point_cache_entries(fork_points, ref_shas, args.main_branch, args.engine)
+    if not args.no_cache and main_sha and any(cache.get(branch) != entry for branch, entry in updated_entries.items()):
+        profiler.stage('save_cache')
+        # Keep the entries of branches filtered out by --branch_regex, but forget the deleted branches
+        all_branches = {branch.strip() for branch in branches}
+        cache = {branch: entry for branch, entry in cache.items() if branch in all_branches}
+        cache.update(updated_entries)
+        save_fork_point_cache(cache_file, cache)
+
+    profiler.stage('calculate_ages')
+    branch_names, start_dates, end_dates, fork_commits = calculate_ages(release_branches, fork_points, args.min_age,
+                                                                        print_info=args.format == 'png')
+
+    if args.format != 'png':
+        profiler.stage('write_data')
+        output_file = data_file(args.output_file, args.format)
+        write_records(((branch, fork_commit, start, end, (end - start).days)
+                       for branch, fork_commit, start, end in zip(branch_names, fork_commits, start_dates, end_dates)),
+                      ['branch', 'fork_commit', 'fork_date', 'latest_commit_date', 'age_days'], output_file,
+                      args.format)
+        logging.info(f"Branch ages saved to: {output_file}")
+        return list(zip(branch_names, start_dates, end_dates))
+
+    if not start_dates:
+        logging.error("No valid branch data found. Exiting.")
+        return
+
+    # Plotting
+    profiler.stage('plot')
+    pipeline = pipeline or Pipeline(render_jobs=0)
+    pipeline.render(plot_branch_ages, branch_names, start_dates, end_dates, args.output_file)
+    pipeline.wait()
+    return list(zip(branch_names, start_dates, end_dates))
+
+
+def main(argv=None):
+    # Define color codes
+    RESET = "\033[0m"
+    COLORS = {
+        'DEBUG': "\033[94m",  # Blue
+        'INFO': "\033[92m",  # Green
+        'WARNING': "\033[93m",  # Yellow
+        'ERROR': "\033[91m",  # Red
+        'CRITICAL': "\033[95m"  # Magenta
+    }
+
+    class ColoredFormatter(logging.Formatter):
+        def format(self, record):
+            log_fmt = f"{COLORS.get(record.levelname, RESET)}%(asctime)s - %(levelname)s - %(message)s{RESET}"
+            formatter = logging.Formatter(log_fmt)
+            return formatter.format(record)
+
+    # Set up logging with colors
+    handler = logging.StreamHandler()
+    handler.setFormatter(ColoredFormatter())
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+    logging.info("Starting branch age calculation")
+
+    parser = argparse.ArgumentParser(description='Calculate the age of release branches.')
+    parser.add_argument('--repo_path', type=str, required=True, help='Path to the repository')
+    parser.add_argument('--output_file', type=str, default='out/branch_ages.png',
+                        help='File name for the branch age plot')
+    parser.add_argument('--main_branch', type=str, default='main', help='Name of the main branch to compare against')
+    parser.add_argument('--branch_regex', type=str, default='.+', help='Regex pattern to filter branches')
+    parser.add_argument('--min_age', type=int, default=0, help='Minimum age of branches to include in days')
+    parser.add_argument('--engine', choices=['graph', 'git'], default='graph',
+                        help='Load the commit graph once (graph) or run git commands per branch (git)')
+    parser.add_argument('--commit_index', action='store_true',
+                        help='Load the commit graph from the commit index shared by the git-insights scripts')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of branches to analyze in parallel')
+    parser.add_argument('--no_fetch', action='store_true', help='Skip fetching the branches before the analysis')
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help='Directory for the fork point cache. Default is git-insights in the .git directory')
+    parser.add_argument('--no_cache', action='store_true', help='Neither read nor update the fork point cache')
+    parser.add_argument('--format', choices=FORMATS, default='png',
+                        help='Plot the branch ages (png) or write them as json or csv')
+    parser.add_argument('--render_jobs', type=int, default=default_render_jobs(1),
+                        help='Number of processes rendering the charts while the analysis goes on, 0 to render them '
+                             'in the main process. Default is one less than the number of CPUs, at most 1')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write a report of the time spent per stage, in git commands and the peak memory')
+    parser.add_argument('--profile_trace', action='store_true',
+                        help='With --profile, also write the stages and git commands in Chrome trace format')
+    args = parser.parse_args(argv)
+
+    # The render worker starts while the branches are analyzed
+    with Pipeline(args.render_jobs if args.format == 'png' else 0) as pipeline:
+        if args.profile:
+            return profiler.profile(partial(calculate_branch_ages, args, pipeline), args.output_file,
+                                    args.profile_trace, argv=command_line(__file__, argv))
+        return calculate_branch_ages(args, pipeline)
 
 
 if __name__ == '__main__':
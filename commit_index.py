@@ -0,0 +1,186 @@
+import logging
+import os
+import sqlite3
+import subprocess
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS commits (
+    id INTEGER PRIMARY KEY,
+    sha TEXT NOT NULL UNIQUE,
+    author_name TEXT NOT NULL,
+    author_email TEXT NOT NULL,
+    author_time INTEGER NOT NULL,
+    committer_time INTEGER NOT NULL,
+    committer_date TEXT NOT NULL,
+    generation INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parents (
+    child INTEGER NOT NULL,
+    parent INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (child, position)
+);
+CREATE TABLE IF NOT EXISTS tips (
+    sha TEXT PRIMARY KEY
+);
+'''
+
+# Commits are read from `git log` with these fields, separated by NUL characters
+LOG_FORMAT = '%H%x00%P%x00%an%x00%ae%x00%at%x00%ct%x00%ci'
+
+
+def default_index_file(repo_path):
+    """ Returns the default location of the commit index: git-insights/commits.sqlite in the .git directory. """
+    git_dir = subprocess.check_output(['git', 'rev-parse', '--git-dir'], cwd=repo_path).decode('utf-8').strip()
+    return os.path.join(repo_path, git_dir, 'git-insights', 'commits.sqlite')
+
+
+class CommitIndex:
+    """
+    Persistent index of the commits of a repository, shared by the git-insights scripts.
+
+    The index stores the sha, parents, author name and email, author and committer dates and the generation number
+    of every commit reachable from the refs of the repository. It's updated incrementally: only the commits that
+    aren't reachable from the tips indexed by the previous update are read from git.
+    """
+
+    def __init__(self, repo_path, index_file=None):
+        self.repo_path = repo_path
+        self.index_file = index_file or default_index_file(repo_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_file)), exist_ok=True)
+        self.connection = sqlite3.connect(self.index_file)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def update(self):
+        """ Indexes the commits reachable from all refs and HEAD that aren't indexed yet. Returns their number. """
+        output = subprocess.check_output(['git', 'for-each-ref', '--format=%(objectname)', 'refs/heads',
+                                          'refs/remotes', 'refs/tags'], cwd=self.repo_path).decode('utf-8')
+        tips = set(output.split())
+        head = subprocess.run(['git', 'rev-parse', '--verify', '--quiet', 'HEAD'], cwd=self.repo_path,
+                              stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
+        if head:
+            tips.add(head)
+        indexed_tips = {sha for sha, in self.connection.execute('SELECT sha FROM tips')}
+        # Tips whose objects were pruned since the last update, e.g. after an amend or a force push, are forgotten
+        pruned_tips = self._missing_objects(indexed_tips - tips)
+        indexed_tips -= pruned_tips
+        new_tips = tips - indexed_tips
+        if not new_tips:
+            with self.connection:
+                self._save_tips(new_tips, pruned_tips)
+            return 0
+
+        # Everything reachable from the indexed tips is in the index already
+        logging.info(f"Executing command: git log --topo-order --stdin in {self.repo_path}")
+        process = subprocess.Popen(['git', 'log', '--topo-order', '--ignore-missing', '--stdin',
+                                    f'--format={LOG_FORMAT}'], cwd=self.repo_path, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, text=True, errors='replace')
+        process.stdin.write(''.join(f'{sha}\n' for sha in new_tips) + ''.join(f'^{sha}\n' for sha in indexed_tips))
+        process.stdin.close()
+        commits = [line.rstrip('\n').split('\0') for line in process.stdout]
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, 'git log --topo-order --stdin')
+        # Commits that were only excluded by a pruned tip are listed again, they are indexed already
+        indexed = self._lookup(commit[0] for commit in commits)
+        commits = [commit for commit in commits if commit[0] not in indexed]
+
+        # Children are listed before their parents, so ids and generations are assigned in reverse order
+        known = self._lookup({parent for commit in commits for parent in commit[1].split()})
+        next_id = self.connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM commits').fetchone()[0]
+        commit_rows = []
+        parent_rows = []
+        for commit_id, (sha, parent_shas, author_name, author_email, author_time, committer_time,
+                        committer_date) in enumerate(reversed(commits), start=next_id):
+            # Parents missing from the repository (e.g. in shallow clones) are ignored
+            parents = [known[parent] for parent in parent_shas.split() if parent in known]
+            generation = 1 + max((parent_generation for _, parent_generation in parents), default=0)
+            known[sha] = (commit_id, generation)
+            commit_rows.append((commit_id, sha, author_name, author_email, int(author_time), int(committer_time),
+                                committer_date, generation))
+            parent_rows.extend((commit_id, parent_id, position) for position, (parent_id, _) in enumerate(parents))
+
+        with self.connection:
+            self.connection.executemany('INSERT INTO commits VALUES (?, ?, ?, ?, ?, ?, ?, ?)', commit_rows)
+            self.connection.executemany('INSERT INTO parents VALUES (?, ?, ?)', parent_rows)
+            self._save_tips(new_tips, pruned_tips)
+        logging.info(f"Indexed {len(commits)} new commits in {self.index_file}")
+        return len(commits)
+
+    def _save_tips(self, new_tips, pruned_tips):
+        self.connection.executemany('INSERT OR IGNORE INTO tips VALUES (?)', [(sha,) for sha in new_tips])
+        self.connection.executemany('DELETE FROM tips WHERE sha = ?', [(sha,) for sha in pruned_tips])
+
+    def _missing_objects(self, shas):
+        """ Returns the given shas whose objects don't exist in the repository (anymore). """
+        if not shas:
+            return set()
+        output = subprocess.run(['git', 'cat-file', '--batch-check'], cwd=self.repo_path, check=True,
+                                input=''.join(f'{sha}\n' for sha in shas), stdout=subprocess.PIPE, text=True).stdout
+        return {line.split()[0] for line in output.splitlines() if line.endswith(' missing')}
+
+    def _lookup(self, shas):
+        """ Returns a dict of sha -> (id, generation) for the given shas that are indexed. """
+        shas = list(shas)
+        found = {}
+        for i in range(0, len(shas), 500):
+            chunk = shas[i:i + 500]
+            found.update((sha, (commit_id, generation)) for sha, commit_id, generation in self.connection.execute(
+                f'SELECT sha, id, generation FROM commits WHERE sha IN ({",".join("?" * len(chunk))})', chunk
+            ))
+        return found
+
+    def resolve(self, rev):
+        """ Returns the sha of the commit a revision (e.g. a branch name) points to. """
+        return subprocess.check_output(['git', 'rev-parse', '--verify', f'{rev}^{{commit}}'],
+                                       cwd=self.repo_path).decode('utf-8').strip()
+
+    def iter_commits(self, rev, since=None):
+        """
+        Yields (committer date, author email, author name) for the commits reachable from a revision, the same
+        commits `git log rev --since=since` lists. As in git, the walk doesn't continue past commits older than
+        `since`.
+        """
+        max_age = 0
+        if since:
+            # Let git parse the date, so that the cut-off is exactly the one used by `git log --since`
+            output = subprocess.check_output(['git', 'rev-parse', f'--since={since}'], cwd=self.repo_path)
+            max_age = int(output.decode('utf-8').strip().split('=')[1])
+        yield from self.connection.execute('''
+            WITH RECURSIVE reachable(id) AS (
+                SELECT id FROM commits WHERE sha = ? AND committer_time >= ?
+                UNION
+                SELECT commits.id FROM reachable
+                JOIN parents ON parents.child = reachable.id
+                JOIN commits ON commits.id = parents.parent
+                WHERE commits.committer_time >= ?
+            )
+            SELECT substr(committer_date, 1, 10), author_email, author_name FROM commits JOIN reachable USING (id)
+        ''', (self.resolve(rev), max_age, max_age))
+
+    def load_graph(self):
+        """
+        Loads the whole commit graph.
+
+        Returns:
+            tuple: (shas, parents, committer timestamps, committer dates, generations), indexed by commit ids
+            starting at 0. `parents` holds a tuple of parent ids per commit.
+        """
+        shas = []
+        timestamps = []
+        dates = []
+        generations = []
+        for sha, committer_time, committer_date, generation in self.connection.execute(
+                'SELECT sha, committer_time, committer_date, generation FROM commits ORDER BY id'):
+            shas.append(sha)
+            timestamps.append(committer_time)
+            dates.append(committer_date)
+            generations.append(generation)
+
+        # Ids are assigned in insertion order without gaps, so commit id N is at position N - 1
+        parents = [[] for _ in shas]
+        for child, parent in self.connection.execute('SELECT child, parent FROM parents ORDER BY child, position'):
+            parents[child - 1].append(parent - 1)
+        return shas, [tuple(commit_parents) for commit_parents in parents], timestamps, dates, generations
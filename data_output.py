@@ -0,0 +1,55 @@
+import csv
+import json
+import os
+import sys
+
+# Output formats of the scripts: a chart, or the data of the chart
+FORMATS = ['png', 'json', 'csv']
+
+
+def data_file(output_file, output_format):
+    """
+    Returns the file to write data in `output_format` to: the chart file with its .png extension replaced by the
+    extension of the format, or with the extension appended if it has none. Other extensions are kept. `-` stands for
+    the standard output.
+    """
+    root, extension = os.path.splitext(output_file)
+    if output_file == '-' or extension and extension.lower() != '.png':
+        return output_file
+    return f'{root}.{output_format}'
+
+
+def serialize(value):
+    """ Converts dates and datetimes to ISO 8601 strings, other values are returned as is. """
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def records_to_dicts(records, fields):
+    """ Converts records (tuples of values in the order of `fields`) to JSON-serializable dictionaries. """
+    return [dict(zip(fields, map(serialize, record))) for record in records]
+
+
+def write_records(records, fields, output_file, output_format):
+    """
+    Writes records as a JSON list of objects or as CSV rows with a header.
+
+    Args:
+        records (iterable): Tuples of values in the order of `fields`.
+        fields (list): Names of the fields.
+        output_file (str): File to write to, or `-` for the standard output.
+        output_format (str): `json` or `csv`.
+    """
+    if output_file != '-' and os.path.dirname(output_file):
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    file = sys.stdout if output_file == '-' else open(output_file, 'w', newline='')
+    try:
+        if output_format == 'json':
+            json.dump(records_to_dicts(records, fields), file)
+            file.write('\n')
+        else:
+            writer = csv.writer(file)
+            writer.writerow(fields)
+            writer.writerows(map(serialize, record) for record in records)
+    finally:
+        if file is not sys.stdout:
+            file.close()
@@ -0,0 +1,526 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import matplotlib
+
+# Charts are only rendered to files, from the threads of the server
+matplotlib.use('Agg')
+
+import calculate_branch_age  # noqa: E402
+import plot_number_of_contributors  # noqa: E402
+import plot_open_issues  # noqa: E402
+from analyze_repositories import load_manifest  # noqa: E402
+from data_output import records_to_dicts  # noqa: E402
+
+# Define color codes
+RESET = "\033[0m"
+COLORS = {
+    'DEBUG': "\033[94m",  # Blue
+    'INFO': "\033[92m",  # Green
+    'WARNING': "\033[93m",  # Yellow
+    'ERROR': "\033[91m",  # Red
+    'CRITICAL': "\033[95m",  # Magenta
+}
+
+
+class ColoredFormatter(logging.Formatter):
+    def format(self, record):
+        log_fmt = f"{COLORS.get(record.levelname, RESET)}%(asctime)s - %(levelname)s - %(message)s{RESET}"
+        formatter = logging.Formatter(log_fmt)
+        return formatter.format(record)
+
+
+class Repository:
+    """
+    In-memory state of a repository: the commit dates of its contributors, the fork points of its branches and its
+    issues and releases.
+
+    Each refresh only reads what changed since the previous one: the commits added to the branch, the branches whose
+    tip moved and the issues updated since the last sync. If anything changed, `version` is incremented, which
+    invalidates the cached responses of the repository.
+    """
+
+    def __init__(self, config, args):
+        self.path = config['path']
+        self.name = config.get('name') or os.path.basename(os.path.normpath(self.path))
+        self.branch = config.get('branch', 'main')
+        self.main_branch = config.get('main_branch', self.branch)
+        self.branch_regex = re.compile(config.get('branch_regex', '.+'))
+        self.exclusions = config.get('exclusions', ['dependabot', 'snyk'])
+        self.github = config.get('github')
+        self.args = args
+        # Refreshes of the repository are serialized, requests read the state without waiting for them
+        self.lock = threading.Lock()
+        self.version = 0
+        self.refreshed_at = None
+        self.errors = {}
+
+        # Commit dates of the contributors as of the `head` commit of the branch
+        self.head = None
+        self.mailmap = None
+        self.contributors = {}
+        self.contributor_days = plot_number_of_contributors.contributor_days({})
+
+        # Fork points of the branches, by the branch and main tips they were computed for
+        self.branches = []
+        self.fork_point_cache = {}
+        self.fork_points = {}
+
+        # Issues by id, and the releases with their ETag
+        self.issues = {}
+        self.issues_synced_at = None
+        self.df_issues = plot_open_issues.issues_to_frame([])
+        self.releases = []
+        self.releases_etag = None
+
+    def git(self, *command):
+        return subprocess.check_output(['git'] + list(command), cwd=self.path, text=True).strip()
+
+    def refresh_contributors(self):
+        """
+        Reads the commits added to the branch since the last refresh. The whole history is read again if it was
+        rewritten or if the mailmap changed.
+
+        Returns:
+            bool: Whether the contributors changed.
+        """
+        mailmap = plot_number_of_contributors.parse_mailmap(self.path)
+        head = self.git('rev-parse', '--verify', f'{self.branch}^{{commit}}')
+        if head == self.head and mailmap == self.mailmap:
+            return False
+
+        # Only commits added on top of the previous head can be read incrementally
+        incremental = self.head is not None and mailmap == self.mailmap and subprocess.run(
+            ['git', 'merge-base', '--is-ancestor', self.head, head], cwd=self.path
+        ).returncode == 0
+        commits = plot_number_of_contributors.list_commits(self.path, f'{self.head}..{head}' if incremental else head)
+        logging.info(f"{self.name}: reading {len(commits)} {'new ' if incremental else ''}commits")
+        new_contributors = {}
+        if commits:
+            new_contributors, _ = plot_number_of_contributors.scan_commits(
+                self.path, [sha for _, sha in commits], mailmap, self.exclusions
+            )
+
+        # The newest commits come first, so the contributors are ordered as by a scan of the whole history
+        contributors = {contributor: set(map(date.fromisoformat, commit_dates))
+                        for contributor, commit_dates in new_contributors.items()}
+        if incremental:
+            for contributor, commit_dates in self.contributors.items():
+                contributors[contributor] = contributors.get(contributor, set()) | commit_dates
+
+        self.contributor_days = plot_number_of_contributors.contributor_days(contributors)
+        self.contributors = contributors
+        self.head = head
+        self.mailmap = mailmap
+        return True
+
+    def refresh_branches(self):
+        """
+        Fetches the branches and finds the fork points of the branches whose tip or main tip moved.
+
+        Returns:
+            bool: Whether the branches or their fork points changed.
+        """
+        if not self.args.no_fetch:
+            calculate_branch_age.run_git_command('git fetch --all', self.path)
+        branches = calculate_branch_age.run_git_command('git branch -r', self.path).split('\n')
+        branches = [branch.strip() for branch in branches if self.branch_regex.match(branch.strip())]
+        ref_shas = calculate_branch_age.get_remote_refs(self.path)
+        fork_points = calculate_branch_age.find_fork_points(self.path, branches, self.main_branch, ref_shas,
+                                                            self.fork_point_cache, engine=self.args.engine,
+                                                            jobs=self.args.jobs)
+        fork_point_cache = calculate_branch_age.fork_point_cache_entries(fork_points, ref_shas, self.main_branch,
+                                                                         self.args.engine)
+        if branches == self.branches and fork_point_cache == self.fork_point_cache:
+            return False
+
+        self.fork_points = fork_points
+        self.fork_point_cache = fork_point_cache
+        self.branches = branches
+        return True
+
+    def refresh_issues(self, session):
+        """
+        Fetches the issues updated since the last sync, all of them the first time, and the releases if they
+        changed.
+
+        Returns:
+            bool: Whether the issues or releases changed.
+        """
+        if not self.github:
+            return False
+        params = {'state': 'all', 'since': self.issues_synced_at} if self.issues_synced_at else {'state': 'all'}
+        pages = list(plot_open_issues.iter_issue_pages(self.github, params, session, self.args.parallel_requests,
+                                                       self.args.api_url, self.args.backend))
+        # Issues updated at the time of the last sync are returned again
+        changed_issues = [issue for _, issues, _ in pages for issue in issues if self.issues.get(issue['id']) != issue]
+        logging.info(f"{self.name}: {len(changed_issues)} issues changed")
+        response, releases = plot_open_issues.fetch_github_pages(
+            self.github, 'releases', session=session, max_workers=self.args.parallel_requests,
+            api_url=self.args.api_url, headers={'If-None-Match': self.releases_etag} if self.releases_etag else {}
+        )
+
+        self.issues_synced_at = plot_open_issues.get_server_time(pages[0][0])
+        if changed_issues:
+            issues = dict(self.issues)
+            issues.update((issue['id'], issue) for issue in changed_issues)
+            self.df_issues = plot_open_issues.issues_to_frame(issues.values())
+            self.issues = issues
+        if releases is not None:
+            self.releases = releases
+            self.releases_etag = response.headers.get('ETag')
+        return bool(changed_issues) or releases is not None
+
+    def refresh(self, session):
+        """ Refreshes the state of the repository. A failing part is recorded in `errors` and keeps its last state. """
+        with self.lock:
+            changed = False
+            for part, refresh in [('contributors', self.refresh_contributors),
+                                  ('branch_ages', self.refresh_branches),
+                                  ('open_issues', lambda: self.refresh_issues(session))]:
+                try:
+                    changed |= refresh()
+                    self.errors.pop(part, None)
+                except Exception as e:
+                    logging.exception(f"Refreshing the {part} of {self.name} failed")
+                    self.errors[part] = repr(e)
+            if changed:
+                self.version += 1
+            self.refreshed_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+            return changed
+
+    def status(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'version': self.version,
+            'refreshed_at': self.refreshed_at,
+            'errors': dict(self.errors),
+            'contributors': len(self.contributors),
+            'branches': len(self.branches),
+            'issues': len(self.issues),
+        }
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def get_int(query, name, default):
+    try:
+        return int(query.get(name, [default])[-1])
+    except ValueError:
+        raise RequestError(400, f"Parameter {name} must be an integer")
+
+
+def get_flag(query, name):
+    return query.get(name, ['false'])[-1].lower() in ('1', 'true', 'yes')
+
+
+def contributor_series(repository, query):
+    """ Computes the activity periods and contributor counts of a repository for the window of the query. """
+    names, ids, days = repository.contributor_days
+    activity_periods = plot_number_of_contributors.activity_periods_from_days(
+        names, ids, days, timedelta(days=get_int(query, 'window_days', 90)), get_int(query, 'granularity_days', 15)
+    )
+    activity_periods = plot_number_of_contributors.filter_activity_periods(
+        activity_periods, get_int(query, 'contribution_duration', 1)
+    )
+    return activity_periods, plot_number_of_contributors.aggregate_contributors_by_time(activity_periods)
+
+
+def branch_age_series(repository, query):
+    """ Computes the ages of the branches of a repository that are at least `min_age` days old. """
+    return calculate_branch_age.calculate_ages(repository.branches, repository.fork_points,
+                                               get_int(query, 'min_age', 0))
+
+
+def open_issue_series(repository, query):
+    """ Counts the open issues of a repository for each label filter of the query. """
+    label_filters = list(dict.fromkeys(query.get('labels', ['type: bug'])))
+    if repository.df_issues.empty:
+        raise RequestError(404, f"No issues of {repository.name}")
+    return plot_open_issues.count_open_issues_by_labels(
+        repository.df_issues, label_filters, frequency=query.get('frequency', ['D'])[-1],
+        state=query.get('state', ['all'])[-1]
+    )
+
+
+def json_response(records, fields):
+    return 'application/json', json.dumps(records_to_dicts(records, fields)).encode()
+
+
+def render_activity_periods(repository, query, chart_file):
+    activity_periods, _ = contributor_series(repository, query)
+    return json_response(((contributor, start_date, end_date, duration)
+                          for contributor, periods in activity_periods.items()
+                          for start_date, end_date, duration in periods),
+                         ['contributor', 'start_date', 'end_date', 'duration'])
+
+
+def render_contributor_counts(repository, query, chart_file):
+    _, aggregated_data = contributor_series(repository, query)
+    return json_response(aggregated_data, ['date', 'contributors'])
+
+
+def render_activity_plot(repository, query, chart_file):
+    activity_periods, _ = contributor_series(repository, query)
+    if not activity_periods:
+        raise RequestError(404, f"No contributors of {repository.name}")
+    # The activity plot prints every period, which is of no use to the server
+    with contextlib.redirect_stdout(io.StringIO()):
+        plot_number_of_contributors.plot_contributors(activity_periods, SimpleNamespace(),
+                                                      get_flag(query, 'less_than_year'), chart_file)
+
+
+def render_contributor_count_plot(repository, query, chart_file):
+    _, aggregated_data = contributor_series(repository, query)
+    if not aggregated_data:
+        raise RequestError(404, f"No contributors of {repository.name}")
+    plot_number_of_contributors.plot_contributor_count_over_time(aggregated_data, SimpleNamespace(), chart_file)
+
+
+def render_branch_ages(repository, query, chart_file):
+    branch_names, start_dates, end_dates, fork_commits = branch_age_series(repository, query)
+    branch_ages = zip(branch_names, fork_commits, start_dates, end_dates)
+    return json_response(((branch, fork_commit, start, end, (end - start).days)
+                          for branch, fork_commit, start, end in branch_ages),
+                         ['branch', 'fork_commit', 'fork_date', 'latest_commit_date', 'age_days'])
+
+
+def render_branch_age_plot(repository, query, chart_file):
+    branch_names, start_dates, end_dates, _ = branch_age_series(repository, query)
+    if not branch_names:
+        raise RequestError(404, f"No branches of {repository.name}")
+    calculate_branch_age.plot_branch_ages(branch_names, start_dates, end_dates, chart_file)
+
+
+def render_open_issues(repository, query, chart_file):
+    df_open_issues = open_issue_series(repository, query)
+    df_long = df_open_issues.melt(id_vars='date', var_name='labels', value_name='open_issues')
+    return json_response(zip(df_long['date'], df_long['labels'], df_long['open_issues'].tolist()),
+                         ['date', 'labels', 'open_issues'])
+
+
+def render_open_issue_plot(repository, query, chart_file):
+    df_open_issues = open_issue_series(repository, query)
+    if len(df_open_issues.columns) == 2:
+        df_open_issues.columns = ['date', 'open_issues']
+    args = SimpleNamespace(show_release_timestamps=get_flag(query, 'show_release_timestamps'),
+                           color_releases=get_flag(query, 'color_releases'))
+    plot_open_issues.plot_open_issues_over_time(df_open_issues, repository.releases, datetime.now().date(), args,
+                                                chart_file)
+
+
+# Resources served for each repository. Charts are rendered to a file by their function, data is returned by it.
+RESOURCES = {
+    'activity_periods.json': render_activity_periods,
+    'contributor_counts.json': render_contributor_counts,
+    'activity_plot.png': render_activity_plot,
+    'contributor_count_plot.png': render_contributor_count_plot,
+    'branch_ages.json': render_branch_ages,
+    'branch_ages.png': render_branch_age_plot,
+    'open_issues.json': render_open_issues,
+    'open_issues_plot.png': render_open_issue_plot,
+}
+
+
+class ResponseCache:
+    """ Least recently used cache of responses, each valid as long as the version of its repository is unchanged. """
+
+    def __init__(self, size):
+        self.size = size
+        self.responses = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self.lock:
+            cached = self.responses.get(key)
+            if cached is None or cached[0] != version:
+                self.misses += 1
+                return None
+            self.responses.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+
+    def put(self, key, version, response):
+        with self.lock:
+            self.responses[key] = (version, response)
+            self.responses.move_to_end(key)
+            while len(self.responses) > self.size:
+                self.responses.popitem(last=False)
+
+
+class InsightsServer(ThreadingHTTPServer):
+    """ Serves the series and charts of the repositories, computed from their in-memory state. """
+
+    daemon_threads = True
+
+    def __init__(self, address, repositories, output_dir, cache_size=256):
+        super().__init__(address, InsightsRequestHandler)
+        self.repositories = {repository.name: repository for repository in repositories}
+        self.output_dir = output_dir
+        self.cache = ResponseCache(cache_size)
+        # pyplot keeps global state, so charts are rendered one at a time
+        self.render_lock = threading.Lock()
+
+    def render(self, repository, resource, query):
+        """
+        Computes a resource of a repository.
+
+        Returns:
+            tuple: (content type, body)
+        """
+        if resource.endswith('.json'):
+            return RESOURCES[resource](repository, query, None)
+        chart_file = os.path.join(self.output_dir, repository.name, resource)
+        os.makedirs(os.path.dirname(chart_file), exist_ok=True)
+        with self.render_lock:
+            RESOURCES[resource](repository, query, chart_file)
+            with open(chart_file, 'rb') as file:
+                return 'image/png', file.read()
+
+    def status(self):
+        return {
+            'repositories': [repository.status() for repository in self.repositories.values()],
+            'cache': {'responses': len(self.cache.responses), 'hits': self.cache.hits, 'misses': self.cache.misses},
+        }
+
+
+class InsightsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles `GET /repositories` with the status of the repositories and `GET /repositories/<name>/<resource>` with a
+    resource of `RESOURCES`, parameterized by the query string.
+    """
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+    def send_body(self, status, content_type, body, headers={}):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_message(self, status, message):
+        self.send_body(status, 'application/json', json.dumps({'error': message}).encode())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+        if parts in ([], ['repositories']):
+            return self.send_body(200, 'application/json', json.dumps(self.server.status()).encode())
+        if len(parts) != 3 or parts[0] != 'repositories' or parts[1] not in self.server.repositories:
+            return self.send_error_message(404, f"Not found: {url.path}")
+        repository = self.server.repositories[parts[1]]
+        resource = parts[2]
+        if resource not in RESOURCES:
+            return self.send_error_message(404, f"Unknown resource {resource}, available: {', '.join(RESOURCES)}")
+
+        key = (repository.name, resource, tuple(sorted((name, tuple(values)) for name, values in query.items())))
+        version = repository.version
+        response = self.server.cache.get(key, version)
+        if response is None:
+            try:
+                content_type, body = self.server.render(repository, resource, query)
+            except RequestError as e:
+                return self.send_error_message(e.status, str(e))
+            except Exception as e:
+                logging.exception(f"Computing {url.path} failed")
+                return self.send_error_message(500, repr(e))
+            response = content_type, body, f'"{version}-{zlib.crc32(body):08x}"'
+            self.server.cache.put(key, version, response)
+
+        content_type, body, etag = response
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_body(200, content_type, body, {'ETag': etag, 'Cache-Control': 'no-cache'})
+
+
+def refresh_periodically(repositories, session, interval, stop):
+    """ Refreshes the repositories every `interval` seconds until `stop` is set. """
+    while not stop.wait(interval):
+        for repository in repositories:
+            repository.refresh(session)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the insights of repositories from incrementally refreshed '
+                                                 'in-memory state.')
+    parser.add_argument('--manifest', type=str, default=None, help='JSON manifest of the repositories to serve')
+    parser.add_argument('--repo_paths', nargs='*', default=[], help='Paths of repositories to serve')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--refresh_interval', type=int, default=300, help='Seconds between refreshes of the state')
+    parser.add_argument('--output_dir', type=str, default='out/server', help='Directory for the rendered charts')
+    parser.add_argument('--cache_size', type=int, default=256, help='Number of responses to cache')
+    parser.add_argument('--no_fetch', action='store_true', help='Skip fetching the branches before each refresh')
+    parser.add_argument('--engine', choices=['graph', 'git'], default='graph',
+                        help='Load the commit graph once (graph) or run git commands per branch (git)')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of branches to analyze in parallel')
+    parser.add_argument('--api_url', type=str, default=plot_open_issues.GITHUB_API_URL,
+                        help='Base URL of the GitHub API')
+    parser.add_argument('--backend', choices=['rest', 'graphql'], default='rest',
+                        help='GitHub API to fetch issues from, graphql requests only the fields used')
+    parser.add_argument('--token_env', type=str, default='GITHUB_TOKEN',
+                        help='Environment variable with a GitHub token to authenticate with, if set')
+    parser.add_argument('--parallel_requests', type=int, default=4, help='Number of pages to fetch concurrently')
+    args = parser.parse_args(argv)
+
+    # Set up logging with colors
+    handler = logging.StreamHandler()
+    handler.setFormatter(ColoredFormatter())
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
+    configs = (load_manifest(args.manifest) if args.manifest else []) + [{'path': path} for path in args.repo_paths]
+    if not configs:
+        logging.error("No repositories to serve. Use --manifest or --repo_paths.")
+        return
+    repositories = [Repository(config, args) for config in configs]
+    session = plot_open_issues.create_session(args.parallel_requests, os.environ.get(args.token_env))
+
+    # The state is loaded before serving, later refreshes run in the background
+    for repository in repositories:
+        logging.info(f"Loading {repository.name}")
+        repository.refresh(session)
+    stop = threading.Event()
+    threading.Thread(target=refresh_periodically, args=(repositories, session, args.refresh_interval, stop),
+                     daemon=True).start()
+
+    server = InsightsServer((args.host, args.port), repositories, args.output_dir, args.cache_size)
+    logging.info(f"Serving {len(repositories)} repositories on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
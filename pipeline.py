@@ -0,0 +1,98 @@
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from profiling import profiler
+
+
+def init_render_worker(log_level):
+    """
+    Prepares a render worker process: charts are only saved to files, so the Agg backend is selected, and pyplot is
+    imported right away, while the main process is still analyzing.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+
+    # Worker processes that aren't forked don't inherit the logging configuration
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def default_render_jobs(charts=2):
+    """
+    Returns the default number of render workers: one per chart rendered at a time, but leaving a CPU to the main
+    process. On a single CPU the charts are rendered in the main process, workers would only compete with it.
+    """
+    return max(0, min(charts, (os.cpu_count() or 1) - 1))
+
+
+def ready():
+    """ Does nothing, submitted to start the render workers. """
+
+
+class Pipeline:
+    """
+    Overlaps the independent stages of a script: charts are rendered in worker processes as soon as their data is
+    ready, while the main process goes on with the next stage, and I/O such as fetching data runs in background
+    threads.
+
+    The render workers are started when the pipeline is entered, so that importing matplotlib overlaps the analysis
+    too. With `render_jobs=0` the charts are rendered in the calling process when they are submitted, as by a plain
+    function call. Leaving the `with` block waits for all stages and raises the first error.
+
+    Functions rendered in workers and their arguments must be picklable: module-level functions and plain data.
+    """
+
+    def __init__(self, render_jobs=1):
+        self.render_jobs = render_jobs
+        self.renderers = None
+        self.threads = None
+        self.futures = []
+
+    def __enter__(self):
+        if self.render_jobs > 0:
+            self.renderers = ProcessPoolExecutor(max_workers=self.render_jobs, initializer=init_render_worker,
+                                                 initargs=(logging.getLogger().getEffectiveLevel(),))
+            # Start all workers now, before any background thread is started
+            for _ in range(self.render_jobs):
+                self.renderers.submit(ready)
+        return self
+
+    def render(self, function, *args, **kwargs):
+        """
+        Renders a chart with `function(*args, **kwargs)` in a worker process, whose stages are recorded by the profiler
+        of the main process. Returns its future.
+        """
+        if self.renderers is None:
+            future = Future()
+            future.set_result(function(*args, **kwargs))
+            return future
+        future = profiler.submit(self.renderers, function, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+    def background(self, function, *args, **kwargs):
+        """ Runs `function(*args, **kwargs)` in a background thread. Returns its future. """
+        if self.threads is None:
+            self.threads = ThreadPoolExecutor(max_workers=4)
+        future = self.threads.submit(function, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        """ Waits for all submitted stages and raises the first error. """
+        if any(not future.done() for future in self.futures):
+            profiler.stage('wait_for_pipeline')
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            for executor in (self.renderers, self.threads):
+                if executor is not None:
+                    executor.shutdown(cancel_futures=exc_type is not None)
@@ -1,33 +1,96 @@
 import argparse
 import os
 import logging
+import re
+import subprocess
 from collections import defaultdict
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import partial
+from itertools import chain, product
 
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
-from git import Repo
-from matplotlib.ticker import MaxNLocator
+import numpy as np
+
+from commit_index import CommitIndex
+from data_output import FORMATS, data_file, write_records
+from pipeline import Pipeline, default_render_jobs
+from profiling import command_line, profiler
+
+
+# An optional name followed by an email in angle brackets
+MAILMAP_ENTRY = re.compile(r'([^<>]*)<([^<>]*)>')
 
 
 # Function to read and parse the .mailmap file
 def parse_mailmap(repo_path):
-    mailmap = {}
+    """
+    Parses the .mailmap file of a repository, supporting the same forms as git:
+
+        Proper Name <commit@email>
+        <proper@email> <commit@email>
+        Proper Name <proper@email> <commit@email>
+        Proper Name <proper@email> Commit Name <commit@email>
+
+    Returns:
+        dict: A dictionary where keys are lowercased commit emails and values are dictionaries mapping the lowercased
+        commit name (or None for entries matching any name) to a (proper name, proper email) tuple.
+    """
+    mailmap = defaultdict(dict)
     try:
         with open(repo_path + '/.mailmap', 'r') as file:
             for line in file:
-                canonical_name = ''
-                for part in [n for n in line.split('>') if n != '\n' and n]:
-                    name, email = part.split('<')
-                    name = name.strip()
-                    if not canonical_name:
-                        canonical_name = name
-                    mailmap[email] = canonical_name
+                if line.startswith('#'):
+                    continue
+                parts = [(name.strip() or None, email.strip()) for name, email in MAILMAP_ENTRY.findall(line)]
+                if len(parts) == 1:
+                    proper_name, commit_email = parts[0]
+                    proper_email, commit_name = None, None
+                elif len(parts) >= 2:
+                    (proper_name, proper_email), (commit_name, commit_email) = parts[:2]
+                else:
+                    continue
+
+                # As in git, a later entry for the same commit identity only overrides the parts it specifies
+                key = commit_name.lower() if commit_name else None
+                old_name, old_email = mailmap[commit_email.lower()].get(key, (None, None))
+                mailmap[commit_email.lower()][key] = (proper_name or old_name, proper_email or old_email)
     except FileNotFoundError:
         logging.warning(".mailmap file not found, continuing without it")
     return mailmap
 
 
+class IdentityResolver:
+    """
+    Resolves commit authors to contributor names with the .mailmap and filters out excluded contributors.
+
+    Each distinct (name, email) pair is resolved and checked against the exclusions only once. The exclusions are
+    matched as substrings of the contributor name, all at once with a single compiled pattern.
+    """
+
+    def __init__(self, mailmap, exclusions):
+        self.mailmap = mailmap
+        self.exclusion_pattern = re.compile('|'.join(map(re.escape, exclusions))) if exclusions else None
+        self.contributors = {}
+
+    def map(self, name, email):
+        """ Returns the (proper name, proper email) of a commit author. """
+        names = self.mailmap.get(email.lower())
+        if not names:
+            return name, email
+        proper_name, proper_email = names.get(name.lower()) or names.get(None) or (None, None)
+        return proper_name or name, proper_email or email
+
+    def resolve(self, name, email):
+        """ Returns the contributor name of a commit author, or None if the contributor is excluded. """
+        key = (name, email)
+        if key not in self.contributors:
+            contributor, _ = self.map(name, email)
+            if self.exclusion_pattern and self.exclusion_pattern.search(contributor):
+                contributor = None
+            self.contributors[key] = contributor
+        return self.contributors[key]
+
+
 # Function to process contributors' continuous activity periods
 def process_activity_periods(contributors, window, granularity=7):
     """
@@ -38,6 +101,8 @@ def process_activity_periods(contributors, window, granularity=7):
     range where the gap between any two consecutive commits does not exceed
     the specified 'window' duration.
 
+    The dates of all contributors are processed at once as NumPy arrays of day ordinals.
+
     Args:
         contributors (dict): A dictionary where keys are contributor names and values are sets of commit dates.
         window (timedelta): The maximum allowed gap between consecutive commits to be considered part of the same activity period.
@@ -47,65 +112,397 @@ def process_activity_periods(contributors, window, granularity=7):
         dict: A dictionary where keys are contributor names and values are lists of tuples. Each tuple represents an activity period (start_date, end_date).
       """
 
+    names, ids, days = contributor_days(contributors)
+    return activity_periods_from_days(names, ids, days, window, granularity)
+
+
+def contributor_days(contributors):
+    """
+    Converts the commit dates of contributors to NumPy arrays of day ordinals.
+
+    Returns:
+        tuple: (names, ids, days), where `days` holds the day ordinals of all contributors sorted by (contributor, day)
+        and `ids` the index in `names` of the contributor of each day.
+    """
+    names = list(contributors)
+    counts = np.fromiter(map(len, contributors.values()), dtype=np.int64, count=len(names))
+    days = np.fromiter(map(date.toordinal, chain.from_iterable(contributors.values())), dtype=np.int64,
+                       count=int(counts.sum()))
+
+    # Sort by a single (contributor, day) key, day ordinals fit in 32 bits
+    keys = np.sort(np.repeat(np.arange(len(names), dtype=np.int64) << 32, counts) | days)
+    return names, keys >> 32, keys & 0xFFFFFFFF
+
+
+def activity_periods_from_days(names, ids, days, window, granularity=7):
+    """ Same as `process_activity_periods`, for the arrays returned by `contributor_days`. """
+    # A new period starts at the first date of each contributor and after each gap longer than the window
+    is_start = np.ones(len(days), dtype=bool)
+    is_start[1:] = (ids[1:] != ids[:-1]) | (np.diff(days) > window / timedelta(days=1))
+    is_end = np.ones(len(days), dtype=bool)
+    is_end[:-1] = is_start[1:]
+    starts = np.flatnonzero(is_start)
+    ends = np.flatnonzero(is_end)
+
+    # Adjust the period length based on the granularity
+    start_days = days[starts]
+    actual_lengths = days[ends] - start_days + 1
+    adjusted_end_days = start_days + np.maximum(actual_lengths, granularity)
+
+    # Convert each distinct day to a date only once
+    unique_days, inverse = np.unique(np.concatenate([start_days, adjusted_end_days]), return_inverse=True)
+    unique_dates = [date.fromordinal(day) for day in unique_days.tolist()]
+    period_dates = [unique_dates[i] for i in inverse.tolist()]
+    start_dates = period_dates[:len(starts)]
+    adjusted_end_dates = period_dates[len(starts):]
+    actual_lengths = actual_lengths.tolist()
+
+    # Periods are sorted by contributor, so the periods of each contributor are a contiguous slice
+    period_ids = ids[starts]
+    bounds = [0] + (np.flatnonzero(np.diff(period_ids)) + 1).tolist() + [len(starts)]
     activity_periods = defaultdict(list)
-    for contributor, dates in contributors.items():
-        sorted_dates = sorted(list(dates))
-        start_date = sorted_dates[0]
-        last_date = start_date
-
-        for date in sorted_dates[1:]:
-            if date - last_date > window:
-                # Adjust the period length based on the granularity
-                actual_length = (last_date - start_date).days + 1
-                period_length = max(actual_length, granularity)
-                adjusted_end_date = start_date + timedelta(days=period_length)
-                activity_periods[contributor].append((start_date, adjusted_end_date, actual_length))
-
-                start_date = date
-            last_date = date
-
-        actual_length = (last_date - start_date).days + 1
-        period_length = max(actual_length, granularity)
-        adjusted_end_date = start_date + timedelta(days=period_length)
-        # Append the last period
-        activity_periods[contributor].append((start_date, adjusted_end_date, actual_length))
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        if first < last:
+            activity_periods[names[period_ids[first]]] = list(
+                zip(start_dates[first:last], adjusted_end_dates[first:last], actual_lengths[first:last])
+            )
 
     return activity_periods
 
 
-# Function to count contributors and their activity dates with a minimum contribution filter
-def count_contributors(repo_path, branch, mailmap, exclusions, delta, window, granularity):
+# Number of commits between two progress messages
+PROGRESS_INTERVAL = 10000
+
+# Time buckets of the churn analytics: (days to step past a bucket, function returning the first day of the bucket)
+CHURN_BUCKETS = {
+    'week': (7, lambda day: day - timedelta(days=day.weekday())),
+    'month': (32, lambda day: day.replace(day=1)),
+    'quarter': (93, lambda day: day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)),
+    'year': (366, lambda day: day.replace(month=1, day=1)),
+}
+
+
+# Escape sequences of the paths quoted by git, besides octal bytes
+C_ESCAPES = {b'a': b'\a', b'b': b'\b', b'f': b'\f', b'n': b'\n', b'r': b'\r', b't': b'\t', b'v': b'\v', b'"': b'"',
+             b'\\': b'\\'}
+
+QUOTED_PATH = re.compile(r'"(?:[^"\\]|\\.)*"')
+
+
+def unquote_path(path):
+    """
+    Decodes a path quoted by git, e.g. `"d\\"ir/a\\tb.txt"`. Paths with special characters are quoted in C style even
+    with core.quotepath=false, other paths are returned as they are.
+    """
+    if len(path) < 2 or not (path.startswith('"') and path.endswith('"')):
+        return path
+    unquoted = re.sub(rb'\\([0-7]{3}|.)',
+                      lambda match: bytes([int(match[1], 8)]) if len(match[1]) == 3 else C_ESCAPES[match[1]],
+                      path[1:-1].encode('utf-8'))
+    return unquoted.decode('utf-8', errors='replace')
+
+
+def numstat_path(path):
+    """
+    Returns the path of a `git log --numstat` line, the new path for renames (`old => new`, `a/{old => new}/b`, or
+    `"old" => "new"` if they are quoted).
+    """
+    quoted = QUOTED_PATH.match(path)
+    if quoted:
+        rest = path[quoted.end():]
+        path = rest[len(' => '):] if rest.startswith(' => ') else quoted[0]
+    elif ' => ' in path and '{' in path and not path.endswith('"'):
+        prefix, rest = path.split('{', 1)
+        renamed, suffix = rest.split('}', 1)
+        path = (prefix + renamed.split(' => ', 1)[1] + suffix).replace('//', '/').lstrip('/')
+    elif ' => ' in path:
+        path = path.split(' => ', 1)[1]
+    return unquote_path(path)
+
+
+class ChurnCollector:
+    """
+    Aggregates the lines added and removed per directory and time bucket while the commits are streamed.
+
+    Paths are truncated to their first `depth` directories as soon as they are read, so the memory used grows with the
+    number of directories at that depth and the number of time buckets, not with the number of commits or files.
+    """
+
+    def __init__(self, depth=1, bucket='month'):
+        self.depth = depth
+        self.bucket = bucket
+        # (directory, first day of the bucket) -> [lines added, lines removed]
+        self.churn = {}
+
+    def bucket_start(self, commit_date):
+        return CHURN_BUCKETS[self.bucket][1](commit_date)
+
+    def directory(self, path):
+        """ Returns the directory of a path truncated to `depth` components, `.` for files at the top level. """
+        return '/'.join(path.split('/')[:-1][:self.depth]) or '.'
+
+    def add(self, bucket_start, numstat_line):
+        """ Adds a `--numstat` line ("added<TAB>removed<TAB>path") of a commit. Binary files count as 0 lines. """
+        added, removed, path = numstat_line.split('\t', 2)
+        key = (self.directory(numstat_path(path)), bucket_start)
+        counts = self.churn.get(key)
+        if counts is None:
+            counts = self.churn[key] = [0, 0]
+        if added != '-':
+            counts[0] += int(added)
+            counts[1] += int(removed)
+
+    def update(self, other):
+        """ Adds the churn collected by another collector, e.g. of another shard of the history. """
+        for key, (added, removed) in other.churn.items():
+            counts = self.churn.setdefault(key, [0, 0])
+            counts[0] += added
+            counts[1] += removed
+
+    def records(self):
+        """ Returns (directory, first day of the bucket, lines added, lines removed) tuples, sorted. """
+        return sorted((directory, bucket_start, added, removed)
+                      for (directory, bucket_start), (added, removed) in self.churn.items())
+
+
+def churn_options(churn):
+    """ Returns the git options to list the lines changed per file after each commit, if churn is collected. """
+    return ['-c', 'core.quotepath=false'] if churn is not None else []
+
+
+def iter_commits(repo_path, branch, since=None, churn=None):
+    """
+    Streams the commits of a branch from a single `git log` process.
+
+    If a `ChurnCollector` is given, the same process also lists the lines changed per file (`--numstat`), which are
+    added to the collector line by line as they are read.
+
+    Yields:
+        tuple: (commit date, author email, author name) for every commit. The commit date is the committer date in
+        the committer's time zone, as `Commit.committed_datetime.date()` in GitPython.
+    """
+    command = (['git'] + churn_options(churn) + ['log', '--format=%cs%x00%ae%x00%an'] +
+               (['--numstat'] if churn is not None else []) + ([f'--since={since}'] if since else []) + [branch, '--'])
+    process = subprocess.Popen(command, cwd=repo_path, stdout=subprocess.PIPE, text=True, errors='replace')
+    bucket_start = None
+    for line in process.stdout:
+        # Only the commit lines hold NUL separators, the --numstat lines follow the line of their commit
+        if churn is not None and '\0' not in line:
+            if line != '\n':
+                churn.add(bucket_start, line.rstrip('\n'))
+            continue
+        commit_date, email, name = line.rstrip('\n').split('\0')
+        commit_date = datetime.fromisoformat(commit_date).date()
+        if churn is not None:
+            bucket_start = churn.bucket_start(commit_date)
+        yield commit_date, email, name
+    if process.wait():
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def iter_commits_gitpython(repo_path, branch, since=None):
+    """ Same as `iter_commits`, but reads the commits with GitPython. """
+    from git import Repo
+
     repo = Repo(repo_path)
+    commits = repo.iter_commits(branch, since=since) if since else repo.iter_commits(branch)
+    for commit in commits:
+        yield commit.committed_datetime.date(), commit.author.email, commit.author.name
+
+
+def iter_commits_from_index(repo_path, branch, since=None):
+    """ Same as `iter_commits`, but reads the commits from the shared commit index, after indexing the new commits. """
+    index = CommitIndex(repo_path)
+    try:
+        index.update()
+        for commit_date, email, name in index.iter_commits(branch, since):
+            yield date.fromisoformat(commit_date), email, name
+    finally:
+        index.close()
+
+
+def list_commits(repo_path, branch, since=None):
+    """
+    Lists the commits of a branch with `git rev-list`, which walks the history the same way and in the same order as
+    `git log` in `iter_commits`, without formatting the commits.
+
+    Returns:
+        list: (committer timestamp, sha) tuples, newest first.
+    """
+    command = ['git', 'rev-list', '--timestamp'] + ([f'--since={since}'] if since else []) + [branch, '--']
+    output = subprocess.check_output(command, cwd=repo_path, text=True)
+    return [(int(timestamp), sha) for timestamp, sha in (line.split() for line in output.splitlines())]
+
+
+def scan_commits(repo_path, shas, mailmap, exclusions, churn=None):
+    """
+    Reads the given commits with one `git log --no-walk` process and resolves their contributors, collecting their
+    churn into `churn` if given.
+
+    Returns:
+        tuple: (dict of contributor -> set of commit dates as YYYY-MM-DD strings, number of commits)
+    """
+    resolver = IdentityResolver(mailmap, exclusions)
+    command = (['git'] + churn_options(churn) + ['log', '--no-walk=unsorted', '--stdin'] +
+               ['--format=%cs%x00%ae%x00%an'] + (['--numstat'] if churn is not None else []))
+    process = subprocess.Popen(command, cwd=repo_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                               errors='replace')
+    # git reads all commits from the standard input before it writes the first one
+    process.stdin.write('\n'.join(shas) + '\n')
+    process.stdin.close()
     contributors = defaultdict(set)
-    if delta:
-        since = datetime.now() - delta
-        commits = list(repo.iter_commits(branch, since=since.strftime('%Y-%m-%d')))
-    else:
-        commits = list(repo.iter_commits(branch))
-    total_commits = len(commits)
-    logging.info(f"Analyzing {total_commits} commits...")
+    processed = 0
+    bucket_start = None
+    for line in process.stdout:
+        if churn is not None and '\0' not in line:
+            if line != '\n':
+                churn.add(bucket_start, line.rstrip('\n'))
+            continue
+        commit_date, email, name = line.rstrip('\n').split('\0')
+        processed += 1
+        if churn is not None:
+            bucket_start = churn.bucket_start(date.fromisoformat(commit_date))
+        contributor = resolver.resolve(name, email)
+        if contributor is not None:
+            contributors[contributor].add(commit_date)
+    if process.wait():
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return contributors, processed
+
+
+def scan_commits_with_churn(repo_path, shas, mailmap, exclusions, churn):
+    """ Same as `scan_commits`, but also returns the churn collector, whose copy is filled in a worker process. """
+    contributors, processed = scan_commits(repo_path, shas, mailmap, exclusions, churn)
+    return contributors, processed, churn
+
+
+def count_contributors_sharded(repo_path, branch, mailmap, exclusions, since, jobs, churn=None):
+    """
+    Collects the commit dates of each contributor like the loop in `count_contributors`, but scans the history in
+    `jobs` processes in parallel.
+
+    The commits are listed first, so that the shards hold exactly the commits of the serial scan, and split into
+    `jobs` shards of consecutive commits, which cover consecutive periods since git lists commits by date. Each shard
+    is read by its own `git log` process and resolved in its own worker process, whose `git log` is recorded by the
+    profiler of the main process. The date sets of the shards are merged in the order of the shards, so that the
+    contributors are also ordered as in the serial scan. The churn of the shards, if collected, is added to `churn`.
+
+    Returns:
+        defaultdict: Contributor -> set of commit dates.
+    """
+    commits = list_commits(repo_path, branch, since)
+    shard_size = max(1, -(-len(commits) // jobs))
+    shards = [commits[i:i + shard_size] for i in range(0, len(commits), shard_size)]
+    logging.info(f"Scanning {len(commits)} commits in {len(shards)} shards")
+
+    contributors = defaultdict(set)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        if churn is None:
+            futures = [profiler.submit(executor, scan_commits, repo_path, [sha for _, sha in shard], mailmap,
+                                       exclusions) for shard in shards]
+        else:
+            futures = [profiler.submit(executor, scan_commits_with_churn, repo_path, [sha for _, sha in shard],
+                                       mailmap, exclusions, ChurnCollector(churn.depth, churn.bucket))
+                       for shard in shards]
+        for shard, future in zip(shards, futures):
+            shard_contributors, processed, *shard_churn = future.result()
+            if shard_churn:
+                churn.update(shard_churn[0])
+            for contributor, commit_dates in shard_contributors.items():
+                contributors[contributor].update(date.fromisoformat(commit_date) for commit_date in commit_dates)
+            logging.info(f"Processed {processed} commits from {datetime.fromtimestamp(shard[-1][0]):%Y-%m-%d} to "
+                         f"{datetime.fromtimestamp(shard[0][0]):%Y-%m-%d}")
+    return contributors
+
+
+# Function to collect the commit dates of each contributor
+def collect_contributors(repo_path, branch, mailmap, exclusions, delta, backend='git', jobs=1, churn=None):
+    """
+    Reads the commits of a branch and collects the commit dates of each contributor, and with the git backend the
+    churn of the commits into `churn` if given.
+
+    Returns:
+        dict: A dictionary where keys are contributor names and values are sets of commit dates.
+    """
+    since = (datetime.now() - delta).strftime('%Y-%m-%d') if delta else None
+    if jobs > 1 and backend == 'git':
+        return count_contributors_sharded(repo_path, branch, mailmap, exclusions, since, jobs, churn)
+    if jobs > 1:
+        logging.warning(f"The {backend} backend reads commits in a single process, ignoring --jobs")
+    if churn is not None and backend != 'git':
+        logging.warning(f"The {backend} backend doesn't read the changed lines, ignoring --churn")
+
+    contributors = defaultdict(set)
+    resolver = IdentityResolver(mailmap, exclusions)
+    backends = {'git': partial(iter_commits, churn=churn), 'gitpython': iter_commits_gitpython,
+                'index': iter_commits_from_index}
+    commits = backends[backend](repo_path, branch, since)
+    logging.info("Analyzing commits...")
 
     # Iterating over commits in the specified branch
-    for i, commit in enumerate(commits, start=1):
-        commit_date = commit.committed_datetime.date()
-        contributor = commit.author.email
-        # Using mailmap to resolve duplicate contributors
-        contributor = mailmap.get(contributor, commit.author.name)
-
-        # Check if the contributor is not in the exclusions list
-        if not any(exclusion in contributor for exclusion in exclusions):
+    processed = 0
+    for processed, (commit_date, email, name) in enumerate(commits, start=1):
+        # Using mailmap to resolve duplicate contributors, excluded contributors are resolved to None
+        contributor = resolver.resolve(name, email)
+        if contributor is not None:
             contributors[contributor].add(commit_date)
 
-        # Print progress every 10% of the total commits
-        if i % (total_commits // 10) == 0 or i == total_commits:
-            logging.info(f"Processed {i}/{total_commits} commits ({(i / total_commits) * 100:.1f}%)")
+        # Print progress every PROGRESS_INTERVAL commits
+        if processed % PROGRESS_INTERVAL == 0:
+            logging.info(f"Processed {processed} commits")
+    logging.info(f"Processed {processed} commits in total")
+
+    return contributors
+
 
+# Function to count contributors and their activity dates with a minimum contribution filter
+def count_contributors(repo_path, branch, mailmap, exclusions, delta, window, granularity, backend='git', jobs=1,
+                       churn=None):
+    contributors = collect_contributors(repo_path, branch, mailmap, exclusions, delta, backend, jobs, churn)
     return process_activity_periods(contributors, window, granularity)
 
 
+# Height of a contributor row in the activity plot and the maximum figure size, in inches. Larger figures exceed the
+# image size limit of the Agg backend.
+ROW_HEIGHT = 0.2
+MAX_FIGURE_SIZE = 600
+
+
+# Function to create the bars of a bar chart
+def bar_collection(left, bottom, width, height, **kwargs):
+    """
+    Creates bars as a single PolyCollection, which is much faster to create and draw than a patch per bar.
+
+    Args:
+        left, bottom, width, height: Sequences of the positions and sizes of the bars in data coordinates.
+        **kwargs: Properties of the collection, e.g. facecolors or edgecolor.
+
+    Returns:
+        PolyCollection: The bars.
+    """
+    from matplotlib.collections import PolyCollection
+
+    left = np.asarray(left, dtype=float)
+    bottom = np.asarray(bottom, dtype=float)
+    right = left + np.asarray(width, dtype=float)
+    top = bottom + np.asarray(height, dtype=float)
+    vertices = np.stack([np.column_stack(corner) for corner in
+                         ((left, bottom), (left, top), (right, top), (right, bottom))], axis=1)
+    return PolyCollection(vertices, **kwargs)
+
+
 # Function to plot the data
-def plot_contributors(activity_periods, args, less_than_year=False):
-    plt.figure(figsize=(15, 20))
+def plot_contributors(activity_periods, args, less_than_year=False, output_file=None):
+    # Plotting libraries are only imported when a chart is requested
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    # Grow the figure with the number of contributors, so that their labels don't overlap
+    height = min(max(20, len(activity_periods) * ROW_HEIGHT), MAX_FIGURE_SIZE)
+    plt.figure(figsize=(15, height))
+    ax = plt.gca()
+    ax.xaxis_date()
     color_map = plt.colormaps.get_cmap('hsv')
     y_labels = []
     y_ticks = []
@@ -113,18 +510,29 @@ def plot_contributors(activity_periods, args, less_than_year=False):
     min_date = min(period[0] for periods in activity_periods.values() for period in periods)
     max_date = max(period[1] for periods in activity_periods.values() for period in periods)
 
-    # Drawing bars for activity periods
+    # Drawing bars for activity periods, all in one collection
+    rows = []
+    start_dates = []
+    end_dates = []
     for i, (contributor, periods) in enumerate(activity_periods.items()):
         print(f"Contributor: {contributor}")
         y_labels.append(contributor)
         y_ticks.append(i)
         for start_date, end_date, duration in periods:
             print(f"  Activity period: {start_date} to {end_date}. Duration: {duration}")
-            plt.barh(i, (end_date - start_date).days, left=start_date, height=0.4, color=color_map(i), edgecolor='black')
-
-        # Adding horizontal lines for better readability
-        linewidth = 1.0 if i % 10 == 0 else 0.5
-        plt.axhline(i, color='gray', linestyle='--', linewidth=linewidth)
+            rows.append(i)
+            start_dates.append(start_date)
+            end_dates.append(end_date)
+    if rows:
+        left = mdates.date2num(start_dates)
+        rows = np.array(rows)
+        ax.add_collection(bar_collection(left, rows - 0.2, mdates.date2num(end_dates) - left, np.full(len(rows), 0.4),
+                                         facecolors=color_map(rows), edgecolor='black'), autolim=False)
+
+    # Adding horizontal lines for better readability
+    ax.add_collection(LineCollection([[(0, i), (1, i)] for i in y_ticks], transform=ax.get_yaxis_transform(),
+                                     colors='gray', linestyles='--',
+                                     linewidths=[1.0 if i % 10 == 0 else 0.5 for i in y_ticks]), autolim=False)
 
     # Adding gray vertical lines at the start of each year and labeling them
     current_year = min_date.year
@@ -138,7 +546,8 @@ def plot_contributors(activity_periods, args, less_than_year=False):
     plt.yticks(y_ticks, y_labels)
     plt.xlabel('Date')
     plt.ylabel('Contributors')
-    plt.title('Continuous Contribution Periods of Contributors')
+    # An explicit title position saves measuring all contributor labels once more
+    plt.title('Continuous Contribution Periods of Contributors', y=1.0)
     if less_than_year:
         # Setting less frequent date ticks on x-axis and adding year labels
         plt.gca().xaxis.set_major_locator(mdates.MonthLocator(interval=1))
@@ -156,41 +565,57 @@ def plot_contributors(activity_periods, args, less_than_year=False):
     buffer = timedelta(days=buffer_days)
     plt.xlim(min_date - buffer, max_date + buffer)
     plt.tight_layout()
-    plt.savefig(args.activity_plot_file)
-    logging.info(f"Activity plot saved to: {os.path.abspath(args.activity_plot_file)}")
+    profiler.stage('save_activity_plot')
+    output_file = output_file or args.activity_plot_file
+    plt.savefig(output_file)
+    plt.close()
+    logging.info(f"Activity plot saved to: {os.path.abspath(output_file)}")
 
 
 def aggregate_contributors_by_time(activity_periods):
-    unique_dates = set()
-    end_dates = set()
-    for periods in activity_periods.values():
-        for start_date, end_date, _ in periods:
-            unique_dates.add(start_date)
-            unique_dates.add(end_date)
-            end_dates.add(end_date)
-
-    sorted_dates = sorted(unique_dates)
-
-    contributor_count_by_date = defaultdict(int)
-    for date in sorted_dates:
-        for periods in activity_periods.values():
-            for start_date, end_date, _ in periods:
-                if start_date <= date <= end_date:
-                    contributor_count_by_date[date] += 1
-
-        if date in end_dates:
-            contributor_count_by_date[date] -= 1
+    """
+    Counts the activity periods that include each start and end date of the activity periods.
 
-    return sorted(contributor_count_by_date.items())
+    The dates are swept in order while counting the periods started on or before the current date and the periods
+    ended before it, which takes O(P log P) for P periods. A date on which an activity period ends is counted one
+    less, so that contributors leaving and joining on the same date aren't counted twice.
 
+    Args:
+        activity_periods (dict): A dictionary where keys are contributor names and values are lists of activity periods (start_date, end_date, actual_length).
 
-def plot_contributor_count_over_time(aggregated_data, args):
+    Returns:
+        list: A list of (date, number of contributors) tuples sorted by date.
+    """
+    start_dates = sorted(start_date for periods in activity_periods.values() for start_date, _, _ in periods)
+    end_dates = sorted(end_date for periods in activity_periods.values() for _, end_date, _ in periods)
+    unique_end_dates = set(end_dates)
+
+    aggregated_data = []
+    started = 0
+    ended = 0
+    for current_date in sorted(set(start_dates) | unique_end_dates):
+        while started < len(start_dates) and start_dates[started] <= current_date:
+            started += 1
+        while ended < len(end_dates) and end_dates[ended] < current_date:
+            ended += 1
+        count = started - ended
+        if current_date in unique_end_dates:
+            count -= 1
+        aggregated_data.append((current_date, count))
+
+    return aggregated_data
+
+
+def plot_contributor_count_over_time(aggregated_data, args, output_file=None):
     """
     Plots the number of contributors over time using a bar chart.
 
     Args:
         aggregated_data: A list of tuples, where each tuple contains a date and the corresponding number of contributors on that date.
     """
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
 
     dates, counts = zip(*aggregated_data)  # Unzip the date and count tuples
 
@@ -201,12 +626,13 @@ def plot_contributor_count_over_time(aggregated_data, args):
     color_map = plt.colormaps.get_cmap('tab20')
     count_to_color = {count: color_map(i) for i, count in enumerate(unique_counts)}
 
-    for i in range(len(dates) - 1):
-        start_date = dates[i]
-        end_date = dates[i + 1]
-        count = counts[i]
-        width = (end_date - start_date).days
-        plt.bar(start_date, count, width=width, align='edge', edgecolor='black', color=count_to_color[count])
+    # Drawing all bars in one collection
+    left = mdates.date2num(dates)
+    ax = plt.gca()
+    ax.xaxis_date()
+    ax.add_collection(bar_collection(left[:-1], np.zeros(len(dates) - 1), np.diff(left), counts[:-1],
+                                     facecolors=[count_to_color[count] for count in counts[:-1]], edgecolor='black'),
+                      autolim=False)
 
     # Set x-axis major locator and formatter
     plt.gca().xaxis.set_major_locator(mdates.YearLocator())
@@ -236,24 +662,253 @@ def plot_contributor_count_over_time(aggregated_data, args):
     plt.ylim(-y_buffer, max_count + y_buffer)
 
     plt.tight_layout()
-    plt.savefig(args.contributor_count_plot_file)
-    logging.info(f"Contributor count plot saved to: {os.path.abspath(args.contributor_count_plot_file)}")
+    profiler.stage('save_contributor_count_plot')
+    output_file = output_file or args.contributor_count_plot_file
+    plt.savefig(output_file)
+    plt.close()
+    logging.info(f"Contributor count plot saved to: {os.path.abspath(output_file)}")
+
+
+def filter_activity_periods(activity_periods, contribution_duration):
+    """ Keeps the contributors whose activity periods last at least `contribution_duration` days in total. """
+    return dict(
+        (c, p) for c, p in activity_periods.items() if sum(d for sd, ed, d in p) >= contribution_duration
+    )
+
+
+def sweep_file(output_file, window_days, granularity_days):
+    """ Returns the output file of one combination of a sweep, e.g. `out/activity_plot_w90_g15.png`. """
+    root, extension = os.path.splitext(output_file)
+    return f'{root}_w{window_days}_g{granularity_days}{extension}'
+
+
+def report_activity_periods(activity_periods, args, activity_plot_file, contributor_count_plot_file, pipeline=None):
+    """
+    Filters the activity periods by the minimum contribution duration, aggregates them by time and plots them or
+    writes them as data to the given files.
+
+    The charts are rendered by the `pipeline` as soon as their data is ready, the activity chart while the activity
+    periods are aggregated. Without a pipeline they are rendered in this process.
+
+    Returns:
+        tuple: (activity periods, contributor counts over time)
+    """
+    pipeline = pipeline or Pipeline(render_jobs=0)
+    activity_periods = filter_activity_periods(activity_periods, args.contribution_duration)
+
+    if args.format == 'png':
+        # Plotting the contribution activity on the graph
+        profiler.stage('plot_contributors')
+        pipeline.render(plot_contributors, activity_periods, args, less_than_year=args.less_than_year,
+                        output_file=activity_plot_file)
+
+    # Aggregate contributor data by time
+    profiler.stage('aggregate_contributors_by_time')
+    aggregated_data = aggregate_contributors_by_time(activity_periods)
+
+    if args.format != 'png':
+        profiler.stage('write_data')
+        activity_file = data_file(activity_plot_file, args.format)
+        write_records(((contributor, start_date, end_date, duration)
+                       for contributor, periods in activity_periods.items()
+                       for start_date, end_date, duration in periods),
+                      ['contributor', 'start_date', 'end_date', 'duration'], activity_file, args.format)
+        logging.info(f"Activity periods saved to: {activity_file}")
+        contributor_count_file = data_file(contributor_count_plot_file, args.format)
+        write_records(aggregated_data, ['date', 'contributors'], contributor_count_file, args.format)
+        logging.info(f"Contributor counts saved to: {contributor_count_file}")
+        return activity_periods, aggregated_data
+
+    # Plotting the number of contributors over time
+    profiler.stage('plot_contributor_count_over_time')
+    pipeline.render(plot_contributor_count_over_time, aggregated_data, args, output_file=contributor_count_plot_file)
+    return activity_periods, aggregated_data
+
+
+def churn_buckets(first, last, bucket):
+    """ Returns the first days of all buckets from the bucket starting at `first` to the one starting at `last`. """
+    step, bucket_start = CHURN_BUCKETS[bucket]
+    buckets = [first]
+    while buckets[-1] < last:
+        buckets.append(bucket_start(buckets[-1] + timedelta(days=step)))
+    return buckets
+
+
+def plot_churn(records, args):
+    """
+    Plots the churn (lines added + removed) of the directories with the most churn as a heatmap of directories by
+    time bucket.
+
+    Args:
+        records: (directory, first day of the bucket, lines added, lines removed) tuples.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+
+    totals = defaultdict(int)
+    for directory, _, added, removed in records:
+        totals[directory] += added + removed
+    directories = sorted(totals, key=lambda directory: (-totals[directory], directory))[:args.churn_top]
+    rows = {directory: row for row, directory in enumerate(directories)}
+    buckets = churn_buckets(min(r[1] for r in records), max(r[1] for r in records), args.churn_bucket)
+    columns = {bucket_start: column for column, bucket_start in enumerate(buckets)}
+
+    churn = np.zeros((len(directories), len(buckets)))
+    for directory, bucket_start, added, removed in records:
+        if directory in rows:
+            churn[rows[directory], columns[bucket_start]] += added + removed
+
+    plt.figure(figsize=(20, max(6, len(directories) * 0.3 + 2)))
+    image = plt.imshow(np.ma.masked_less_equal(churn, 0), aspect='auto', interpolation='nearest', cmap='viridis',
+                       norm=LogNorm(vmin=1, vmax=max(churn.max(), 1)))
+    plt.colorbar(image, label='Lines Added + Removed')
+
+    # Label at most about 30 buckets on the x-axis
+    ticks = range(0, len(buckets), max(1, len(buckets) // 30))
+    plt.xticks(ticks, [buckets[tick].isoformat() for tick in ticks], rotation=45, ha='right')
+    plt.yticks(range(len(directories)), directories)
+
+    plt.xlabel(args.churn_bucket.capitalize())
+    plt.ylabel('Directory')
+    plt.title(f'Churn per Directory Over Time (top {len(directories)} directories)')
+
+    plt.tight_layout()
+    profiler.stage('save_churn_plot')
+    plt.savefig(args.churn_plot_file)
+    plt.close()
+    logging.info(f"Churn plot saved to: {os.path.abspath(args.churn_plot_file)}")
+
+
+def report_churn(churn, args, pipeline=None):
+    """
+    Writes the churn collected during the history scan as data and, with the png format, plots it as a heatmap, with
+    the `pipeline` if given.
+
+    Returns:
+        list: The (directory, first day of the bucket, lines added, lines removed) tuples.
+    """
+    records = churn.records()
+    if not records:
+        logging.warning("No changed lines found, skipping the churn report")
+        return records
+
+    # The data is written along with the heatmap, as CSV unless another data format is requested
+    profiler.stage('write_churn_data')
+    churn_format = 'csv' if args.format == 'png' else args.format
+    churn_file = data_file(args.churn_plot_file, churn_format)
+    write_records(records, ['directory', 'bucket', 'added', 'removed'], churn_file, churn_format)
+    logging.info(f"Churn data saved to: {churn_file}")
+
+    if args.format == 'png':
+        profiler.stage('plot_churn')
+        (pipeline or Pipeline(render_jobs=0)).render(plot_churn, records, args)
+    return records
+
+
+def analyze_contributors(args):
+    """
+    Analyzes the activity periods of the contributors and plots them or writes them as data, as configured by the
+    command line arguments.
+
+    Several `--window_days` and `--granularity_days` values are swept in a single scan of the history: the commit
+    dates of the contributors are collected once and the activity periods are computed from them for every
+    combination, each written to its own files (see `sweep_file`).
+
+    The charts are rendered in `--render_jobs` worker processes while the analysis goes on, so a sweep renders the
+    charts of a combination while the next one is computed.
 
+    With `--churn`, the same scan also collects the lines changed per directory and time bucket (see `report_churn`).
 
-def main():
+    Returns:
+        tuple: (activity periods, contributor counts over time), or for a sweep a dictionary of these tuples by
+        (window days, granularity days).
+    """
+    # The render workers start while the history is scanned, charts are rendered as soon as their data is ready
+    with Pipeline(args.render_jobs if args.format == 'png' else 0) as pipeline:
+        profiler.stage('parse_mailmap')
+        mailmap = parse_mailmap(args.repo_path)
+
+        # Analyzing the repository for the commit dates of the contributors
+        profiler.stage('count_contributors')
+        churn = ChurnCollector(args.churn_depth, args.churn_bucket) if args.churn else None
+        contributors = collect_contributors(
+            args.repo_path, args.branch, mailmap, args.exclusions,
+            delta=timedelta(days=args.delta_days),
+            backend=args.backend,
+            jobs=args.jobs,
+            churn=churn
+        )
+        names, ids, days = contributor_days(contributors)
+
+        if churn is not None and args.backend == 'git':
+            report_churn(churn, args, pipeline)
+
+        combinations = list(product(dict.fromkeys(args.window_days), dict.fromkeys(args.granularity_days)))
+        if len(combinations) > 1:
+            logging.info(f"Sweeping {len(combinations)} combinations of window and granularity days")
+
+        results = {}
+        for window_days, granularity_days in combinations:
+            # Continuous contribution periods for this combination
+            profiler.stage('process_activity_periods')
+            activity_periods = activity_periods_from_days(names, ids, days, timedelta(days=window_days),
+                                                          granularity_days)
+            if len(combinations) == 1:
+                return report_activity_periods(activity_periods, args, args.activity_plot_file,
+                                               args.contributor_count_plot_file, pipeline)
+            results[(window_days, granularity_days)] = report_activity_periods(
+                activity_periods, args,
+                sweep_file(args.activity_plot_file, window_days, granularity_days),
+                sweep_file(args.contributor_count_plot_file, window_days, granularity_days),
+                pipeline
+            )
+        return results
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Plot contributor activity over time.')
     parser.add_argument('--repo_path', type=str, default='.', help='Path to the repository')
     parser.add_argument('--branch', type=str, default='main', help='Branch to analyze')
     parser.add_argument('--exclusions', nargs='*', default=["dependabot", "snyk"], help='List of contributors to exclude')
     parser.add_argument('--delta_days', type=int, default=365 * 30, help='Number of days to look back for commits')
-    parser.add_argument('--window_days', type=int, default=90, help='Window of days for activity period')
-    parser.add_argument('--granularity_days', type=int, default=15, help='Granularity of activity period in days')
+    parser.add_argument('--window_days', type=int, nargs='+', default=[90],
+                        help='Window of days for activity period, several values are swept in one scan')
+    parser.add_argument('--granularity_days', type=int, nargs='+', default=[15],
+                        help='Granularity of activity period in days, several values are swept in one scan')
     parser.add_argument('--contribution_duration', type=int, default=1, help='Minimum contribution duration to consider')
+    parser.add_argument('--backend', choices=['git', 'gitpython', 'index'], default='git',
+                        help='Read commits from a git log stream (git), with GitPython (gitpython) or from the commit '
+                             'index shared by the git-insights scripts (index)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of processes scanning the history in parallel, with the git backend')
     parser.add_argument('--less_than_year', action='store_true', help='Use less frequent date ticks on x-axis')
     parser.add_argument('--activity_plot_file', type=str, default='out/activity_plot.png', help='File name for the activity plot')
     parser.add_argument('--contributor_count_plot_file', type=str, default='out/contributor_count_plot.png', help='File name for the contributor count plot')
-
-    args = parser.parse_args()
+    parser.add_argument('--churn', action='store_true',
+                        help='Also collect the lines added and removed per directory and time bucket in the history '
+                             'scan, with the git backend')
+    parser.add_argument('--churn_depth', type=int, default=1,
+                        help='Number of leading path components of the directories the churn is aggregated to')
+    parser.add_argument('--churn_bucket', choices=list(CHURN_BUCKETS), default='month',
+                        help='Time bucket the churn is aggregated to')
+    parser.add_argument('--churn_top', type=int, default=30,
+                        help='Number of directories with the most churn shown in the churn plot')
+    parser.add_argument('--churn_plot_file', type=str, default='out/churn_plot.png',
+                        help='File name for the churn plot, the churn data is written next to it')
+    parser.add_argument('--format', choices=FORMATS, default='png',
+                        help='Plot the data (png) or write the activity periods and contributor counts as json or csv')
+    parser.add_argument('--render_jobs', type=int, default=default_render_jobs(),
+                        help='Number of processes rendering the charts while the analysis goes on, 0 to render them '
+                             'in the main process. Default is one less than the number of CPUs, at most 2')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write a report of the time spent per stage, in git commands and the peak memory')
+    parser.add_argument('--profile_trace', action='store_true',
+                        help='With --profile, also write the stages and git commands in Chrome trace format')
+
+    args = parser.parse_args(argv)
+    sweep = len(set(args.window_days)) * len(set(args.granularity_days)) > 1
+    if sweep and '-' in (args.activity_plot_file, args.contributor_count_plot_file):
+        parser.error("a sweep writes files per combination, it can't write them to the standard output (-)")
 
     # Define color codes
     RESET = "\033[0m"
@@ -276,28 +931,11 @@ def main():
     handler.setFormatter(ColoredFormatter())
     logging.basicConfig(level=logging.INFO, handlers=[handler])
     logging.info("Starting contributor activity analysis")
-    mailmap = parse_mailmap(args.repo_path)
-
-    # Analyzing the repository for continuous contribution periods
-    activity_periods = count_contributors(
-        args.repo_path, args.branch, mailmap, args.exclusions,
-        delta=timedelta(days=args.delta_days),
-        window=timedelta(days=args.window_days),
-        granularity=args.granularity_days
-    )
-
-    activity_periods = dict(
-        (c, p) for c, p in activity_periods.items() if sum(d for sd, ed, d in p) >= args.contribution_duration
-    )
-
-    # Plotting the contribution activity on the graph
-    plot_contributors(activity_periods, args, less_than_year=args.less_than_year)
 
-    # Aggregate contributor data by time
-    aggregated_data = aggregate_contributors_by_time(activity_periods)
-
-    # Plotting the number of contributors over time
-    plot_contributor_count_over_time(aggregated_data, args)
+    if args.profile:
+        return profiler.profile(partial(analyze_contributors, args), args.activity_plot_file, args.profile_trace,
+                                argv=command_line(__file__, argv))
+    return analyze_contributors(args)
 
 
 if __name__ == '__main__':
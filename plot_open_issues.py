@@ -2,12 +2,23 @@ import argparse
 import json
 import logging
 import os
-from datetime import datetime, timedelta
-
-import matplotlib.pyplot as plt
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
 import pandas as pd
 import requests
 
+from data_output import FORMATS, data_file, write_records
+from pipeline import Pipeline, default_render_jobs
+from profiling import command_line, profiler
+
 # Define color codes
 RESET = "\033[0m"
 COLORS = {
@@ -31,109 +42,578 @@ handler = logging.StreamHandler()
 handler.setFormatter(ColoredFormatter())
 logging.basicConfig(level=logging.INFO, handlers=[handler])
 
+GITHUB_API_URL = 'https://api.github.com'
+GITHUB_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+# Requests are retried this many times on server errors and connection failures
+MAX_RETRIES = 5
+# Delay before the first retry in seconds, doubled for each following retry
+RETRY_DELAY = 1
+# Delay before the first retry after a secondary rate limit without `Retry-After`, GitHub asks for at least a minute
+SECONDARY_RATE_LIMIT_DELAY = 60
+
+
+class GitHubSession(requests.Session):
+    """
+    HTTP session that keeps within the rate limit of the GitHub API and retries failed requests.
+
+    The remaining requests and the reset time of the rate limit are read from the `X-RateLimit-Remaining` and
+    `X-RateLimit-Reset` headers of the responses. No more requests are in flight than remain, so concurrent requests
+    are throttled as the limit gets close, and once it's used up the next request waits for the reset. Rate-limited
+    responses (403 or 429 with `Retry-After`, in seconds or as a date, or without remaining requests) are retried
+    after waiting as long as the server asks. Other 429 responses and 403 responses about the secondary rate limit are
+    retried with exponential backoff from `secondary_retry_delay`, server errors and connection failures with
+    exponential backoff from `retry_delay`, up to `max_retries` times. Other errors raise `requests.HTTPError`.
+    """
+
+    def __init__(self, token=None, max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY,
+                 secondary_retry_delay=SECONDARY_RATE_LIMIT_DELAY):
+        super().__init__()
+        if token:
+            self.headers['Authorization'] = f'Bearer {token}'
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.secondary_retry_delay = secondary_retry_delay
+        self.condition = threading.Condition()
+        self.remaining = None
+        self.reset = None
+        self.in_flight = 0
+
+    def acquire(self):
+        """ Waits until a request can be sent within the rate limit. """
+        with self.condition:
+            while self.remaining is not None and self.in_flight >= self.remaining:
+                if self.in_flight:
+                    # The responses of the requests in flight will update the rate limit
+                    self.condition.wait()
+                    continue
+                wait = max(self.reset - time.time(), 0) + 1
+                logging.warning(f"Rate limit used up, waiting {wait:.0f} seconds for the reset")
+                time.sleep(wait)
+                self.remaining = None
+            self.in_flight += 1
+
+    def release(self, response):
+        """ Updates the rate limit from a response and lets the waiting requests continue. """
+        with self.condition:
+            self.in_flight -= 1
+            if response is not None and 'X-RateLimit-Remaining' in response.headers:
+                remaining = int(response.headers['X-RateLimit-Remaining'])
+                reset = int(response.headers.get('X-RateLimit-Reset', 0))
+                # Responses can arrive out of order, the lowest count of the current window is the latest
+                if self.reset != reset or self.remaining is None or remaining < self.remaining:
+                    self.remaining = remaining
+                    self.reset = reset
+            self.condition.notify_all()
+
+    def rate_limit_wait(self, response):
+        """
+        Returns how many seconds to wait before retrying a rate-limited response, as asked by its headers, or None if
+        it isn't limited or doesn't say how long to wait.
+        """
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is not None:
+            return retry_after
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            return max(int(response.headers.get('X-RateLimit-Reset', 0)) - time.time(), 0) + 1
+        return None
+
+    def is_secondary_rate_limit(self, response):
+        """ Returns whether a response that doesn't say how long to wait is limited by the secondary rate limit. """
+        return response.status_code == 429 or (response.status_code == 403 and
+                                                'secondary rate limit' in response.text.lower())
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', 60)
+        failures = 0
+        while True:
+            self.acquire()
+            response = None
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                self.release(response)
+
+            if response is not None:
+                wait = self.rate_limit_wait(response)
+                if wait is not None:
+                    logging.warning(f"Rate limited by {url}, retrying in {wait:.0f} seconds")
+                    time.sleep(wait)
+                    with self.condition:
+                        # The rate limit stored from the limited response is over, the next response updates it
+                        self.remaining = None
+                    continue
+                secondary_rate_limit = self.is_secondary_rate_limit(response)
+                if response.status_code < 500 and not secondary_rate_limit:
+                    response.raise_for_status()
+                    return response
+                reason = 'Secondary Rate Limit' if secondary_rate_limit else 'Server Error'
+                error = requests.HTTPError(f"{response.status_code} {reason} for url: {response.url}",
+                                           response=response)
+            else:
+                secondary_rate_limit = False
+
+            failures += 1
+            if failures > self.max_retries:
+                raise error
+            delay = (self.secondary_retry_delay if secondary_rate_limit else self.retry_delay) * 2 ** (failures - 1)
+            logging.warning(f"Request to {url} failed with error: {error}. Retrying in {delay} seconds")
+            time.sleep(delay)
+
+
+def parse_retry_after(value):
+    """
+    Returns the seconds to wait given by a `Retry-After` header, either as a number of seconds or as an HTTP date, or
+    None if the header is missing or invalid.
+    """
+    if value is None:
+        return None
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(retry_at.timestamp() - time.time(), 0)
+
+
+def create_session(max_connections=4, token=None, max_retries=MAX_RETRIES):
+    """
+    Creates a GitHub session that keeps up to `max_connections` connections open for reuse, authenticates with
+    `token`, if given, and retries failed requests up to `max_retries` times.
+    """
+    session = GitHubSession(token, max_retries)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def iter_github_pages(repo, endpoint, params={}, session=None, max_workers=4, api_url=GITHUB_API_URL, headers={},
+                      start_page=1):
+    """
+    Fetch all pages of a GitHub repository endpoint from `start_page` on, yielding (response, page data) in page order.
+
+    The first page tells how many pages there are (`Link: rel="last"` header), the remaining pages are then fetched
+    concurrently by `max_workers` threads. If the first page was not modified, i.e. it matched the `If-None-Match`
+    header, only (response, None) is yielded.
+    """
+    session = session or create_session(max_workers)
+    url = f'{api_url}/repos/{repo}/{endpoint}'
+
+    def fetch_page(page):
+        logging.info(f"Processing {endpoint}, page {page}...")
+        response = session.get(url, params={**params, 'page': page, 'per_page': 100}, headers=headers)
+        return response, response.json() if response.status_code != 304 else None
+
+    response, data = fetch_page(start_page)
+    yield response, data
+    last_url = response.links.get('last', {}).get('url')
+    if not data or not last_url:
+        return
+
+    last_page = int(parse_qs(urlparse(last_url).query)['page'][0])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(fetch_page, range(start_page + 1, last_page + 1))
+
+
+def fetch_github_pages(repo, endpoint, params={}, session=None, max_workers=4, api_url=GITHUB_API_URL, headers={}):
+    """
+    Fetch all pages of a GitHub repository endpoint.
+
+    Returns:
+        tuple: (response of the first page, data). The data is None if the first page was not modified.
+    """
+    pages = iter_github_pages(repo, endpoint, params, session, max_workers, api_url, headers)
+    response, data = next(pages)
+    for _, page_data in pages:
+        data.extend(page_data)
+    return response, data
 
-def fetch_github_data(repo, endpoint, params={}):
+
+def fetch_github_data(repo, endpoint, params={}, session=None, max_workers=4, api_url=GITHUB_API_URL):
     """ Fetch data from a GitHub repository endpoint. """
-    data = []
-    page = 1
-    base_url = f'https://api.github.com/repos/{repo}/{endpoint}'
-    while True:
-        logging.info(f"Processing {endpoint}, page {page}...")
-        url = f'{base_url}?page={page}&per_page=100'
-        response = requests.get(url, params=params)
-        page_data = response.json()
-        if page_data:
-            data.extend(page_data)
-            page += 1
-        else:
-            break
-    return data
+    return fetch_github_pages(repo, endpoint, params, session, max_workers, api_url)[1]
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Fetch and save GitHub issues and releases.')
-    parser.add_argument('--repo', type=str, default='Tribler/tribler',
-                        help='GitHub repository in the format "owner/repo"')
-    parser.add_argument('--issues_file', type=str, default='out/issues.json', help='File to save issues data')
-    parser.add_argument('--releases_file', type=str, default='out/releases.json', help='File to save releases data')
-    parser.add_argument('--state', type=str, default='all', help='State of issues to fetch (e.g., open, closed, all)')
-    parser.add_argument('--labels', type=str, default='type: bug', help='Labels to filter issues by')
-    parser.add_argument('--override', action='store_true', help='Override existing files and fetch data')
-    parser.add_argument('--output_plot', type=str, default='out/open_issues_plot.png', help='Output file for the plot')
-    parser.add_argument('--show_release_timestamps', action='store_true', help='Display release timestamps on the plot')
-    parser.add_argument('--color_releases', action='store_true', help='Color the release periods on the plot')
-    args = parser.parse_args()
+def get_server_time(response):
+    """ Returns the time of a response in the GitHub date format, falling back to the local clock. """
+    date = response.headers.get('Date')
+    server_time = parsedate_to_datetime(date) if date else datetime.now(timezone.utc)
+    return server_time.astimezone(timezone.utc).strftime(GITHUB_DATE_FORMAT)
 
-    # Define the repository
-    repo = args.repo
 
-    # Check if issues file exists
-    if os.path.exists(args.issues_file) and not args.override:
-        logging.info(f"Issues file '{args.issues_file}' already exists. Use --override to fetch new data.")
-    else:
-        # Fetch issue data
-        logging.info("Fetching issues...")
-        issues = fetch_github_data(repo, 'issues', {'state': args.state, 'labels': args.labels})
+def compact_issue(issue):
+    """ Keeps only the fields of a GitHub issue that are used by this script. """
+    return {
+        'id': issue['id'],
+        'state': issue['state'],
+        'created_at': issue['created_at'],
+        'closed_at': issue['closed_at'],
+        'labels': [label['name'] for label in issue['labels']],
+        'is_pull_request': 'pull_request' in issue,
+    }
+
+
+def write_issues(issues_file, issues):
+    """ Writes compact issues as line-delimited JSON. The file is replaced only once all issues are written. """
+    with open(issues_file + '.tmp', 'w') as file:
+        for issue in issues:
+            file.write(json.dumps(issue) + '\n')
+    os.replace(issues_file + '.tmp', issues_file)
+
+
+def read_issues(issues_file):
+    """ Yields the compact issues stored by `write_issues`. """
+    with open(issues_file, 'r') as file:
+        for line in file:
+            yield json.loads(line)
+
 
-        # Save issues to a JSON file
-        with open(args.issues_file, 'w') as file:
-            json.dump(issues, file)
-        logging.info(f"Issues saved to '{args.issues_file}'.")
+def convert_issues_file(json_file, issues_file):
+    """ Converts the raw GitHub issues saved by older versions of this script (a JSON array) to compact issues. """
+    with open(json_file, 'r') as file:
+        write_issues(issues_file, (compact_issue(issue) for issue in json.load(file)))
 
+
+def issue_matches(issue, state, labels):
+    """ Checks whether a compact issue would be returned by the GitHub issues endpoint for the given filters. """
+    required_labels = {label.strip() for label in labels.split(',') if label.strip()}
+    return state in ('all', issue['state']) and required_labels <= set(issue['labels'])
+
+
+# Only the fields of the issues used by this script. Pull requests are not issues in the GraphQL API.
+ISSUES_QUERY = """
+query($owner: String!, $name: String!, $states: [IssueState!], $labels: [String!], $since: DateTime, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    issues(first: 100, after: $cursor, states: $states, labels: $labels, filterBy: {since: $since},
+           orderBy: {field: CREATED_AT, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { databaseId state createdAt closedAt labels(first: 100) { nodes { name } } }
+    }
+  }
+}
+"""
+
+
+def get_graphql_url(api_url):
+    """ Returns the GraphQL endpoint of a REST API URL, `/api/graphql` instead of `/api/v3` for GitHub Enterprise. """
+    api_url = api_url.rstrip('/')
+    if api_url.endswith('/api/v3'):
+        return api_url[:-len('/v3')] + '/graphql'
+    return api_url + '/graphql'
+
+
+def compact_graphql_issue(node):
+    """ Converts an issue returned by `ISSUES_QUERY` to the compact issue stored by `compact_issue`. """
+    return {
+        'id': node['databaseId'],
+        'state': node['state'].lower(),
+        'created_at': node['createdAt'],
+        'closed_at': node['closedAt'],
+        'labels': [label['name'] for label in node['labels']['nodes']],
+        'is_pull_request': False,
+    }
+
+
+def iter_graphql_issue_pages(repo, state='open', labels='', since=None, session=None, api_url=GITHUB_API_URL,
+                             cursor=None):
+    """
+    Fetch issues with the GitHub GraphQL API, yielding (response, compact issues, end cursor) per page.
+
+    Only the fields stored by `compact_issue` are requested and pull requests are left out by the API, so the pages
+    are a fraction of the size of the REST pages. The pages are linked by cursors, so they are fetched one after
+    another, starting after `cursor`.
+    """
+    session = session or create_session()
+    owner, name = repo.split('/')
+    required_labels = [label.strip() for label in labels.split(',') if label.strip()]
+    variables = {
+        'owner': owner,
+        'name': name,
+        'states': None if state == 'all' else [state.upper()],
+        # The API returns issues with any of the given labels, so only the issues with the first label are requested
+        # and those without all labels are dropped below
+        'labels': required_labels[:1] or None,
+        'since': since,
+    }
+    page = 1
+    while True:
+        logging.info(f"Processing issues, page {page}...")
+        response = session.post(get_graphql_url(api_url),
+                                json={'query': ISSUES_QUERY, 'variables': {**variables, 'cursor': cursor}})
+        result = response.json()
+        if result.get('errors'):
+            messages = '; '.join(error.get('message', str(error)) for error in result['errors'])
+            raise requests.HTTPError(f"GraphQL query failed: {messages}", response=response)
+
+        issues = result['data']['repository']['issues']
+        cursor = issues['pageInfo']['endCursor']
+        yield response, [issue for issue in map(compact_graphql_issue, issues['nodes'])
+                         if issue_matches(issue, state, labels)], cursor
+        if not issues['pageInfo']['hasNextPage']:
+            return
+        page += 1
+
+
+def iter_issue_pages(repo, params, session=None, max_workers=4, api_url=GITHUB_API_URL, backend='rest',
+                     position=None):
+    """
+    Fetch issues from the REST or the GraphQL API, yielding (response, compact issues, position) per page.
+
+    The position of a page is its number for the REST API and its end cursor for the GraphQL API. Pages are fetched
+    starting after `position`, in order of creation of the issues, so that issues created in the meantime don't shift
+    the pages fetched already.
+    """
+    if backend == 'graphql':
+        yield from iter_graphql_issue_pages(repo, params.get('state', 'open'), params.get('labels', ''),
+                                            params.get('since'), session, api_url, position)
+        return
+
+    start_page = (position or 0) + 1
+    pages = iter_github_pages(repo, 'issues', {**params, 'sort': 'created', 'direction': 'asc'}, session,
+                              max_workers, api_url, start_page=start_page)
+    for page, (response, issues) in enumerate(pages, start_page):
+        yield response, map(compact_issue, issues), page
+
+
+def fetch_issues(issues_file, repo, params={}, session=None, max_workers=4, api_url=GITHUB_API_URL, backend='rest'):
+    """
+    Fetches issues and writes them as compact issues page by page, without keeping the raw pages in memory.
+
+    The progress is saved after each page to `<issues_file>.progress.json`, so that a fetch with the same parameters
+    resumes after the last completed page if the previous one was interrupted.
+
+    Returns:
+        str: Time of the fetch, to pass as `since` to `sync_issues` next time.
+    """
+    progress_file = issues_file + '.progress.json'
+    query = {'repo': repo, 'params': params, 'backend': backend}
+    progress = load_sync_state(progress_file)
+    if progress.get('query') == query and os.path.exists(issues_file + '.tmp'):
+        logging.info(f"Resuming the interrupted fetch after page {progress['page']}")
+        file = open(issues_file + '.tmp', 'r+')
+        # Drop what was written of the page being fetched when the fetch was interrupted
+        file.truncate(progress['size'])
+        file.seek(progress['size'])
+    else:
+        progress = {'query': query, 'page': 0, 'position': None, 'size': 0, 'synced_at': None}
+        file = open(issues_file + '.tmp', 'w')
+
+    with file:
+        for response, issues, position in iter_issue_pages(repo, params, session, max_workers, api_url, backend,
+                                                           progress['position']):
+            progress['synced_at'] = progress['synced_at'] or get_server_time(response)
+            for issue in issues:
+                file.write(json.dumps(issue) + '\n')
+            file.flush()
+            progress['page'] += 1
+            progress['position'] = position
+            progress['size'] = file.tell()
+            with open(progress_file, 'w') as progress_output:
+                json.dump(progress, progress_output)
+    os.replace(issues_file + '.tmp', issues_file)
+    if os.path.exists(progress_file):
+        os.remove(progress_file)
+    return progress['synced_at']
+
+
+def sync_issues(issues_file, repo, since, session=None, max_workers=4, api_url=GITHUB_API_URL, backend='rest'):
+    """
+    Updates the stored issues with the issues updated since the given time.
+
+    Returns:
+        str: Time of the sync, to pass as `since` next time.
+    """
+    pages = list(iter_issue_pages(repo, {'state': 'all', 'since': since}, session, max_workers, api_url, backend))
+    changed_issues = [issue for _, issues, _ in pages for issue in issues]
+    logging.info(f"{len(changed_issues)} issues changed since {since}")
+
+    issues_by_id = {issue['id']: issue for issue in read_issues(issues_file)}
+    for issue in changed_issues:
+        issues_by_id[issue['id']] = issue
+    write_issues(issues_file, issues_by_id.values())
+    return get_server_time(pages[0][0])
+
+
+def load_sync_state(sync_state_file):
+    try:
+        with open(sync_state_file, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def issues_to_frame(issues):
+    """
+    Converts compact issues to a DataFrame with `created_at`, `closed_at`, `state`, `is_pull_request` and `labels`
+    (lists of label names) columns.
+    """
+    created_at = []
+    closed_at = []
+    state = []
+    is_pull_request = []
+    labels = []
+    for issue in issues:
+        created_at.append(issue['created_at'])
+        closed_at.append(issue['closed_at'])
+        state.append(issue['state'])
+        is_pull_request.append(issue['is_pull_request'])
+        labels.append(issue['labels'])
+
+    return pd.DataFrame({
+        'created_at': pd.to_datetime(created_at, format=GITHUB_DATE_FORMAT),
+        'closed_at': pd.to_datetime(closed_at, format=GITHUB_DATE_FORMAT),
+        'state': pd.Series(state, dtype=object),
+        'is_pull_request': pd.Series(is_pull_request, dtype=bool),
+        'labels': pd.Series(labels, dtype=object),
+    })
+
+
+def parse_label_filter(label_filter):
+    """ Returns the labels of a filter such as "type: bug,priority: high", which matches issues with all of them. """
+    return [label.strip() for label in label_filter.split(',') if label.strip()]
+
+
+def match_label_filters(df_issues, label_filters, state='all'):
+    """
+    Matches the issues against several label filters at once.
+
+    The labels of the issues are indexed once as a boolean matrix with a column per label used by the filters, so
+    every filter is a vectorized AND of some of its columns. Pull requests and issues not in `state` match no filter.
+
+    Returns:
+        np.ndarray: Boolean matrix with a row per issue and a column per filter.
+    """
+    filters = [parse_label_filter(label_filter) for label_filter in label_filters]
+    labels = sorted({label for labels in filters for label in labels})
+
+    issue_labels = df_issues['labels'].reset_index(drop=True).explode()
+    codes = pd.Categorical(issue_labels.where(issue_labels.isin(labels)), categories=labels).codes
+    has_label = np.zeros((len(df_issues), len(labels)), dtype=bool)
+    has_label[issue_labels.index[codes >= 0], codes[codes >= 0]] = True
+
+    selected = ~df_issues['is_pull_request'].to_numpy()
+    if state != 'all':
+        selected &= (df_issues['state'] == state).to_numpy()
+    columns = [[labels.index(label) for label in labels_of_filter] for labels_of_filter in filters]
+    return np.column_stack([has_label[:, column].all(axis=1) & selected for column in columns])
+
+
+def label_filter_names(label_filters):
+    """
+    Returns a name per label filter to use in file names, e.g. "type_bug" for "type: bug". Filters that give the same
+    name, such as "type: bug" and "type bug", are numbered: "type_bug", "type_bug_2".
+    """
+    names = []
+    for label_filter in label_filters:
+        name = base = re.sub(r'[^a-z0-9]+', '_', label_filter.lower()).strip('_') or 'all'
+        number = 1
+        while name in names:
+            number += 1
+            name = f'{base}_{number}'
+        names.append(name)
+    return names
+
+
+def count_open_issues_by_labels(df_issues, label_filters, first_date=None, last_date=None, frequency='D',
+                                state='all'):
+    """
+    Counts the issues (excluding pull requests) that are open at each date between two dates, for several label
+    filters in a single pass over the issues.
+
+    Every issue adds +1 from its creation date and -1 from its closing date to each filter it matches, so the number
+    of open issues is the cumulative sum of these events at the counted dates.
+
+    Args:
+        df_issues (DataFrame): Issues as returned by `issues_to_frame`.
+        label_filters (list): Filters such as "type: bug" or "type: bug,priority: high", matching the issues with all
+            of their labels. An empty filter matches all issues.
+        first_date (date): The first day to count. Default is the creation day of the first issue matching any
+            filter.
+        last_date (date): The last day to count. Default is today.
+        frequency (str): Pandas frequency of the returned dates, e.g. 'D' (daily), 'W' (weekly) or 'MS' (monthly).
+        state (str): Only count the issues in this state (open, closed or all).
+
+    Returns:
+        DataFrame: A DataFrame with a `date` column and a column of open issue counts per filter.
+    """
+    matches = match_label_filters(df_issues, label_filters, state)
+    last_date = last_date or datetime.now().date()
+    if first_date is None:
+        matched_created_at = df_issues['created_at'][matches.any(axis=1)]
+        first_date = matched_created_at.min().date() if len(matched_created_at) else last_date
+    matches = matches.astype('int64')
+    dates = pd.date_range(first_date, last_date, freq=frequency)
+
+    def count_events(times):
+        # Each event is counted from the first date on or after its day, events after the last date are dropped
+        known = times.notna().to_numpy()
+        positions = dates.searchsorted(times[known].dt.normalize())
+        counts = np.zeros((len(dates) + 1, len(label_filters)), dtype='int64')
+        np.add.at(counts, positions, matches[known])
+        return counts.cumsum(axis=0)[:-1]
+
+    open_issues = count_events(df_issues['created_at']) - count_events(df_issues['closed_at'])
+    return pd.DataFrame({'date': dates.date, **dict(zip(label_filters, open_issues.T))})
+
+
+def count_open_issues(df_issues, first_date=None, last_date=None, frequency='D'):
+    """
+    Counts the issues (excluding pull requests) that are open at the end of each day between two dates.
+
+    Returns:
+        DataFrame: A DataFrame with `date` and `open_issues` columns.
+    """
+    return count_open_issues_by_labels(df_issues, [''], first_date, last_date, frequency).set_axis(
+        ['date', 'open_issues'], axis=1)
+
+
+def update_releases(args, session, sync_state, refetch=False):
+    """
+    Fetches the releases of the repository to the releases file, unless the file exists and neither --override,
+    --sync nor `refetch` is given. With --sync, the ETag of the releases in `sync_state` is used to skip unchanged
+    releases.
+    """
     # Check if releases file exists
-    if os.path.exists(args.releases_file) and not args.override:
+    if os.path.exists(args.releases_file) and not args.override and not args.sync and not refetch:
         logging.info(f"Releases file '{args.releases_file}' already exists. Use --override to fetch new data.")
     else:
-        # Fetch release data
+        # Fetch release data, unless the first page didn't change since the last sync
         logging.info("Fetching releases...")
-        releases = fetch_github_data(repo, 'releases')
-
-        # Save releases to a JSON file
-        with open(args.releases_file, 'w') as file:
-            json.dump(releases, file)
-        logging.info(f"Releases saved to '{args.releases_file}'.")
+        etag = sync_state.get('releases_etag') if args.sync and os.path.exists(args.releases_file) else None
+        response, releases = fetch_github_pages(args.repo, 'releases', session=session,
+                                                max_workers=args.parallel_requests, api_url=args.api_url,
+                                                headers={'If-None-Match': etag} if etag else {})
+        if releases is None:
+            logging.info("Releases not modified since the last sync.")
+        else:
+            sync_state['releases_etag'] = response.headers.get('ETag')
 
-    # Load issues and releases from JSON files
-    with open(args.issues_file, 'r') as file:
-        issues = json.load(file)
+            # Save releases to a JSON file
+            with open(args.releases_file, 'w') as file:
+                json.dump(releases, file)
+            logging.info(f"Releases saved to '{args.releases_file}'.")
 
-    with open(args.releases_file, 'r') as file:
-        releases = json.load(file)
 
-    # Processing issue data
-    logging.info("Processing issue data...")
-    issue_data = []
-    for issue in issues:
-        created_at = datetime.strptime(issue['created_at'], '%Y-%m-%dT%H:%M:%SZ')
-        closed_at = datetime.strptime(issue['closed_at'], '%Y-%m-%dT%H:%M:%SZ') if issue['closed_at'] else None
-        is_pull_request = 'pull_request' in issue
-        issue_data.append({'created_at': created_at, 'closed_at': closed_at, 'is_pull_request': is_pull_request})
-
-    df_issues = pd.DataFrame(issue_data)
-
-    # Initialize counters
-    first_date = df_issues['created_at'].min().date()
-    last_date = datetime.now().date()
-    current_date = first_date
-    one_day = timedelta(days=1)
-
-    # Counting open issues by date
-    open_issues = []
-    while current_date <= last_date:
-        count_open_issues = ((df_issues['created_at'].dt.date <= current_date) &
-                             ((df_issues['closed_at'].isnull()) | (df_issues['closed_at'].dt.date > current_date)) &
-                             (~df_issues['is_pull_request'])).sum()
-        open_issues.append({'date': current_date, 'open_issues': count_open_issues})
-        current_date += one_day
-
-    df_open_issues = pd.DataFrame(open_issues)
+# Function to plot the open issues over time with the release periods, one line per column besides `date`
+def plot_open_issues_over_time(df_open_issues, releases, last_date, args, output_plot=None):
+    # matplotlib is only imported when a chart is requested
+    import matplotlib.pyplot as plt
 
     # Grouping releases by major.minor version and getting the earliest release date
     grouped_releases = {}
     for release in releases:
         version_parts = release['tag_name'].split('.')
         major_minor = '.'.join(version_parts[:2])
-        release_date = datetime.strptime(release['published_at'], '%Y-%m-%dT%H:%M:%SZ').date()
+        release_date = datetime.strptime(release['published_at'], GITHUB_DATE_FORMAT).date()
         if major_minor in grouped_releases:
             grouped_releases[major_minor] = min(grouped_releases[major_minor], release_date)
         else:
@@ -149,8 +629,10 @@ def main():
     logging.info("Plotting Open Issues Over Time with Release Groups...")
     plt.figure(figsize=(18, 6))
 
-    plt.plot(df_open_issues['date'], df_open_issues['open_issues'], marker='o', linestyle='-', label='Open Issues',
-             markersize=4)
+    counts = df_open_issues.drop(columns='date')
+    for column in counts:
+        label = 'Open Issues' if column == 'open_issues' else f'Open Issues: {column or "all issues"}'
+        plt.plot(df_open_issues['date'], counts[column], marker='o', linestyle='-', label=label, markersize=4)
 
     # Adding colored rectangles for release groups
     for i, (version, start_date) in enumerate(sorted_releases):
@@ -160,7 +642,7 @@ def main():
             plt.axvspan(start_date, end_date, color=color, alpha=0.3)
         if args.show_release_timestamps:
             plt.axvline(x=start_date, color='grey', linestyle='--', linewidth=0.8)
-            plt.text(start_date, df_open_issues['open_issues'].max(), version, fontsize=8, color='grey', ha='left')
+            plt.text(start_date, counts.max().max(), version, fontsize=8, color='grey', ha='left')
 
     plt.title('Open Issues Over Time with Colored Release Periods')
     plt.xlabel('Date')
@@ -168,10 +650,181 @@ def main():
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.savefig(args.output_plot)
-    logging.info(f"Plot saved to '{args.output_plot}'.")
+    profiler.stage('savefig')
+    output_plot = output_plot or args.output_plot
+    plt.savefig(output_plot)
+    plt.close()
+    logging.info(f"Plot saved to '{output_plot}'.")
+
+
+def analyze_open_issues(args):
+    """
+    Fetches the issues and releases, counts the open issues over time and plots them or writes them as data, as
+    configured by the command line arguments.
+
+    All issues of the repository are fetched once and stored, `--state` and `--labels` only select which of them are
+    counted, so any number of label filters is counted from the same issues file.
+
+    The releases are fetched in a background thread while the issues are fetched and counted, and the charts are
+    rendered in `--render_jobs` worker processes.
 
-    logging.info("Visualization completed.")
+    Returns:
+        pd.DataFrame: The number of open issues per date, in an `open_issues` column for a single label filter or in a
+        column per filter otherwise.
+    """
+    # Define the repository
+    repo = args.repo
+    token = os.environ.get(args.token_env)
+    if token:
+        logging.info(f"Authenticating with the token in ${args.token_env}")
+    session = create_session(args.parallel_requests, token, args.max_retries)
+    profiler.instrument_session(session)
+
+    # The render workers start before the releases are fetched in the background, charts are rendered in them as
+    # soon as the open issues are counted
+    with Pipeline(args.render_jobs if args.format == 'png' else 0) as pipeline:
+        # The sync state remembers when the issues were last fetched and the ETag of the releases
+        sync_state_file = args.issues_file + '.sync.json'
+        sync_state = load_sync_state(sync_state_file)
+        query = {'repo': repo, 'backend': args.backend}
+        # Files fetched with other parameters are fetched again, files without a sync state (e.g. converted ones) are
+        # kept
+        refetch = sync_state.get('query') not in (None, query)
+        if refetch:
+            logging.info(f"Issues file '{args.issues_file}' was fetched with other parameters "
+                         f"({sync_state['query']}), fetching all issues and releases again.")
+        if sync_state.get('query') != query:
+            sync_state = {'query': query}
+
+        if args.convert_issues_file:
+            logging.info(f"Converting '{args.convert_issues_file}' to '{args.issues_file}'...")
+            convert_issues_file(args.convert_issues_file, args.issues_file)
+
+        # Releases are only shown on the chart, they are fetched while the issues are fetched and processed
+        releases_fetched = None
+        if args.format == 'png':
+            releases_fetched = pipeline.background(update_releases, args, session, sync_state, refetch)
+
+        # Check if issues file exists
+        profiler.stage('fetch_issues')
+        if args.sync and 'issues_synced_at' in sync_state and os.path.exists(args.issues_file):
+            # Fetch only the issues updated since the last sync
+            logging.info(f"Syncing issues updated since {sync_state['issues_synced_at']}...")
+            sync_state['issues_synced_at'] = sync_issues(
+                args.issues_file, repo, sync_state['issues_synced_at'], session=session,
+                max_workers=args.parallel_requests, api_url=args.api_url, backend=args.backend
+            )
+            logging.info(f"Issues saved to '{args.issues_file}'.")
+        elif os.path.exists(args.issues_file) and not args.override and not args.sync and not refetch:
+            logging.info(f"Issues file '{args.issues_file}' already exists. Use --override to fetch new data.")
+        else:
+            # Fetch all issues and save them page by page
+            logging.info("Fetching issues...")
+            sync_state['issues_synced_at'] = fetch_issues(
+                args.issues_file, repo, {'state': 'all'}, session=session,
+                max_workers=args.parallel_requests, api_url=args.api_url, backend=args.backend
+            )
+            logging.info(f"Issues saved to '{args.issues_file}'.")
+
+        # Processing issue data
+        profiler.stage('count_open_issues')
+        logging.info("Processing issue data...")
+        df_issues = issues_to_frame(read_issues(args.issues_file))
+
+        # Counting open issues by date, for all label filters at once
+        label_filters = list(dict.fromkeys(args.labels))
+        # The counts start at the first issue matching a filter, pull requests are never counted and only stored by
+        # the REST backend
+        last_date = datetime.now().date()
+        df_open_issues = count_open_issues_by_labels(df_issues, label_filters, last_date=last_date,
+                                                     frequency=args.frequency, state=args.state)
+        if len(label_filters) == 1:
+            df_open_issues.columns = ['date', 'open_issues']
+
+        # The sync state is saved once the releases are fetched too
+        if releases_fetched is not None:
+            releases_fetched.result()
+        with open(sync_state_file, 'w') as file:
+            json.dump(sync_state, file)
+
+        if args.format != 'png':
+            profiler.stage('write_data')
+            output_file = data_file(args.output_plot, args.format)
+            if len(label_filters) == 1:
+                records = zip(df_open_issues['date'], df_open_issues['open_issues'].tolist())
+                fields = ['date', 'open_issues']
+            else:
+                df_long = df_open_issues.melt(id_vars='date', var_name='labels', value_name='open_issues')
+                records = zip(df_long['date'], df_long['labels'], df_long['open_issues'].tolist())
+                fields = ['date', 'labels', 'open_issues']
+            write_records(records, fields, output_file, args.format)
+            logging.info(f"Open issue counts saved to '{output_file}'.")
+            return df_open_issues
+
+        # Load releases from JSON file
+        profiler.stage('plot')
+        with open(args.releases_file, 'r') as file:
+            releases = json.load(file)
+
+        # Each chart is rendered in a worker process, several label filters in parallel
+        if len(label_filters) == 1 or args.overlay:
+            pipeline.render(plot_open_issues_over_time, df_open_issues, releases, last_date, args)
+        else:
+            # One chart per label filter, named after the filter
+            root, extension = os.path.splitext(args.output_plot)
+            for label_filter, name in zip(label_filters, label_filter_names(label_filters)):
+                pipeline.render(plot_open_issues_over_time, df_open_issues[['date', label_filter]], releases, last_date,
+                                args, f'{root}_{name}{extension}')
+        pipeline.wait()
+        logging.info("Visualization completed.")
+        return df_open_issues
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fetch and save GitHub issues and releases.')
+    parser.add_argument('--repo', type=str, default='Tribler/tribler',
+                        help='GitHub repository in the format "owner/repo"')
+    parser.add_argument('--issues_file', type=str, default='out/issues.jsonl', help='File to save issues data')
+    parser.add_argument('--releases_file', type=str, default='out/releases.json', help='File to save releases data')
+    parser.add_argument('--state', type=str, default='all', help='State of issues to count (e.g., open, closed, all)')
+    parser.add_argument('--labels', nargs='+', default=['type: bug'],
+                        help='Label filters to count the issues of, each a comma-separated list of required labels')
+    parser.add_argument('--overlay', action='store_true',
+                        help='Plot all label filters on one chart instead of one chart per filter')
+    parser.add_argument('--override', action='store_true', help='Override existing files and fetch data')
+    parser.add_argument('--convert_issues_file', type=str, default=None,
+                        help='Convert a raw issues JSON file saved by older versions to the issues file')
+    parser.add_argument('--sync', action='store_true',
+                        help='Update existing files with the issues and releases changed since the last fetch')
+    parser.add_argument('--output_plot', type=str, default='out/open_issues_plot.png', help='Output file for the plot')
+    parser.add_argument('--show_release_timestamps', action='store_true', help='Display release timestamps on the plot')
+    parser.add_argument('--color_releases', action='store_true', help='Color the release periods on the plot')
+    parser.add_argument('--api_url', type=str, default=GITHUB_API_URL, help='Base URL of the GitHub API')
+    parser.add_argument('--backend', choices=['rest', 'graphql'], default='rest',
+                        help='GitHub API to fetch issues from, graphql requests only the fields used')
+    parser.add_argument('--token_env', type=str, default='GITHUB_TOKEN',
+                        help='Environment variable with a GitHub token to authenticate with, if set')
+    parser.add_argument('--max_retries', type=int, default=MAX_RETRIES,
+                        help='Number of retries of a request after a server error, a connection failure or a '
+                             'secondary rate limit')
+    parser.add_argument('--parallel_requests', type=int, default=4, help='Number of pages to fetch concurrently')
+    parser.add_argument('--format', choices=FORMATS, default='png',
+                        help='Plot the open issue counts (png) or write them as json or csv')
+    parser.add_argument('--render_jobs', type=int, default=default_render_jobs(),
+                        help='Number of processes rendering the charts while the analysis goes on, 0 to render them '
+                             'in the main process. Default is one less than the number of CPUs, at most 2')
+    parser.add_argument('--frequency', type=str, default='D',
+                        help='Frequency of the open issue counts, e.g. D (daily), W (weekly) or MS (monthly)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write a report of the time spent per stage, in HTTP requests and the peak memory')
+    parser.add_argument('--profile_trace', action='store_true',
+                        help='With --profile, also write the stages and HTTP requests in Chrome trace format')
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        return profiler.profile(partial(analyze_open_issues, args), args.output_plot, args.profile_trace,
+                                argv=command_line(__file__, argv))
+    return analyze_open_issues(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def peak_rss():
+    """ Returns the peak resident set size in bytes of this process and of its largest finished child process. """
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * RSS_UNIT)
+
+
+def command_name(args):
+    """
+    Returns a short name of a command for the report, e.g. `git log` for `git log --format=%H main` and for
+    `git -c core.quotepath=false log --numstat`.
+    """
+    words = args.split() if isinstance(args, str) else [str(arg) for arg in args]
+    program, arguments = words[:1], words[1:]
+    # Configuration options given before the subcommand
+    while arguments[:1] == ['-c']:
+        arguments = arguments[2:]
+    return ' '.join(os.path.basename(word) for word in program + arguments[:1])
+
+
+def command_line(script, argv=None):
+    """
+    Returns the command line of a script called through its `main(argv)`: `sys.argv` when called from the command
+    line (`argv` is None), otherwise the script name followed by `argv`, e.g. when called by the fleet runner.
+    """
+    return sys.argv if argv is None else [os.path.basename(script)] + list(argv)
+
+
+class Profiler:
+    """
+    Records the wall time of the stages of a script, the subprocesses it runs and the HTTP requests it makes.
+
+    Stages are sequential: starting a stage ends the previous one. Nothing is recorded unless profiling is enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.stages = []
+        self.current_stage = None
+        self.subprocesses = []
+        self.http_requests = []
+        self.argv = sys.argv
+        self.original_popen = subprocess.Popen
+
+    def enable(self, start_time=None):
+        """
+        Starts recording. Subprocesses are all started through `subprocess.Popen`, so it's replaced.
+
+        Times are measured from `start_time`, by default now. Worker processes pass the start time of the main process,
+        `time.perf_counter` uses a clock shared by all processes.
+        """
+        self.enabled = True
+        self.start_time = time.perf_counter() if start_time is None else start_time
+        self.stages = []
+        self.current_stage = None
+        self.subprocesses = []
+        self.http_requests = []
+        profiler = self
+
+        class ProfiledPopen(self.original_popen):
+            def __init__(self, args, *popen_args, **kwargs):
+                self.profile_start = time.perf_counter()
+                self.profile_recorded = False
+                super().__init__(args, *popen_args, **kwargs)
+                self.profile_args = args
+
+            def wait(self, timeout=None):
+                returncode = super().wait(timeout)
+                if not self.profile_recorded:
+                    self.profile_recorded = True
+                    profiler.record_subprocess(self.profile_args, self.profile_start, returncode)
+                return returncode
+
+        subprocess.Popen = ProfiledPopen
+
+    def disable(self):
+        """ Stops recording, the recorded data is kept until profiling is enabled again. """
+        self.enabled = False
+        subprocess.Popen = self.original_popen
+
+    def stage(self, name):
+        """ Ends the current stage and starts the stage `name`. """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            self.end_stage(now)
+            self.current_stage = {'name': name, 'start': now - self.start_time, 'pid': os.getpid()}
+
+    def end_stage(self, now):
+        if self.current_stage:
+            self.current_stage['duration'] = now - self.start_time - self.current_stage['start']
+            self.current_stage['peak_rss'], self.current_stage['peak_children_rss'] = peak_rss()
+            self.stages.append(self.current_stage)
+            self.current_stage = None
+
+    def record_subprocess(self, args, start, returncode):
+        now = time.perf_counter()
+        with self.lock:
+            self.subprocesses.append({
+                'command': command_name(args),
+                'start': start - self.start_time,
+                'duration': now - start,
+                'returncode': returncode,
+                'pid': os.getpid(),
+                'thread': threading.get_ident(),
+            })
+
+    def instrument_session(self, session):
+        """ Records the requests made with a `requests.Session`, including the time to read their content. """
+
+        def record_response(response, *args, **kwargs):
+            if not self.enabled:
+                return
+            # The hook is called once the headers are received, before the content is read
+            start = time.perf_counter() - response.elapsed.total_seconds()
+            content_size = len(response.content)
+            now = time.perf_counter()
+            # The raw response counts the bytes read from the connection, before decompression
+            downloaded = response.raw.tell() if hasattr(response.raw, 'tell') else content_size
+            with self.lock:
+                self.http_requests.append({
+                    'url': response.url,
+                    'status': response.status_code,
+                    'start': start - self.start_time,
+                    'duration': now - start,
+                    'bytes': downloaded or content_size,
+                    'thread': threading.get_ident(),
+                })
+
+        session.hooks['response'].append(record_response)
+
+    def records(self):
+        """ Ends the current stage and returns the recorded stages and subprocesses, e.g. to send them to the main
+        process. """
+        with self.lock:
+            self.end_stage(time.perf_counter())
+            return {'stages': list(self.stages), 'subprocesses': list(self.subprocesses)}
+
+    def merge(self, records):
+        """ Adds the stages and subprocesses recorded by a worker process, see `submit`. """
+        with self.lock:
+            self.stages.extend(records['stages'])
+            self.subprocesses.extend(records['subprocesses'])
+
+    def submit(self, executor, function, *args, **kwargs):
+        """
+        Submits `function(*args, **kwargs)` to a process pool. With profiling enabled, the worker process records its
+        stages and subprocesses too, and they are merged into this profiler once the call is done.
+
+        Returns:
+            Future: The future of the result of `function`.
+        """
+        if not self.enabled:
+            return executor.submit(function, *args, **kwargs)
+        future = Future()
+
+        def done(worker_future):
+            if worker_future.cancelled():
+                future.cancel()
+                future.set_running_or_notify_cancel()
+            elif worker_future.exception() is not None:
+                future.set_exception(worker_future.exception())
+            else:
+                result, records = worker_future.result()
+                self.merge(records)
+                future.set_result(result)
+
+        executor.submit(run_profiled, self.start_time, function, *args, **kwargs).add_done_callback(done)
+        return future
+
+    def report(self):
+        """ Ends the current stage and returns the report of everything recorded so far. """
+        now = time.perf_counter()
+        with self.lock:
+            self.end_stage(now)
+            commands = defaultdict(lambda: {'count': 0, 'duration': 0.0})
+            for process in self.subprocesses:
+                commands[process['command']]['count'] += 1
+                commands[process['command']]['duration'] += process['duration']
+            process_peak_rss, children_peak_rss = peak_rss()
+            return {
+                'argv': self.argv,
+                'wall_time': now - self.start_time,
+                'stages': sorted(self.stages, key=lambda stage: stage['start']),
+                'subprocesses': {
+                    'count': len(self.subprocesses),
+                    'duration': sum(process['duration'] for process in self.subprocesses),
+                    'commands': dict(commands),
+                },
+                'http_requests': {
+                    'count': len(self.http_requests),
+                    'duration': sum(request['duration'] for request in self.http_requests),
+                    'bytes': sum(request['bytes'] for request in self.http_requests),
+                },
+                'peak_rss': process_peak_rss,
+                'peak_children_rss': children_peak_rss,
+            }
+
+    def trace_events(self):
+        """
+        Returns the recorded stages, subprocesses and HTTP requests in the Chrome trace event format. The stages and
+        subprocesses of worker processes show up under their own process.
+        """
+        pid = os.getpid()
+        main_thread = threading.main_thread().ident
+        events = [{'name': stage['name'], 'cat': 'stage', 'ph': 'X', 'pid': stage['pid'],
+                   'tid': main_thread if stage['pid'] == pid else 0,
+                   'ts': stage['start'] * 1e6, 'dur': stage['duration'] * 1e6} for stage in self.stages]
+        events += [{'name': process['command'], 'cat': 'subprocess', 'ph': 'X', 'pid': process['pid'],
+                    'tid': process['thread'], 'ts': process['start'] * 1e6, 'dur': process['duration'] * 1e6,
+                    'args': {'returncode': process['returncode']}} for process in self.subprocesses]
+        events += [{'name': request['url'], 'cat': 'http', 'ph': 'X', 'pid': pid, 'tid': request['thread'],
+                    'ts': request['start'] * 1e6, 'dur': request['duration'] * 1e6,
+                    'args': {'status': request['status'], 'bytes': request['bytes']}}
+                   for request in self.http_requests]
+        return events
+
+    def profile(self, function, output_file, trace=False, argv=None):
+        """
+        Runs `function` with profiling enabled and writes the report next to `output_file`, also if it fails.
+
+        The report records `argv` as the command line of the run (see `command_line`), by default `sys.argv`.
+
+        Returns:
+            The result of `function`.
+        """
+        self.enable()
+        self.argv = sys.argv if argv is None else list(argv)
+        try:
+            return function()
+        finally:
+            self.disable()
+            report_file = self.write(output_file, trace)
+            logging.info(f"Profile saved to: {os.path.abspath(report_file)}")
+
+    def write(self, output_file, trace=False):
+        """
+        Writes the report next to an output file of the script: `<output_file without extension>.profile.json`, and
+        with `trace` the trace events to `<output_file without extension>.trace.json`.
+
+        Returns:
+            str: The report file.
+        """
+        root = os.path.splitext(output_file)[0]
+        if os.path.dirname(root):
+            os.makedirs(os.path.dirname(root), exist_ok=True)
+        report = self.report()
+        report_file = f'{root}.profile.json'
+        with open(report_file, 'w') as file:
+            json.dump(report, file, indent=2)
+        if trace:
+            with open(f'{root}.trace.json', 'w') as file:
+                json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, file)
+        return report_file
+
+
+# The profiler shared by the scripts
+profiler = Profiler()
+
+
+def run_profiled(start_time, function, *args, **kwargs):
+    """
+    Runs `function(*args, **kwargs)` in a worker process with profiling enabled, on the clock of the main process
+    started at `start_time`.
+
+    Returns:
+        tuple: The result of `function` and the records of the worker, merged by `Profiler.submit`.
+    """
+    profiler.enable(start_time)
+    try:
+        result = function(*args, **kwargs)
+        return result, profiler.records()
+    finally:
+        profiler.disable()
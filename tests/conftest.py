@@ -0,0 +1,191 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import pytest
+
+# The scripts are modules at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class GitRepo:
+    """ A throwaway git repository whose commits are created with explicit authors and dates. """
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(self.path)
+        self.git('init', '-q', '-b', 'main')
+
+    def git(self, *args, date=None, name='Alice', email='alice@example.com'):
+        env = dict(os.environ, GIT_CONFIG_NOSYSTEM='1', GIT_CONFIG_GLOBAL=os.devnull,
+                   GIT_AUTHOR_NAME=name, GIT_AUTHOR_EMAIL=email, GIT_COMMITTER_NAME=name, GIT_COMMITTER_EMAIL=email)
+        if date:
+            env['GIT_AUTHOR_DATE'] = env['GIT_COMMITTER_DATE'] = date
+        return subprocess.run(['git', *args], cwd=self.path, env=env, check=True, capture_output=True,
+                              text=True).stdout.strip()
+
+    def commit(self, message, date, name='Alice', email='alice@example.com', path='file.txt'):
+        """ Appends the message to a file and commits it. Returns the sha of the new commit. """
+        with open(os.path.join(self.path, path), 'a') as file:
+            file.write(message + '\n')
+        self.git('add', path)
+        self.git('commit', '-q', '-m', message, date=date, name=name, email=email)
+        return self.git('rev-parse', 'HEAD')
+
+    def merge(self, branch, date):
+        """ Merges a branch into the current branch with a merge commit. Returns its sha. """
+        self.git('merge', '-q', '--no-ff', '--no-edit', branch, date=date)
+        return self.git('rev-parse', 'HEAD')
+
+    def set_remote_ref(self, name, rev):
+        """ Points `origin/<name>` at a commit, as a fetch would. """
+        self.git('update-ref', f'refs/remotes/origin/{name}', rev)
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    return GitRepo(tmp_path / 'repo')
+
+
+def github_issues(count, seed=0, labels=('type: bug', 'type: feature', 'priority: high')):
+    """
+    Random issues and pull requests as returned by the GitHub REST API, oldest first. The oldest one is a pull
+    request, which the GraphQL API doesn't return.
+    """
+    rng = random.Random(seed)
+    issues = []
+    for number in range(1, count + 1):
+        created_at = datetime(2021, 1, 1) + timedelta(days=number, seconds=rng.randint(0, 86399))
+        closed_at = created_at + timedelta(days=rng.randint(0, 200)) if rng.random() < 0.7 else None
+        issue = {
+            'id': number,
+            'number': number,
+            'title': f'Issue {number}',
+            'state': 'closed' if closed_at else 'open',
+            'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'closed_at': closed_at.strftime('%Y-%m-%dT%H:%M:%SZ') if closed_at else None,
+            'updated_at': (closed_at or created_at).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'labels': [{'name': label} for label in labels if rng.random() < 0.4],
+        }
+        if number == 1 or rng.random() < 0.3:
+            issue['pull_request'] = {'url': f'https://github.example/pulls/{number}'}
+        issues.append(issue)
+    return issues
+
+
+class GitHubStub(ThreadingHTTPServer):
+    """
+    A local stand-in for the GitHub REST issues and releases endpoints and the GraphQL issues query, with the same
+    filters, ordering and pagination as used by `plot_open_issues`.
+
+    Failures can be served instead of the regular responses: `failures` maps the number of a request, counted from 1,
+    to the status, headers and optionally the message of its response.
+    """
+
+    def __init__(self, issues, releases):
+        super().__init__(('127.0.0.1', 0), GitHubStubHandler)
+        self.issues = issues
+        self.releases = releases
+        # Method and path of every request received
+        self.requests = []
+        self.failures = {}
+        self.url = f'http://127.0.0.1:{self.server_address[1]}'
+
+    def rest_issues(self, params):
+        issues = self.issues
+        if params.get('state', 'open') != 'all':
+            issues = [issue for issue in issues if issue['state'] == params.get('state', 'open')]
+        if params.get('labels'):
+            required = set(params['labels'].split(','))
+            issues = [issue for issue in issues if required <= {label['name'] for label in issue['labels']}]
+        if params.get('since'):
+            issues = [issue for issue in issues if issue['updated_at'] >= params['since']]
+        return sorted(issues, key=lambda issue: issue['created_at'])
+
+    def graphql_issues(self, variables):
+        # Pull requests aren't issues, and issues with any of the labels are returned
+        issues = [issue for issue in self.issues if 'pull_request' not in issue]
+        if variables.get('states'):
+            issues = [issue for issue in issues if issue['state'].upper() in variables['states']]
+        if variables.get('labels'):
+            issues = [issue for issue in issues
+                      if any(label['name'] in variables['labels'] for label in issue['labels'])]
+        if variables.get('since'):
+            issues = [issue for issue in issues if issue['updated_at'] >= variables['since']]
+        issues = sorted(issues, key=lambda issue: issue['created_at'])
+        start = int(variables.get('cursor') or 0)
+        page = issues[start:start + 100]
+        return {'data': {'repository': {'issues': {
+            'pageInfo': {'hasNextPage': start + 100 < len(issues), 'endCursor': str(start + len(page))},
+            'nodes': [{'databaseId': issue['id'], 'state': issue['state'].upper(), 'createdAt': issue['created_at'],
+                       'closedAt': issue['closed_at'], 'labels': {'nodes': issue['labels']}} for issue in page],
+        }}}}
+
+
+class GitHubStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, headers=None, status=200):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_failure(self):
+        """ Sends the failure set for the current request, if any. Returns whether one was sent. """
+        failure = self.server.failures.pop(len(self.server.requests), None)
+        if failure is None:
+            return False
+        status, headers, *message = failure
+        self.send_json({'message': message[0] if message else HTTPStatus(status).phrase}, headers, status)
+        return True
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path))
+        if self.send_failure():
+            return
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        endpoint = url.path.rstrip('/').split('/')[-1]
+        items = self.server.rest_issues(params) if endpoint == 'issues' else self.server.releases
+        page = int(params.get('page', 1))
+        per_page = int(params.get('per_page', 30))
+        last_page = max(1, -(-len(items) // per_page))
+
+        def link(page, rel):
+            return f'<{self.server.url}{url.path}?{urlencode({**params, "page": page})}>; rel="{rel}"'
+
+        links = [link(page + 1, 'next')] if page < last_page else []
+        links.append(link(last_page, 'last'))
+        self.send_json(items[(page - 1) * per_page:page * per_page], {'Link': ', '.join(links)})
+
+    def do_POST(self):
+        self.server.requests.append(('POST', self.path))
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.send_failure():
+            return
+        self.send_json(self.server.graphql_issues(body['variables']))
+
+
+@pytest.fixture
+def github_stub():
+    server = GitHubStub(github_issues(300), [])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,45 @@
+from datetime import date
+
+import pytest
+
+from analyze_repositories import aggregate_summaries, analyze_repository, count_active_contributors
+
+
+def build_repo(repo):
+    for n, (name, day) in enumerate([('Alice', '01-01'), ('Bob', '02-01'), ('Alice', '03-28'), ('Carol', '04-01')]):
+        repo.commit(f'commit {n}', f'2023-{day}T12:00:00+00:00', name=name, email=f'{name.lower()}@example.com')
+
+
+@pytest.mark.parametrize('window_days', [['30'], ['90'], ['30', '90'], ['90', '60', '30']])
+def test_contributor_sweeps_are_summarized(git_repo, tmp_path, window_days):
+    build_repo(git_repo)
+    repository = {'path': git_repo.path, 'name': 'repo',
+                  'contributors_args': ['--window_days', *window_days, '--granularity_days', '7', '--format', 'json',
+                                        '--delta_days', '36500']}
+
+    summary = analyze_repository(repository, str(tmp_path / 'out'), ['contributors'])
+
+    assert summary['errors'] == {}
+    assert summary['contributors'] == ['Alice', 'Bob', 'Carol']
+    # Carol and, with windows shorter than the gap between her commits, Alice (March 28 to April 4) are active on
+    # April 1, the latest commit. With a 90 days window Alice's period ends the day after her commit on March 28.
+    active_contributors = {'w30_g7': 2, 'w60_g7': 2, 'w90_g7': 1}
+    assert summary['active_contributors'] == active_contributors[f'w{window_days[0]}_g7']
+    if len(window_days) > 1:
+        assert summary['active_contributors_by_sweep'] == {
+            f'w{days}_g7': active_contributors[f'w{days}_g7'] for days in window_days
+        }
+    assert aggregate_summaries([summary, dict(summary, name='other')])['active_contributors'] == (
+        2 * summary['active_contributors'])
+
+
+def test_count_active_contributors():
+    activity_periods = {
+        'ends before': [(date(2023, 1, 1), date(2023, 3, 1), 60)],
+        'extended by the granularity': [(date(2023, 2, 1), date(2023, 4, 2), 1)],
+        'ends on the latest commit': [(date(2023, 1, 1), date(2023, 4, 1), 30)],
+        'latest commit': [(date(2022, 1, 1), date(2022, 2, 1), 1), (date(2023, 3, 30), date(2023, 4, 6), 3)],
+    }
+
+    assert count_active_contributors(activity_periods) == 2
+    assert count_active_contributors({}) == 0
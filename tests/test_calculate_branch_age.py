@@ -0,0 +1,122 @@
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+from calculate_branch_age import (CommitGraph, analyze_branches, find_fork_points, fork_point_cache_entries,
+                                  get_remote_refs, load_fork_point_cache, save_fork_point_cache)
+
+
+def day(n):
+    return f'2023-01-{n:02d}T12:00:00+00:00'
+
+
+def build_release_repo(repo):
+    """ Builds a main branch with release branches forked at different points, one of them merged back. """
+    main = [repo.commit(f'main {n}', day(n)) for n in range(1, 6)]
+    repo.git('checkout', '-q', '-b', 'rel1', main[1])
+    repo.commit('rel1 fix', day(6), path='rel1.txt')
+    repo.git('checkout', '-q', '-b', 'rel2', main[3])
+    repo.commit('rel2 fix', day(7), path='rel2.txt')
+    repo.git('checkout', '-q', 'main')
+    repo.commit('main 8', day(8))
+    repo.merge('rel2', day(9))
+    repo.git('checkout', '-q', 'rel2')
+    repo.commit('rel2 after merge', day(10), path='rel2.txt')
+    repo.git('checkout', '-q', '-b', 'rel3', 'main')
+    repo.commit('rel3 fix', day(11), path='rel3.txt')
+    repo.git('checkout', '-q', 'main')
+    repo.commit('main 12', day(12))
+    for branch in ('main', 'rel1', 'rel2', 'rel3'):
+        repo.set_remote_ref(branch, branch)
+
+
+def test_engines_agree(git_repo):
+    build_release_repo(git_repo)
+    ref_shas = get_remote_refs(git_repo.path)
+    branches = [ref for ref in ref_shas if ref != 'origin/main']
+
+    graph_fork_points = find_fork_points(git_repo.path, branches, 'main', ref_shas, {}, engine='graph')
+    git_fork_points = find_fork_points(git_repo.path, branches, 'main', ref_shas, {}, engine='git')
+
+    assert graph_fork_points == git_fork_points
+    assert all(graph_fork_points[branch] for branch in branches)
+
+
+def test_cached_fork_points_are_reused_until_a_tip_or_the_engine_changes(git_repo):
+    build_release_repo(git_repo)
+    ref_shas = get_remote_refs(git_repo.path)
+    branches = [ref for ref in ref_shas if ref != 'origin/main']
+    fork_points = find_fork_points(git_repo.path, branches, 'main', ref_shas, {}, engine='graph')
+    # Cached fork points are recognizable by their fork commit
+    cache = fork_point_cache_entries({branch: ('cached', *fork_points[branch][1:]) for branch in branches}, ref_shas,
+                                     'main', 'graph')
+
+    cached = find_fork_points(git_repo.path, branches, 'main', ref_shas, cache, engine='graph')
+    assert {branch: fork_point[0] for branch, fork_point in cached.items()} == dict.fromkeys(branches, 'cached')
+
+    other_engine = find_fork_points(git_repo.path, branches, 'main', ref_shas, cache, engine='git')
+    assert other_engine == fork_points
+
+    git_repo.git('checkout', '-q', 'rel1')
+    git_repo.commit('rel1 moved', day(13), path='rel1.txt')
+    git_repo.set_remote_ref('rel1', 'rel1')
+    moved = find_fork_points(git_repo.path, branches, 'main', get_remote_refs(git_repo.path), cache, engine='graph')
+    assert moved['origin/rel1'] == (*fork_points['origin/rel1'][:2], '2023-01-13 12:00:00 +0000')
+    assert all(moved[branch][0] == 'cached' for branch in branches if branch != 'origin/rel1')
+
+
+def test_cache_entries_without_engine_are_ignored(tmp_path):
+    cache_file = str(tmp_path / 'cache' / 'fork_points.json')
+    save_fork_point_cache(cache_file, {'origin/old': ['a', 'b', ['c', 'd', 'e']],
+                                       'origin/new': ['a', 'b', 'graph', ['c', 'd', 'e']]})
+
+    assert load_fork_point_cache(cache_file) == {'origin/new': ('a', 'b', 'graph', ['c', 'd', 'e'])}
+
+
+@pytest.mark.parametrize('engine', ['graph', 'git'])
+def test_jobs_give_the_same_fork_points(git_repo, engine):
+    build_release_repo(git_repo)
+    ref_shas = get_remote_refs(git_repo.path)
+    branches = [ref for ref in ref_shas if ref != 'origin/main']
+
+    serial = find_fork_points(git_repo.path, branches, 'main', ref_shas, {}, engine=engine, jobs=1)
+    parallel = find_fork_points(git_repo.path, branches, 'main', ref_shas, {}, engine=engine, jobs=3)
+
+    assert parallel == serial
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_failing_branch_is_skipped(jobs):
+    def analyze_branch(branch):
+        if branch == 'origin/broken':
+            raise subprocess.CalledProcessError(128, ['git', 'merge-base'])
+        return branch.upper()
+
+    branches = ['origin/a', 'origin/broken', 'origin/b']
+    fork_points = analyze_branches(branches, analyze_branch, partial(ThreadPoolExecutor, max_workers=jobs), jobs)
+
+    assert fork_points == {'origin/a': 'ORIGIN/A', 'origin/b': 'ORIGIN/B'}
+
+
+@pytest.mark.parametrize('skewed', [False, True])
+def test_graph_main_only_commits_are_exact(git_repo, skewed):
+    # With skewed commit times, git's `branch..main` walk may also list commits reachable from the branch
+    build_release_repo(git_repo)
+    git_repo.git('checkout', '-q', 'rel1')
+    git_repo.commit('rel1 late', day(1) if skewed else day(13), path='rel1.txt')
+    git_repo.git('checkout', '-q', 'main')
+    git_repo.merge('rel1', day(2) if skewed else day(14))
+    git_repo.commit('main 15', day(15))
+    for branch in ('main', 'rel1'):
+        git_repo.set_remote_ref(branch, branch)
+    ref_shas = get_remote_refs(git_repo.path)
+    graph = CommitGraph.load(git_repo.path, ref_shas)
+
+    def reachable(ref):
+        return set(subprocess.check_output(['git', 'rev-list', ref], cwd=git_repo.path, text=True).split())
+
+    for branch in ('origin/rel1', 'origin/rel2', 'origin/rel3'):
+        commits = graph.main_only_commits(graph.refs[branch], graph.refs['origin/main'])
+        assert {graph.shas[commit] for commit in commits} == reachable('origin/main') - reachable(branch)
@@ -0,0 +1,80 @@
+import random
+from types import SimpleNamespace
+
+import matplotlib
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from matplotlib.collections import PolyCollection
+
+from plot_number_of_contributors import (aggregate_contributors_by_time, plot_contributor_count_over_time,
+                                         plot_contributors)
+from test_plot_number_of_contributors import random_activity_periods
+
+# Charts are only saved to files
+matplotlib.use('Agg')
+
+
+@pytest.fixture
+def figure(monkeypatch):
+    """ Keeps the figure of a plot function open after it's saved, and returns it. """
+    monkeypatch.setattr(plt, 'close', lambda *args: None)
+    yield plt.gcf
+    plt.close('all')
+
+
+def bars(figure):
+    """ Returns the corners and face colors of the bars of the batched bar collection of a figure. """
+    collection, = [collection for collection in figure().axes[0].collections if isinstance(collection, PolyCollection)]
+    corners = np.array([path.vertices[:4] for path in collection.get_paths()])
+    return np.column_stack([corners.min(axis=1), corners.max(axis=1)]), collection.get_facecolors()
+
+
+def reference_bars(patches):
+    """ Returns the corners and face colors of bars drawn as one patch each by `ax.bar` or `ax.barh`. """
+    corners = np.array([[patch.get_x(), patch.get_y(), patch.get_x() + patch.get_width(),
+                         patch.get_y() + patch.get_height()] for patch in patches])
+    return corners, np.array([patch.get_facecolor() for patch in patches])
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_activity_bars_match_barh(tmp_path, figure, seed):
+    activity_periods = random_activity_periods(random.Random(seed), contributors=12, days=1000)
+    plot_contributors(activity_periods, SimpleNamespace(), output_file=str(tmp_path / 'activity.png'))
+    corners, colors = bars(figure)
+    plt.close('all')
+
+    # The original chart drew a bar per activity period
+    plt.figure()
+    color_map = plt.colormaps.get_cmap('hsv')
+    patches = [plt.barh(i, (end_date - start_date).days, left=start_date, height=0.4, color=color_map(i),
+                        edgecolor='black')[0]
+               for i, periods in enumerate(activity_periods.values()) for start_date, end_date, _ in periods]
+    reference_corners, reference_colors = reference_bars(patches)
+
+    np.testing.assert_allclose(corners, reference_corners)
+    np.testing.assert_allclose(colors, reference_colors)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_contributor_count_bars_match_bar(tmp_path, figure, seed):
+    aggregated_data = aggregate_contributors_by_time(random_activity_periods(random.Random(seed), contributors=12,
+                                                                             days=1000))
+    plot_contributor_count_over_time(aggregated_data, SimpleNamespace(), output_file=str(tmp_path / 'count.png'))
+    corners, colors = bars(figure)
+    plt.close('all')
+
+    # The original chart drew a bar from each date to the next one
+    plt.figure()
+    dates, counts = zip(*aggregated_data)
+    color_map = plt.colormaps.get_cmap('tab20')
+    count_to_color = {count: color_map(i) for i, count in enumerate(sorted(set(counts)))}
+    patches = [plt.bar(dates[i], counts[i], width=(dates[i + 1] - dates[i]).days, align='edge', edgecolor='black',
+                       color=count_to_color[counts[i]])[0]
+               for i in range(len(dates) - 1)]
+    reference_corners, reference_colors = reference_bars(patches)
+
+    np.testing.assert_allclose(corners, reference_corners)
+    np.testing.assert_allclose(colors, reference_colors)
+    assert corners[0, 0] == mdates.date2num(dates[0])
@@ -0,0 +1,23 @@
+from commit_index import CommitIndex
+
+
+def test_update_after_amended_tip_is_pruned(git_repo):
+    git_repo.commit('first', '2023-01-01T12:00:00+00:00')
+    old_tip = git_repo.commit('second', '2023-01-02T12:00:00+00:00')
+    index = CommitIndex(git_repo.path)
+    try:
+        assert index.update() == 2
+
+        # Amend the tip and prune the old one, whose exclusion git then ignores
+        git_repo.git('commit', '-q', '--amend', '-m', 'second, amended', date='2023-01-03T12:00:00+00:00')
+        git_repo.git('reflog', 'expire', '--expire=now', '--all')
+        git_repo.git('gc', '-q', '--prune=now')
+        new_tip = git_repo.git('rev-parse', 'HEAD')
+
+        assert index.update() == 1
+        tips = {sha for sha, in index.connection.execute('SELECT sha FROM tips')}
+        assert new_tip in tips and old_tip not in tips
+        assert index.update() == 0
+        assert [commit_date for commit_date, _, _ in index.iter_commits('main')] == ['2023-01-03', '2023-01-01']
+    finally:
+        index.close()
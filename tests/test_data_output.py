@@ -0,0 +1,82 @@
+import csv
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+
+import calculate_branch_age
+import plot_number_of_contributors
+from data_output import data_file, write_records
+from test_calculate_branch_age import build_release_repo
+
+RECORDS = [('alice', date(2023, 1, 2), datetime(2023, 1, 3, 4, 5, 6, tzinfo=timezone.utc), 7)]
+FIELDS = ['name', 'date', 'time', 'count']
+
+
+@pytest.mark.parametrize('output_file, output_format, expected', [
+    ('out/chart.png', 'json', 'out/chart.json'),
+    ('out/chart.PNG', 'csv', 'out/chart.csv'),
+    ('out/chart', 'csv', 'out/chart.csv'),
+    ('out.d/chart', 'json', 'out.d/chart.json'),
+    ('out/chart.txt', 'json', 'out/chart.txt'),
+    ('-', 'json', '-'),
+])
+def test_data_file(output_file, output_format, expected):
+    assert data_file(output_file, output_format) == expected
+
+
+def test_write_json(tmp_path):
+    output_file = str(tmp_path / 'out' / 'data.json')
+    write_records(RECORDS, FIELDS, output_file, 'json')
+
+    with open(output_file) as file:
+        assert json.load(file) == [{'name': 'alice', 'date': '2023-01-02', 'time': '2023-01-03T04:05:06+00:00',
+                                    'count': 7}]
+
+
+def test_write_csv_to_stdout(capsys):
+    write_records(iter(RECORDS), FIELDS, '-', 'csv')
+
+    assert list(csv.reader(capsys.readouterr().out.splitlines())) == [
+        FIELDS, ['alice', '2023-01-02', '2023-01-03T04:05:06+00:00', '7']]
+
+
+def test_contributor_data(git_repo, tmp_path):
+    for n, name in enumerate(['Alice', 'Bob', 'Alice'], 1):
+        git_repo.commit(f'commit {n}', f'2023-0{n}-01T12:00:00+00:00', name=name, email=f'{name.lower()}@example.com')
+    activity_file = str(tmp_path / 'activity')
+    count_file = str(tmp_path / 'count.png')
+
+    activity_periods, aggregated_data = plot_number_of_contributors.main([
+        '--repo_path', git_repo.path, '--delta_days', '36500', '--format', 'csv',
+        '--activity_plot_file', activity_file, '--contributor_count_plot_file', count_file])
+
+    with open(activity_file + '.csv') as file:
+        rows = list(csv.DictReader(file))
+    assert [(row['contributor'], row['start_date'], row['end_date'], int(row['duration'])) for row in rows] == [
+        (contributor, start.isoformat(), end.isoformat(), duration)
+        for contributor, periods in activity_periods.items() for start, end, duration in periods]
+    with open(str(tmp_path / 'count.csv')) as file:
+        assert [(row['date'], int(row['contributors'])) for row in csv.DictReader(file)] == [
+            (day.isoformat(), count) for day, count in aggregated_data]
+
+
+def test_sweep_to_stdout_is_rejected(git_repo):
+    with pytest.raises(SystemExit):
+        plot_number_of_contributors.main(['--repo_path', git_repo.path, '--window_days', '30', '90', '--format', 'json',
+                                          '--activity_plot_file', '-'])
+
+
+def test_branch_age_data(git_repo, tmp_path):
+    build_release_repo(git_repo)
+    output_file = str(tmp_path / 'branch_ages.png')
+
+    branch_ages = calculate_branch_age.main(['--repo_path', git_repo.path, '--no_fetch', '--no_cache', '--format',
+                                             'json', '--output_file', output_file])
+
+    with open(str(tmp_path / 'branch_ages.json')) as file:
+        records = json.load(file)
+    assert [record['branch'] for record in records] == [branch for branch, _, _ in branch_ages]
+    assert {record['branch'] for record in records} == {'origin/rel1', 'origin/rel2', 'origin/rel3'}
+    assert all(record['age_days'] == (datetime.fromisoformat(record['latest_commit_date']) -
+                                      datetime.fromisoformat(record['fork_date'])).days for record in records)
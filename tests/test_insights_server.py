@@ -0,0 +1,29 @@
+from argparse import Namespace
+
+from insights_server import Repository
+
+
+def day(n):
+    return f'2023-01-{n:02d}T12:00:00+00:00'
+
+
+def refreshed_fork_points(repo, engine):
+    repository = Repository({'path': repo.path}, Namespace(no_fetch=True, engine=engine, jobs=1))
+    assert repository.refresh_branches()
+    assert not repository.refresh_branches()
+    return repository.fork_points
+
+
+def test_engines_find_the_same_fork_points(git_repo):
+    main = [git_repo.commit(f'main {n}', day(n)) for n in range(1, 4)]
+    git_repo.git('checkout', '-q', '-b', 'feature', main[1])
+    git_repo.commit('feature', day(4), path='feature.txt')
+    git_repo.git('checkout', '-q', 'main')
+    git_repo.commit('main 5', day(5))
+    for branch in ('main', 'feature'):
+        git_repo.set_remote_ref(branch, branch)
+
+    fork_points = refreshed_fork_points(git_repo, 'graph')
+
+    assert fork_points == refreshed_fork_points(git_repo, 'git')
+    assert fork_points['origin/feature']
@@ -0,0 +1,225 @@
+import os
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+
+import pytest
+
+from plot_number_of_contributors import (ChurnCollector, IdentityResolver, aggregate_contributors_by_time,
+                                         collect_contributors, numstat_path, parse_mailmap, process_activity_periods)
+
+
+def aggregate_contributors_by_time_reference(activity_periods):
+    """ The original O(dates * periods) implementation of `aggregate_contributors_by_time`. """
+    unique_dates = set()
+    end_dates = set()
+    for periods in activity_periods.values():
+        for start_date, end_date, _ in periods:
+            unique_dates.add(start_date)
+            unique_dates.add(end_date)
+            end_dates.add(end_date)
+
+    contributor_count_by_date = defaultdict(int)
+    for current_date in sorted(unique_dates):
+        for periods in activity_periods.values():
+            for start_date, end_date, _ in periods:
+                if start_date <= current_date <= end_date:
+                    contributor_count_by_date[current_date] += 1
+
+        if current_date in end_dates:
+            contributor_count_by_date[current_date] -= 1
+
+    return sorted(contributor_count_by_date.items())
+
+
+def process_activity_periods_reference(contributors, window, granularity=7):
+    """ The original per-contributor loop of `process_activity_periods`. """
+    activity_periods = defaultdict(list)
+    for contributor, dates in contributors.items():
+        sorted_dates = sorted(list(dates))
+        start_date = sorted_dates[0]
+        last_date = start_date
+
+        for current_date in sorted_dates[1:]:
+            if current_date - last_date > window:
+                actual_length = (last_date - start_date).days + 1
+                period_length = max(actual_length, granularity)
+                adjusted_end_date = start_date + timedelta(days=period_length)
+                activity_periods[contributor].append((start_date, adjusted_end_date, actual_length))
+
+                start_date = current_date
+            last_date = current_date
+
+        actual_length = (last_date - start_date).days + 1
+        period_length = max(actual_length, granularity)
+        adjusted_end_date = start_date + timedelta(days=period_length)
+        activity_periods[contributor].append((start_date, adjusted_end_date, actual_length))
+
+    return activity_periods
+
+
+def random_contributors(rng, contributors, days):
+    """ Random sets of commit dates, from a single date to bursts of consecutive days. """
+    first_date = date(2020, 1, 1)
+    return {f'contributor {contributor}': {first_date + timedelta(days=rng.randint(0, days))
+                                           for _ in range(rng.choice([1, 2, 10, 100]))}
+            for contributor in range(contributors)}
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_process_activity_periods_matches_reference(seed):
+    rng = random.Random(seed)
+    contributors = random_contributors(rng, contributors=rng.randint(1, 30), days=rng.choice([10, 100, 3000]))
+    window = rng.choice([timedelta(days=0), timedelta(hours=36), timedelta(days=rng.randint(1, 120))])
+    granularity = rng.choice([1, 7, 15, 90])
+
+    activity_periods = process_activity_periods(contributors, window, granularity)
+    reference = process_activity_periods_reference(contributors, window, granularity)
+    assert list(activity_periods) == list(reference)
+    assert activity_periods == reference
+
+
+def random_activity_periods(rng, contributors, days):
+    """ Random activity periods, often sharing start and end dates and including single-day periods. """
+    first_date = date(2020, 1, 1)
+    activity_periods = {}
+    for contributor in range(contributors):
+        periods = []
+        for _ in range(rng.randint(1, 5)):
+            start = rng.randint(0, days)
+            end = start + rng.choice([0, 0, 1, rng.randint(0, days // 4)])
+            periods.append((first_date + timedelta(days=start), first_date + timedelta(days=end), end - start))
+        activity_periods[f'contributor {contributor}'] = periods
+    return activity_periods
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_aggregate_contributors_by_time_matches_reference(seed):
+    rng = random.Random(seed)
+    activity_periods = random_activity_periods(rng, contributors=rng.randint(1, 30), days=rng.choice([10, 100, 1000]))
+    assert aggregate_contributors_by_time(activity_periods) == aggregate_contributors_by_time_reference(
+        activity_periods)
+
+
+def test_aggregate_contributors_by_time_empty():
+    assert aggregate_contributors_by_time({}) == aggregate_contributors_by_time_reference({}) == []
+
+
+@pytest.mark.parametrize('numstat, path', [
+    ('src/main.py', 'src/main.py'),
+    ('src/{old => new}/main.py', 'src/new/main.py'),
+    ('{src => }/main.py', 'main.py'),
+    ('old.py => src/new.py', 'src/new.py'),
+    ('"d\\"ir/a\\tb.txt"', 'd"ir/a\tb.txt'),
+    ('"d\\"ir/a\\tb.txt" => "d\\"ir/c\\td.txt"', 'd"ir/c\td.txt'),
+    ('plain.txt => "q\\"x.txt"', 'q"x.txt'),
+    ('"back\\\\slash => x"', 'back\\slash => x'),
+    ('é/{ü.txt => ö.txt}', 'é/ö.txt'),
+    ('"\\303\\251/new\\nline.txt"', 'é/new\nline.txt'),
+])
+def test_numstat_path(numstat, path):
+    assert numstat_path(numstat) == path
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_churn_of_quoted_paths(git_repo, jobs):
+    for directory in ('d"ir', 'tab\tdir', 'été'):
+        os.makedirs(os.path.join(git_repo.path, directory))
+        git_repo.commit('line', '2023-01-02T12:00:00+00:00', path=f'{directory}/file.txt')
+    git_repo.git('mv', 'd"ir', 'new"dir')
+    git_repo.git('commit', '-q', '-m', 'rename', date='2023-02-02T12:00:00+00:00')
+
+    churn = ChurnCollector(depth=1, bucket='month')
+    collect_contributors(git_repo.path, 'main', {}, [], delta=None, jobs=jobs, churn=churn)
+
+    assert churn.records() == [
+        ('d"ir', date(2023, 1, 1), 1, 0),
+        ('new"dir', date(2023, 2, 1), 0, 0),
+        ('tab\tdir', date(2023, 1, 1), 1, 0),
+        ('été', date(2023, 1, 1), 1, 0),
+    ]
+
+
+MAILMAP = """\
+# Comments and blank lines are ignored <ignored@example.com>
+
+Alice Proper <Alice@Example.com>
+<bob.proper@example.com> <BOB@old.example.com>
+Carol Proper <carol.proper@example.com> <carol@old.example.com>
+Dave Proper <dave.proper@example.com> Dave Old <dave@old.example.com>
+Dave Other <dave.other@example.com> dave other <DAVE@old.example.com>
+Erin Proper <erin@example.com> # Erin Old <erin@old.example.com>
+<erin.proper@example.com> <erin@example.com>
+"""
+
+IDENTITIES = [
+    ('Alice', 'alice@example.com'),
+    ('alice', 'ALICE@EXAMPLE.COM'),
+    ('Bob', 'bob@old.example.com'),
+    ('Bob', 'Bob@Old.Example.com'),
+    ('Carol', 'carol@old.example.com'),
+    ('Dave Old', 'dave@old.example.com'),
+    ('DAVE OLD', 'Dave@Old.Example.com'),
+    ('Dave Other', 'dave@old.example.com'),
+    ('Dave Unknown', 'dave@old.example.com'),
+    ('Erin', 'erin@example.com'),
+    ('Erin Old', 'erin@old.example.com'),
+    ('Frank', 'frank@example.com'),
+]
+
+
+def test_mailmap_matches_git(git_repo):
+    with open(os.path.join(git_repo.path, '.mailmap'), 'w') as file:
+        file.write(MAILMAP)
+    resolver = IdentityResolver(parse_mailmap(git_repo.path), [])
+
+    for name, email in IDENTITIES:
+        mapped = git_repo.git('check-mailmap', f'{name} <{email}>')
+        assert '{} <{}>'.format(*resolver.map(name, email)) == mapped
+
+
+def test_resolver_excludes_contributors():
+    resolver = IdentityResolver({'bot@example.com': {None: ('dependabot[bot]', None)}}, ['dependabot', 'snyk'])
+
+    assert resolver.resolve('Alice', 'alice@example.com') == 'Alice'
+    assert resolver.resolve('Anything', 'BOT@example.com') is None
+    assert resolver.resolve('snyk-bot', 'snyk@example.com') is None
+
+
+def build_contributor_repo(git_repo, seed=0):
+    """ A history of several contributors over two years, with a merged branch and a commit by an excluded bot. """
+    rng = random.Random(seed)
+    first_day = date(2022, 1, 1)
+    for number in range(60):
+        name, email = rng.choice(IDENTITIES)
+        commit_date = first_day + timedelta(days=number * 12 + rng.randint(0, 11))
+        git_repo.commit(f'commit {number}', f'{commit_date}T12:00:00', name=name, email=email)
+        if number == 30:
+            git_repo.git('checkout', '-q', '-b', 'feature')
+            for offset in range(3):
+                git_repo.commit(f'feature {offset}', f'{commit_date + timedelta(days=offset)}T18:00:00', name='Grace',
+                                email='grace@example.com', path='feature.txt')
+            git_repo.git('checkout', '-q', 'main')
+            git_repo.merge('feature', f'{commit_date + timedelta(days=5)}T12:00:00')
+    git_repo.commit('bump', '2024-01-10T12:00:00', name='dependabot[bot]', email='bot@example.com')
+    with open(os.path.join(git_repo.path, '.mailmap'), 'w') as file:
+        file.write(MAILMAP)
+
+
+@pytest.mark.parametrize('backend, jobs', [('git', 2), ('git', 3), ('gitpython', 1), ('index', 1)])
+def test_backends_and_jobs_match_the_serial_scan(git_repo, backend, jobs):
+    build_contributor_repo(git_repo)
+    mailmap = parse_mailmap(git_repo.path)
+
+    def contributor_periods(**kwargs):
+        contributors = collect_contributors(git_repo.path, 'main', mailmap, ['dependabot'], delta=None, **kwargs)
+        return contributors, process_activity_periods(contributors, window=timedelta(days=60))
+
+    serial_contributors, serial_periods = contributor_periods()
+    contributors, periods = contributor_periods(backend=backend, jobs=jobs)
+
+    assert len(serial_contributors) >= 5
+    assert 'Grace' in serial_contributors and 'dependabot[bot]' not in serial_contributors
+    assert {contributor: sorted(dates) for contributor, dates in contributors.items()} == \
+        {contributor: sorted(dates) for contributor, dates in serial_contributors.items()}
+    assert periods == serial_periods
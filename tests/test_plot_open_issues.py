@@ -0,0 +1,265 @@
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from email.utils import formatdate
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+import requests
+
+from conftest import github_issues
+from plot_open_issues import (GitHubSession, compact_issue, count_open_issues, count_open_issues_by_labels,
+                              create_session, fetch_github_pages, fetch_issues, issues_to_frame, label_filter_names,
+                              main, read_issues, write_issues)
+
+
+def count_open_issues_reference(issues, last_date):
+    """ The original per-day loop of `plot_open_issues`, over raw REST issues, up to `last_date` instead of today. """
+    issue_data = []
+    for issue in issues:
+        created_at = datetime.strptime(issue['created_at'], '%Y-%m-%dT%H:%M:%SZ')
+        closed_at = datetime.strptime(issue['closed_at'], '%Y-%m-%dT%H:%M:%SZ') if issue['closed_at'] else None
+        is_pull_request = 'pull_request' in issue
+        issue_data.append({'created_at': created_at, 'closed_at': closed_at, 'is_pull_request': is_pull_request})
+
+    df_issues = pd.DataFrame(issue_data)
+
+    first_date = df_issues['created_at'].min().date()
+    current_date = first_date
+    one_day = timedelta(days=1)
+
+    open_issues = []
+    while current_date <= last_date:
+        count_open_issues = ((df_issues['created_at'].dt.date <= current_date) &
+                             ((df_issues['closed_at'].isnull()) | (df_issues['closed_at'].dt.date > current_date)) &
+                             (~df_issues['is_pull_request'])).sum()
+        open_issues.append({'date': current_date, 'open_issues': count_open_issues})
+        current_date += one_day
+
+    return pd.DataFrame(open_issues)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_open_issue_counts_match_reference(seed):
+    issues = github_issues(300, seed)
+    last_date = date(2022, 6, 30)
+    reference = count_open_issues_reference(issues, last_date)
+    df_issues = issues_to_frame(map(compact_issue, issues))
+
+    # With the same first date, the counts are exactly those of the original loop
+    counts = count_open_issues(df_issues, reference['date'].iloc[0], last_date)
+    pd.testing.assert_frame_equal(counts, reference, check_dtype=False)
+
+    # By default, the counts deliberately start at the first issue instead of the first pull request (the oldest item
+    # of these issues), the original loop only counts zeros before it
+    counts = count_open_issues(df_issues, last_date=last_date)
+    first_issue = min(issue['created_at'] for issue in issues if 'pull_request' not in issue)
+    assert counts['date'].iloc[0] == date.fromisoformat(first_issue[:10]) > reference['date'].iloc[0]
+    skipped = reference['date'] < counts['date'].iloc[0]
+    assert (reference.loc[skipped, 'open_issues'] == 0).all()
+    pd.testing.assert_frame_equal(counts, reference[~skipped].reset_index(drop=True), check_dtype=False)
+
+
+@pytest.mark.parametrize('count, pages', [(0, 1), (100, 1), (101, 2), (250, 3)])
+def test_pagination_stops_at_the_last_page(github_stub, count, pages):
+    github_stub.releases = [{'id': number} for number in range(count)]
+
+    _, releases = fetch_github_pages('owner/repo', 'releases', session=create_session(), api_url=github_stub.url)
+
+    assert releases == github_stub.releases
+    # The number of pages is read from the Link header of the first page, no empty page is requested after the last
+    requested_pages = [int(parse_qs(urlparse(path).query)['page'][0]) for _, path in github_stub.requests]
+    assert sorted(requested_pages) == list(range(1, pages + 1))
+
+
+def fetch_issue_frame(tmp_path, github_stub, backend):
+    issues_file = str(tmp_path / f'{backend}.jsonl')
+    fetch_issues(issues_file, 'owner/repo', {'state': 'all'}, session=create_session(), api_url=github_stub.url,
+                 backend=backend)
+    return issues_to_frame(read_issues(issues_file))
+
+
+def test_backends_store_the_same_issues(tmp_path, github_stub):
+    rest = fetch_issue_frame(tmp_path, github_stub, 'rest')
+    graphql = fetch_issue_frame(tmp_path, github_stub, 'graphql')
+
+    assert rest['is_pull_request'].any() and not graphql['is_pull_request'].any()
+    pd.testing.assert_frame_equal(rest[~rest['is_pull_request']].reset_index(drop=True), graphql)
+
+
+@pytest.mark.parametrize('labels', [['type: bug'], ['type: bug', 'type: bug,priority: high']])
+def test_backends_count_the_same_open_issues(tmp_path, github_stub, labels):
+    def open_issues(backend):
+        return main(['--repo', 'owner/repo', '--api_url', github_stub.url, '--backend', backend,
+                     '--issues_file', str(tmp_path / f'{backend}.jsonl'), '--labels', *labels,
+                     '--output_plot', str(tmp_path / f'{backend}.png'), '--format', 'json'])
+
+    rest = open_issues('rest')
+    graphql = open_issues('graphql')
+
+    # The oldest item of the stand-in repository is a pull request, only the REST backend stores it
+    assert rest['date'].iloc[0] > date.fromisoformat(github_stub.issues[0]['created_at'][:10])
+    pd.testing.assert_frame_equal(rest, graphql)
+
+
+def test_filtered_counts_start_at_the_first_matching_issue(tmp_path, github_stub):
+    df_issues = fetch_issue_frame(tmp_path, github_stub, 'rest')
+    df_open_issues = count_open_issues_by_labels(df_issues, ['type: bug,priority: high'], state='open')
+
+    matched = [issue for issue in github_stub.issues if 'pull_request' not in issue and issue['state'] == 'open'
+               and {'type: bug', 'priority: high'} <= {label['name'] for label in issue['labels']}]
+    assert df_open_issues['date'].iloc[0] == date.fromisoformat(min(issue['created_at'] for issue in matched)[:10])
+    assert df_open_issues['date'].iloc[-1] == date.today()
+    assert df_open_issues['type: bug,priority: high'].iloc[0] == 1
+
+
+def test_counts_without_matching_issues(tmp_path, github_stub):
+    df_issues = fetch_issue_frame(tmp_path, github_stub, 'rest')
+    df_open_issues = count_open_issues_by_labels(df_issues, ['no such label'])
+
+    assert df_open_issues['date'].tolist() == [date.today()]
+    assert df_open_issues['no such label'].tolist() == [0]
+
+
+def test_label_filter_names_are_unique():
+    assert label_filter_names(['type: bug', 'type bug', 'type_bug_2', '', 'type: bug,priority: high']) == [
+        'type_bug', 'type_bug_2', 'type_bug_2_2', 'all', 'type_bug_priority_high']
+
+
+def test_changed_backend_fetches_all_issues_again(tmp_path, github_stub):
+    issues_file = str(tmp_path / 'issues.jsonl')
+
+    def run(backend):
+        main(['--repo', 'owner/repo', '--api_url', github_stub.url, '--backend', backend, '--issues_file', issues_file,
+              '--output_plot', str(tmp_path / 'open_issues.png'), '--format', 'json'])
+        with open(issues_file + '.sync.json') as file:
+            return json.load(file)
+
+    assert run('rest')['query']['backend'] == 'rest'
+    assert any(issue['is_pull_request'] for issue in read_issues(issues_file))
+
+    sync_state = run('graphql')
+    assert sync_state['query']['backend'] == 'graphql' and sync_state['issues_synced_at']
+    assert not any(issue['is_pull_request'] for issue in read_issues(issues_file))
+    assert github_stub.requests[-1][0] == 'POST'
+
+    # With the same parameters the stored issues are used
+    requests = len(github_stub.requests)
+    run('graphql')
+    assert len(github_stub.requests) == requests
+
+
+def test_compact_issues_round_trip(tmp_path):
+    issues = github_issues(50)
+    issues_file = str(tmp_path / 'issues.jsonl')
+
+    write_issues(issues_file, map(compact_issue, issues))
+
+    stored = list(read_issues(issues_file))
+    assert stored == [compact_issue(issue) for issue in issues]
+    assert stored[0] == {
+        'id': 1, 'state': issues[0]['state'], 'created_at': issues[0]['created_at'],
+        'closed_at': issues[0]['closed_at'], 'labels': [label['name'] for label in issues[0]['labels']],
+        'is_pull_request': True,
+    }
+    assert not os.path.exists(issues_file + '.tmp')
+
+
+def test_convert_issues_file(tmp_path, github_stub):
+    issues = github_issues(50)
+    json_file = str(tmp_path / 'issues.json')
+    with open(json_file, 'w') as file:
+        json.dump(issues, file)
+    issues_file = str(tmp_path / 'issues.jsonl')
+
+    df_open_issues = main(['--repo', 'owner/repo', '--api_url', github_stub.url, '--convert_issues_file', json_file,
+                           '--issues_file', issues_file, '--output_plot', str(tmp_path / 'open_issues.png'),
+                           '--labels', '', '--format', 'json'])
+
+    assert list(read_issues(issues_file)) == [compact_issue(issue) for issue in issues]
+    # The converted issues are counted without fetching them again
+    assert github_stub.requests == []
+    pd.testing.assert_frame_equal(df_open_issues, count_open_issues(issues_to_frame(map(compact_issue, issues))))
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """ The delays the session sleeps for, without sleeping. """
+    delays = []
+    monkeypatch.setattr(time, 'sleep', delays.append)
+    return delays
+
+
+def get_releases(github_stub, max_retries=3):
+    session = GitHubSession(max_retries=max_retries, retry_delay=1, secondary_retry_delay=60)
+    return session.get(f'{github_stub.url}/repos/owner/repo/releases')
+
+
+def test_rate_limit_waits_for_the_reset_once(github_stub, sleeps):
+    reset = int(time.time()) + 30
+    github_stub.failures[1] = (403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(reset)},
+                               'API rate limit exceeded')
+
+    assert get_releases(github_stub).status_code == 200
+    # The request isn't held back by the used up rate limit of the limited response after the wait
+    assert len(sleeps) == 1 and 29 <= sleeps[0] <= 31
+    assert len(github_stub.requests) == 2
+
+
+@pytest.mark.parametrize('as_date', [False, True])
+def test_retry_after_in_seconds_or_as_a_date(github_stub, sleeps, as_date):
+    github_stub.failures[1] = (429, {'Retry-After': formatdate(time.time() + 7, usegmt=True) if as_date else '7'})
+
+    assert get_releases(github_stub).status_code == 200
+    assert len(sleeps) == 1 and 5 <= sleeps[0] <= 7
+
+
+def test_secondary_rate_limit_backs_off_exponentially(github_stub, sleeps):
+    github_stub.failures[1] = (429, {})
+    github_stub.failures[2] = (403, {}, 'You have exceeded a secondary rate limit')
+
+    assert get_releases(github_stub).status_code == 200
+    assert sleeps == [60, 120]
+
+
+def test_server_errors_are_retried(github_stub, sleeps):
+    github_stub.failures[1] = (502, {})
+    github_stub.failures[2] = (500, {})
+
+    assert get_releases(github_stub).status_code == 200
+    assert sleeps == [1, 2]
+    github_stub.failures.update({4: (500, {}), 5: (500, {})})
+    with pytest.raises(requests.HTTPError):
+        get_releases(github_stub, max_retries=1)
+
+
+def test_forbidden_is_not_retried(github_stub, sleeps):
+    github_stub.failures[1] = (403, {}, 'Resource not accessible by integration')
+
+    with pytest.raises(requests.HTTPError):
+        get_releases(github_stub)
+    assert sleeps == [] and len(github_stub.requests) == 1
+
+
+def test_interrupted_fetch_resumes_after_the_last_page(tmp_path, github_stub):
+    issues_file = str(tmp_path / 'issues.jsonl')
+    github_stub.failures[2] = (500, {})
+
+    def fetch(issues_file, max_retries=0):
+        fetch_issues(issues_file, 'owner/repo', {'state': 'all'}, session=create_session(max_retries=max_retries),
+                     api_url=github_stub.url, backend='graphql')
+
+    with pytest.raises(requests.HTTPError):
+        fetch(issues_file)
+    with open(issues_file + '.progress.json') as file:
+        assert json.load(file)['page'] == 1
+    assert not os.path.exists(issues_file)
+
+    fetch(issues_file)
+    # The first page isn't requested again: 2 pages before the failure, the 2 pages left after it
+    assert len(github_stub.requests) == 4
+    assert not os.path.exists(issues_file + '.progress.json')
+    fetch(str(tmp_path / 'full.jsonl'))
+    assert list(read_issues(issues_file)) == list(read_issues(str(tmp_path / 'full.jsonl')))
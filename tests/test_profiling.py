@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+import plot_number_of_contributors
+from profiling import command_name
+
+
+@pytest.mark.parametrize('args, name', [
+    (['git', 'log', '--format=%H', 'main'], 'git log'),
+    (['git', '-c', 'core.quotepath=false', 'log', '--numstat'], 'git log'),
+    (['git', '-c', 'a=1', '-c', 'b=2', 'rev-list', 'main'], 'git rev-list'),
+    ('/usr/bin/git cat-file --batch', 'git cat-file'),
+    (['git'], 'git'),
+    ([], ''),
+])
+def test_command_name(args, name):
+    assert command_name(args) == name
+
+
+def test_shard_git_processes_are_traced(git_repo, tmp_path):
+    for number in range(6):
+        git_repo.commit(f'commit {number}', f'2024-01-{number + 1:02d}T12:00:00')
+    activity_file = str(tmp_path / 'activity.png')
+
+    plot_number_of_contributors.main([
+        '--repo_path', git_repo.path, '--delta_days', '36500', '--jobs', '3', '--format', 'json', '--profile',
+        '--profile_trace', '--activity_plot_file', activity_file,
+        '--contributor_count_plot_file', str(tmp_path / 'count.png')])
+
+    with open(str(tmp_path / 'activity.profile.json')) as file:
+        report = json.load(file)
+    with open(str(tmp_path / 'activity.trace.json')) as file:
+        events = json.load(file)['traceEvents']
+    # The main process lists the commits, each of the 3 shards is read by a `git log` in a worker process
+    assert report['subprocesses']['commands']['git rev-list']['count'] == 1
+    assert report['subprocesses']['commands']['git log']['count'] == 3
+    shard_processes = {event['pid'] for event in events
+                       if event['name'] == 'git log' and event['pid'] != os.getpid()}
+    assert 1 <= len(shard_processes) <= 3
+    assert all(event['dur'] >= 0 and event['ts'] >= 0 for event in events)
+
+
+def test_stages_of_render_workers_are_recorded(git_repo, tmp_path):
+    for number in range(6):
+        git_repo.commit(f'commit {number}', f'2024-01-{number + 1:02d}T12:00:00')
+
+    plot_number_of_contributors.main([
+        '--repo_path', git_repo.path, '--delta_days', '36500', '--render_jobs', '1', '--profile',
+        '--activity_plot_file', str(tmp_path / 'activity.png'),
+        '--contributor_count_plot_file', str(tmp_path / 'count.png')])
+
+    with open(str(tmp_path / 'activity.profile.json')) as file:
+        stages = json.load(file)['stages']
+    worker_stages = {stage['name'] for stage in stages if stage['pid'] != os.getpid()}
+    assert worker_stages == {'save_activity_plot', 'save_contributor_count_plot'}
+    assert os.path.exists(str(tmp_path / 'activity.png')) and os.path.exists(str(tmp_path / 'count.png'))